@@ -23,9 +23,15 @@ public:
   using FailureCallbackFunc =  std::function<void( const std::string &,
                                                    const JobStatus )>;
 
+  /* timings_callback( source_hash, timings ), called before the success
+     callback by the engines whose functions report their timings */
+  using TimingsCallbackFunc = std::function<void( const std::string &,
+                                                  const ExecutionResponse::Timings & )>;
+
 protected:
   SuccessCallbackFunc success_callback_ {};
   FailureCallbackFunc failure_callback_ {};
+  TimingsCallbackFunc timings_callback_ {};
 
   size_t max_jobs_ { 0 };
 
@@ -40,6 +46,7 @@ public:
 
   void set_success_callback( SuccessCallbackFunc func ) { success_callback_ = func; }
   void set_failure_callback( FailureCallbackFunc func ) { failure_callback_ = func; }
+  void set_timings_callback( TimingsCallbackFunc func ) { timings_callback_ = func; }
 
   virtual void init( ExecutionLoop & ) {}
   virtual void force_thunk( const gg::thunk::Thunk & thunk, ExecutionLoop & exec_loop ) = 0;
@@ -49,6 +56,9 @@ public:
   size_t max_jobs() const { return max_jobs_; }
   virtual std::string label() const = 0;
 
+  /* printed once all the targets are reduced, if not empty */
+  virtual std::string summary() const { return {}; }
+
   virtual ~ExecutionEngine() {}
 };
 
@@ -10,7 +10,6 @@
 #include "net/http_request.hh"
 #include "net/http_response.hh"
 #include "net/nb_secure_socket.hh"
-#include "util/base64.hh"
 #include "util/optional.hh"
 #include "util/system_runner.hh"
 #include "util/units.hh"
@@ -21,7 +20,7 @@ using namespace gg::thunk;
 
 HTTPRequest GCFExecutionEngine::generate_request( const Thunk & thunk )
 {
-  const string payload = Thunk::execution_payload( thunk );
+  const string payload = ExecutionResponse::request_payload( thunk, true );
 
   HTTPRequest req;
   req.set_first_line( "POST /" + parsed_url_.path + " HTTP/1.1" );
@@ -41,13 +40,18 @@ void GCFExecutionEngine::force_thunk( const Thunk & thunk,
 {
   HTTPRequest request = generate_request( thunk );
 
-  uint64_t connection_id = exec_loop.make_http_request<SSLConnection>( thunk.hash(),
-    address_, request,
+  auto response_callback =
     [this] ( const uint64_t id, const string & thunk_hash,
              const HTTPResponse & http_response ) -> bool
     {
       running_jobs_--;
 
+      if ( http_response.status_code() == "429" ) {
+        /* no instance was available to take the request */
+        failure_callback_( thunk_hash, JobStatus::RateLimit );
+        return false;
+      }
+
       if ( http_response.status_code() != "200" ) {
         cerr << "======== HTTP Response ========" << endl;
         cerr << http_response.str() << endl;
@@ -56,7 +60,10 @@ void GCFExecutionEngine::force_thunk( const Thunk & thunk,
         return false;
       }
 
-      ExecutionResponse response = ExecutionResponse::parse_message( http_response.body() );
+      ExecutionResponse response =
+        ExecutionResponse::parse_message( http_response.body(),
+                                          ExecutionResponse::is_binary( http_response ) );
+      stats_.add( response );
 
       /* print the output, if there's any */
       if ( response.stdout.length() ) {
@@ -73,15 +80,19 @@ void GCFExecutionEngine::force_thunk( const Thunk & thunk,
                                response.thunk_hash );
         }
 
+        vector<string> written;
+
         for ( const auto & output : response.outputs ) {
           gg::cache::insert( gg::hash::for_output( response.thunk_hash, output.tag ), output.hash );
 
           if ( output.data.length() ) {
-            roost::atomic_create( base64::decode( output.data ),
-                                  gg::paths::blob( output.hash ) );
+            roost::atomic_create( output.data, gg::paths::blob( output.hash ) );
+            written.push_back( output.hash );
           }
         }
 
+        gg::gc::record_access( written );
+
         gg::cache::insert( response.thunk_hash, response.outputs.at( 0 ).hash );
 
         vector<ThunkOutput> thunk_outputs;
@@ -89,6 +100,10 @@ void GCFExecutionEngine::force_thunk( const Thunk & thunk,
           thunk_outputs.emplace_back( move( output.hash ), move( output.tag ) );
         }
 
+        if ( timings_callback_ and not response.timings.empty() ) {
+          timings_callback_( response.thunk_hash, response.timings );
+        }
+
         success_callback_( response.thunk_hash, move( thunk_outputs ),
                            compute_cost( start_times_.at( id ) ) );
 
@@ -101,13 +116,21 @@ void GCFExecutionEngine::force_thunk( const Thunk & thunk,
       }
 
       return false;
-    },
+    };
+
+  auto failure_callback =
     [this] ( const uint64_t id, const string & thunk_hash )
     {
       start_times_.erase( id );
       failure_callback_( thunk_hash, JobStatus::SocketFailure );
-    }
-  );
+    };
+
+  /* plain HTTP is only used to reach a local emulator */
+  uint64_t connection_id = secure_
+    ? exec_loop.make_http_request<SSLConnection>( thunk.hash(), address_, request,
+                                                  response_callback, failure_callback )
+    : exec_loop.make_http_request<TCPConnection>( thunk.hash(), address_, request,
+                                                  response_callback, failure_callback );
 
   start_times_.insert( { connection_id, chrono::steady_clock::now() } );
 
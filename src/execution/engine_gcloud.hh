@@ -17,9 +17,11 @@ class GCFExecutionEngine : public ExecutionEngine
 private:
   ParsedURI parsed_url_;
   Address address_;
+  bool secure_;
   SSLContext ssl_context_ {};
 
   size_t running_jobs_ { 0 };
+  FunctionStats stats_ {};
   std::map<uint64_t, std::chrono::steady_clock::time_point> start_times_ {};
 
   HTTPRequest generate_request( const gg::thunk::Thunk & thunk );
@@ -30,7 +32,10 @@ private:
 public:
   GCFExecutionEngine( const size_t max_jobs, const std::string & function_url )
     : ExecutionEngine( max_jobs ), parsed_url_( function_url ),
-      address_( parsed_url_.host, parsed_url_.protocol )
+      address_( parsed_url_.host,
+                parsed_url_.port.get_or( 0 ) ? std::to_string( parsed_url_.port.get_or( 0 ) )
+                                              : parsed_url_.protocol ),
+      secure_( parsed_url_.protocol != "http" )
   {}
 
   void force_thunk( const gg::thunk::Thunk & thunk,
@@ -40,6 +45,7 @@ public:
   bool can_execute( const gg::thunk::Thunk & thunk ) const override;
   std::string label() const override { return "gcloud"; }
   size_t job_count() const override;
+  std::string summary() const override { return stats_.str(); }
 };
 
 #endif /* ENGINE_GCLOUD_HH */
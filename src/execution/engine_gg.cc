@@ -10,7 +10,6 @@
 #include "util/optional.hh"
 #include "util/system_runner.hh"
 #include "util/units.hh"
-#include "util/base64.hh"
 
 using namespace std;
 using namespace gg;
@@ -18,7 +17,7 @@ using namespace gg::thunk;
 
 HTTPRequest GGExecutionEngine::generate_request( const Thunk & thunk )
 {
-  string payload = Thunk::execution_payload( thunk );
+  string payload = ExecutionResponse::request_payload( thunk, true );
   HTTPRequest request;
   request.set_first_line( "POST / HTTP/1.1" );
   request.add_header( HTTPHeader{ "Content-Length", to_string( payload.size() ) } );
@@ -48,7 +47,9 @@ void GGExecutionEngine::force_thunk( const Thunk & thunk,
         return false;
       }
 
-      ExecutionResponse response = ExecutionResponse::parse_message( http_response.body() );
+      ExecutionResponse response =
+        ExecutionResponse::parse_message( http_response.body(),
+                                          ExecutionResponse::is_binary( http_response ) );
 
       /* print the output, if there's any */
       if ( response.stdout.length() ) {
@@ -65,15 +66,19 @@ void GGExecutionEngine::force_thunk( const Thunk & thunk,
                                response.thunk_hash );
         }
 
+        vector<string> written;
+
         for ( const auto & output : response.outputs ) {
           gg::cache::insert( gg::hash::for_output( response.thunk_hash, output.tag ), output.hash );
 
           if ( output.data.length() ) {
-            roost::atomic_create( base64::decode( output.data ),
-                                  gg::paths::blob( output.hash ) );
+            roost::atomic_create( output.data, gg::paths::blob( output.hash ) );
+            written.push_back( output.hash );
           }
         }
 
+        gg::gc::record_access( written );
+
         gg::cache::insert( response.thunk_hash, response.outputs.at( 0 ).hash );
 
         vector<ThunkOutput> thunk_outputs;
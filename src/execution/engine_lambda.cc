@@ -9,7 +9,6 @@
 #include "thunk/ggutils.hh"
 #include "net/http_response.hh"
 #include "net/nb_secure_socket.hh"
-#include "util/base64.hh"
 #include "util/optional.hh"
 #include "util/system_runner.hh"
 #include "util/units.hh"
@@ -31,7 +30,7 @@ HTTPRequest AWSLambdaExecutionEngine::generate_request( const Thunk & thunk )
 
   return LambdaInvocationRequest(
     credentials_, region_, function_name,
-    Thunk::execution_payload( thunk ),
+    ExecutionResponse::request_payload( thunk, false ),
     LambdaInvocationRequest::InvocationType::REQUEST_RESPONSE,
     LambdaInvocationRequest::LogType::NONE
   ).to_http_request();
@@ -42,8 +41,7 @@ void AWSLambdaExecutionEngine::force_thunk( const Thunk & thunk,
 {
   HTTPRequest request = generate_request( thunk );
 
-  uint64_t connection_id = exec_loop.make_http_request<SSLConnection>( thunk.hash(),
-    address_, request,
+  auto response_callback =
     [this] ( const uint64_t id, const string & thunk_hash,
              const HTTPResponse & http_response ) -> bool
     {
@@ -64,6 +62,7 @@ void AWSLambdaExecutionEngine::force_thunk( const Thunk & thunk,
       }
 
       ExecutionResponse response = ExecutionResponse::parse_message( http_response.body() );
+      stats_.add( response );
 
       /* print the output, if there's any */
       if ( response.stdout.length() ) {
@@ -80,15 +79,19 @@ void AWSLambdaExecutionEngine::force_thunk( const Thunk & thunk,
                                response.thunk_hash );
         }
 
+        vector<string> written;
+
         for ( const auto & output : response.outputs ) {
           gg::cache::insert( gg::hash::for_output( response.thunk_hash, output.tag ), output.hash );
 
           if ( output.data.length() ) {
-            roost::atomic_create( base64::decode( output.data ),
-                                  gg::paths::blob( output.hash ) );
+            roost::atomic_create( output.data, gg::paths::blob( output.hash ) );
+            written.push_back( output.hash );
           }
         }
 
+        gg::gc::record_access( written );
+
         gg::cache::insert( response.thunk_hash, response.outputs.at( 0 ).hash );
 
         vector<ThunkOutput> thunk_outputs;
@@ -96,6 +99,10 @@ void AWSLambdaExecutionEngine::force_thunk( const Thunk & thunk,
           thunk_outputs.emplace_back( move( output.hash ), move( output.tag ) );
         }
 
+        if ( timings_callback_ and not response.timings.empty() ) {
+          timings_callback_( response.thunk_hash, response.timings );
+        }
+
         success_callback_( response.thunk_hash, move( thunk_outputs ),
                            compute_cost( start_times_.at( id ) ) );
 
@@ -108,13 +115,21 @@ void AWSLambdaExecutionEngine::force_thunk( const Thunk & thunk,
       }
 
       return false;
-    },
+    };
+
+  auto failure_callback =
     [this] ( const uint64_t id, const string & thunk_hash )
     {
       start_times_.erase( id );
       failure_callback_( thunk_hash, JobStatus::SocketFailure );
-    }
-  );
+    };
+
+  /* plain HTTP is only used to reach a local emulator */
+  uint64_t connection_id = secure_
+    ? exec_loop.make_http_request<SSLConnection>( thunk.hash(), address_, request,
+                                                  response_callback, failure_callback )
+    : exec_loop.make_http_request<TCPConnection>( thunk.hash(), address_, request,
+                                                  response_callback, failure_callback );
 
   start_times_.insert( { connection_id, chrono::steady_clock::now() } );
 
@@ -18,9 +18,11 @@ private:
   AWSCredentials credentials_;
   std::string region_;
   Address address_;
+  bool secure_;
   SSLContext ssl_context_ {};
 
   size_t running_jobs_ { 0 };
+  FunctionStats stats_ {};
   std::map<uint64_t, std::chrono::steady_clock::time_point> start_times_ {};
 
   HTTPRequest generate_request( const gg::thunk::Thunk & thunk );
@@ -33,7 +35,8 @@ public:
                             const AWSCredentials & credentials,
                             const std::string & region )
     : ExecutionEngine( max_jobs ), credentials_( credentials ), region_( region ),
-      address_( LambdaInvocationRequest::endpoint( region_ ), "https" )
+      address_( LambdaInvocationRequest::address( region_ ) ),
+      secure_( LambdaInvocationRequest::is_secure() )
   {}
 
   void force_thunk( const gg::thunk::Thunk & thunk,
@@ -43,6 +46,7 @@ public:
   bool can_execute( const gg::thunk::Thunk & thunk ) const override;
   std::string label() const override { return "\u03bb"; }
   size_t job_count() const override;
+  std::string summary() const override { return stats_.str(); }
 };
 
 #endif /* ENGINE_LAMBDA_HH */
@@ -5,7 +5,9 @@
 #include <stdexcept>
 
 #include "thunk/ggutils.hh"
+#include "thunk/thunk_writer.hh"
 #include "util/optional.hh"
+#include "util/path.hh"
 #include "util/system_runner.hh"
 
 using namespace std;
@@ -15,6 +17,13 @@ using namespace gg::thunk;
 void LocalExecutionEngine::force_thunk( const Thunk & thunk,
                                         ExecutionLoop & exec_loop )
 {
+  /* gg-execute reads the thunk from its blob, which thunks loaded from a
+     graph manifest don't have yet */
+  const roost::path thunk_path = gg::paths::blob( thunk.hash() );
+  if ( not roost::exists( thunk_path ) ) {
+    roost::atomic_create( ThunkWriter::serialize( thunk ), thunk_path, true, 0400 );
+  }
+
   exec_loop.add_child_process( thunk.hash(),
     [this, outputs=thunk.outputs()] ( const uint64_t, const string & hash, const int )
     {
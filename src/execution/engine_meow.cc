@@ -20,6 +20,13 @@ using namespace meow;
 using namespace gg::thunk;
 using namespace PollerShortNames;
 
+/* workers that stay around for the next gg-force runs */
+uint32_t idle_timeout()
+{
+  static const uint32_t timeout = stoul( safe_getenv_or( "GG_MEOW_IDLE_TIMEOUT", "0" ) );
+  return timeout;
+}
+
 HTTPRequest MeowExecutionEngine::generate_request()
 {
   static const bool timelog = ( getenv( "GG_TIMELOG" ) != nullptr );
@@ -30,6 +37,7 @@ HTTPRequest MeowExecutionEngine::generate_request()
   request.set_coordinator( listen_addr_.str() );
   request.set_storage_backend( gg::remote::storage_backend_uri() );
   request.set_timelog( timelog );
+  request.set_idle_timeout( idle_timeout() );
 
   return LambdaInvocationRequest(
     credentials_, region_, function_name,
@@ -44,7 +52,8 @@ MeowExecutionEngine::MeowExecutionEngine( const size_t max_jobs,
                                           const std::string & region,
                                           const Address & listen_addr )
   : ExecutionEngine( max_jobs ), credentials_( credentials ), region_( region ),
-    aws_addr_( LambdaInvocationRequest::endpoint( region_ ), "https" ),
+    aws_addr_( LambdaInvocationRequest::address( region_ ) ),
+    aws_secure_( LambdaInvocationRequest::is_secure() ),
     listen_addr_( listen_addr ), listen_socket_()
 {}
 
@@ -67,8 +76,19 @@ void MeowExecutionEngine::init( ExecutionLoop & exec_loop )
 
             switch ( message.opcode() ) {
             case Message::OpCode::Hey:
-              // cerr << "[meow:worker@" << id << ":hey] " << message.payload() << endl;
+            {
+              /* a worker from an earlier run still has its objects */
+              protobuf::meow::WorkerInfo worker_info;
+              protoutil::from_string( message.payload(), worker_info );
+
+              Lambda & lambda = lambdas_.at( id );
+              lambda.objects.insert( worker_info.objects().begin(),
+                                     worker_info.objects().end() );
+
+              // cerr << "[meow:worker@" << id << ":hey] " << lambda.objects.size() << endl;
+              lambda_ready( lambda );
               break;
+            }
 
             case Message::OpCode::Put:
             {
@@ -85,6 +105,8 @@ void MeowExecutionEngine::init( ExecutionLoop & exec_loop )
               const string & thunk_hash = execution_response.thunk_hash();
               // cerr << "[meow:worker@" << id << ":executed] " << thunk_hash << endl;
 
+              vector<string> written;
+
               for ( const auto & output : execution_response.outputs() ) {
                 gg::cache::insert( gg::hash::for_output( thunk_hash, output.tag() ), output.hash() );
                 // XXX gg::remote::set_available( output.hash() );
@@ -92,13 +114,15 @@ void MeowExecutionEngine::init( ExecutionLoop & exec_loop )
                 if ( output.data().length() ) {
                   roost::atomic_create( base64::decode( output.data() ),
                                         gg::paths::blob( output.hash() ) );
+                  written.push_back( output.hash() );
                 }
               }
 
+              gg::gc::record_access( written );
+
               gg::cache::insert( thunk_hash, execution_response.outputs( 0 ).hash() );
-              lambdas_.at( id ).state = Lambda::State::Idle;
-              free_lambdas_.insert( id );
               running_jobs_--;
+              lambda_ready( lambdas_.at( id ) );
 
               vector<ThunkOutput> thunk_outputs;
               for ( auto & output : execution_response.outputs() ) {
@@ -122,22 +146,16 @@ void MeowExecutionEngine::init( ExecutionLoop & exec_loop )
         [] () {
           throw runtime_error( "error occurred" );
         },
-        [this] () {
-          throw runtime_error( "a lambda died" );
+        [id=current_id_, this] () {
+          lambda_left( id );
         }
       );
 
+      /* it gets work once it says hey */
       lambdas_.emplace( piecewise_construct,
                         forward_as_tuple( current_id_ ),
                         forward_as_tuple( current_id_, move( connection ) ) );
 
-      free_lambdas_.emplace( current_id_ );
-
-      if ( not thunks_queue_.empty() ) {
-        prepare_lambda( lambdas_.at( current_id_ ), thunks_queue_.front() );
-        thunks_queue_.pop();
-      }
-
       current_id_++;
       return true;
     }
@@ -159,7 +177,15 @@ void MeowExecutionEngine::prepare_lambda( Lambda & lambda, const Thunk & thunk )
     lambda_objects.insert( item.first );
   }
 
-  lambda.objects = move( lambda_objects );
+  /* a worker that runs gg-execute --cleanup only keeps the objects of its
+     last thunk. a persistent worker keeps them all, up to the size of its
+     cache; gg-execute fetches the ones that it evicted. */
+  if ( idle_timeout() > 0 ) {
+    lambda.objects.insert( lambda_objects.begin(), lambda_objects.end() );
+  }
+  else {
+    lambda.objects = move( lambda_objects );
+  }
 
   /** (2) send the request for thunk execution */
   lambda.connection->enqueue_write( meow::create_execute_message( thunk ).str() );
@@ -174,6 +200,40 @@ void MeowExecutionEngine::prepare_lambda( Lambda & lambda, const Thunk & thunk )
   /** (5) PROFIT **/
 }
 
+void MeowExecutionEngine::lambda_ready( Lambda & lambda )
+{
+  lambda.state = Lambda::State::Idle;
+  lambda.executing_thunk.clear();
+  free_lambdas_.insert( lambda.id );
+
+  if ( not thunks_queue_.empty() ) {
+    prepare_lambda( lambda, thunks_queue_.front() );
+    thunks_queue_.pop();
+  }
+}
+
+void MeowExecutionEngine::lambda_left( const uint64_t id )
+{
+  /* workers with an idle timeout leave when they have nothing to do; a
+     thunk that a worker took with it is tried again */
+  Optional<string> lost_thunk;
+
+  const Lambda & lambda = lambdas_.at( id );
+  if ( lambda.state == Lambda::State::Busy ) {
+    lost_thunk.reset( lambda.executing_thunk->hash() );
+    running_jobs_--;
+  }
+
+  free_lambdas_.erase( id );
+  lambdas_.erase( id );
+
+  cerr << "[meow] a worker left" << endl;
+
+  if ( lost_thunk.initialized() ) {
+    failure_callback_( *lost_thunk, JobStatus::SocketFailure );
+  }
+}
+
 uint64_t MeowExecutionEngine::pick_lambda( const Thunk & thunk,
                                            const SelectionStrategy s )
 {
@@ -263,18 +323,34 @@ void MeowExecutionEngine::force_thunk( const Thunk & thunk, ExecutionLoop & loop
     return prepare_lambda( lambdas_.at( picked_lambda ), thunk );
   }
 
-  /* there are no free Lambdas, let's launch one */
+  /* there are no free Lambdas, let's launch one; or, with an already-warm
+     fleet, wait for one of its workers to connect or become free */
+  static const bool attach = ( getenv( "GG_MEOW_ATTACH" ) != nullptr );
+
   thunks_queue_.push( thunk );
 
-  loop.make_http_request<SSLConnection>( "start-worker", aws_addr_,
-    generate_request(),
+  if ( attach ) {
+    return;
+  }
+
+  auto response_callback =
     [] ( const uint64_t, const string &, const HTTPResponse & ) {
       cerr << "[meow] invoked a lambda" << endl;
-    },
+    };
+
+  auto failure_callback =
     [] ( const uint64_t, const string & ) {
       cerr << "invocation request failed" << endl;
-    }
-  );
+    };
+
+  if ( aws_secure_ ) {
+    loop.make_http_request<SSLConnection>( "start-worker", aws_addr_,
+      generate_request(), response_callback, failure_callback );
+  }
+  else {
+    loop.make_http_request<TCPConnection>( "start-worker", aws_addr_,
+      generate_request(), response_callback, failure_callback );
+  }
 }
 
 bool MeowExecutionEngine::can_execute( const gg::thunk::Thunk & thunk ) const
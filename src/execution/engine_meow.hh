@@ -39,6 +39,7 @@ private:
   AWSCredentials credentials_;
   std::string region_;
   Address aws_addr_;
+  bool aws_secure_;
   Address listen_addr_;
   TCPSocket listen_socket_;
   SSLContext ssl_context_ {};
@@ -56,6 +57,8 @@ private:
                         const SelectionStrategy s = SelectionStrategy::First );
 
   void prepare_lambda( Lambda & lambda, const gg::thunk::Thunk & thunk );
+  void lambda_ready( Lambda & lambda );
+  void lambda_left( const uint64_t id );
 
 public:
   MeowExecutionEngine( const size_t max_jobs, const AWSCredentials & credentials,
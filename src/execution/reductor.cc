@@ -8,6 +8,7 @@
 #include <cmath>
 #include <numeric>
 #include <chrono>
+#include <fcntl.h>
 
 #include "thunk/ggutils.hh"
 #include "thunk/thunk_reader.hh"
@@ -83,7 +84,8 @@ Reductor::Reductor( const vector<string> & target_hashes,
                     std::unique_ptr<StorageBackend> && storage_backend,
                     const std::chrono::milliseconds default_timeout,
                     const size_t timeout_multiplier,
-                    const bool status_bar )
+                    const bool status_bar,
+                    vector<Thunk> && preloaded_thunks )
   : target_hashes_( target_hashes ),
     remaining_targets_( target_hashes_.begin(), target_hashes_.end() ),
     status_bar_( status_bar ), default_timeout_( default_timeout ),
@@ -94,8 +96,12 @@ Reductor::Reductor( const vector<string> & target_hashes,
 {
   cerr << "\u2192 Loading the thunks... ";
   auto graph_load_time = time_it<milliseconds>(
-    [this] ()
+    [this, &preloaded_thunks] ()
     {
+      for ( Thunk & thunk : preloaded_thunks ) {
+        dep_graph_.preload_thunk( move( thunk ) );
+      }
+
       for ( const string & hash : target_hashes_ ) {
         dep_graph_.add_thunk( hash );
 
@@ -110,6 +116,14 @@ Reductor::Reductor( const vector<string> & target_hashes,
     [this] ( const string & old_hash, vector<ThunkOutput> && outputs, const float cost )
     { finalize_execution( old_hash, move( outputs ), cost ); };
 
+  auto timings_callback =
+    [this] ( const string & old_hash, const ExecutionResponse::Timings & timings )
+    {
+      if ( timelog_ ) {
+        job_timings_[ old_hash ] = timings;
+      }
+    };
+
   auto failure_callback =
     [this] ( const string & old_hash, const JobStatus failure_reason )
     {
@@ -164,21 +178,52 @@ Reductor::Reductor( const vector<string> & target_hashes,
   for ( auto & ee : exec_engines_ ) {
     ee->set_success_callback( success_callback );
     ee->set_failure_callback( failure_callback );
+    ee->set_timings_callback( timings_callback );
     ee->init( exec_loop_ );
   }
 
   for ( auto & fe : fallback_engines_ ) {
     fe->set_success_callback( success_callback );
     fe->set_failure_callback( failure_callback );
+    fe->set_timings_callback( timings_callback );
     fe->init( exec_loop_ );
   }
 }
 
+void Reductor::set_timelog( const roost::path & path )
+{
+  timelog_ = make_unique<FileDescriptor>(
+    CheckSystemCall( "open( " + path.string() + " )",
+                     open( path.string().c_str(), O_WRONLY | O_CREAT | O_TRUNC, 0644 ) ) );
+}
+
+void Reductor::write_timelog( const string & hash, const milliseconds latency )
+{
+  ostringstream line;
+  line << hash << " " << latency.count();
+
+  auto timings = job_timings_.find( hash );
+  if ( timings != job_timings_.end() ) {
+    for ( const auto & phase : timings->second ) {
+      line << " " << phase.first << "=" << llround( phase.second * 1000 );
+    }
+  }
+
+  line << "\n";
+  timelog_->write( line.str() );
+}
+
 void Reductor::finalize_execution( const string & old_hash,
                                    vector<ThunkOutput> && outputs,
                                    const float cost )
 {
-  running_jobs_.erase( old_hash );
+  milliseconds latency { 0 };
+  auto job_info = running_jobs_.find( old_hash );
+  if ( job_info != running_jobs_.end() ) {
+    latency = duration_cast<milliseconds>( Clock::now() - job_info->second.start );
+    running_jobs_.erase( job_info );
+  }
+
   const string main_output_hash = outputs.at( 0 ).hash;
 
   Optional<unordered_set<string>> new_o1s = dep_graph_.force_thunk( old_hash, move ( outputs ) );
@@ -187,12 +232,88 @@ void Reductor::finalize_execution( const string & old_hash,
   if ( new_o1s.initialized() ) {
     job_queue_.insert( job_queue_.end(), new_o1s->begin(), new_o1s->end() );
 
+    if ( job_callback_ ) {
+      job_callback_( old_hash, latency );
+    }
+
+    if ( timelog_ ) {
+      write_timelog( old_hash, latency );
+    }
+
     if ( gg::hash::type( main_output_hash ) == gg::ObjectType::Value ) {
-      remaining_targets_.erase( dep_graph_.original_hash( old_hash ) );
+      const string target_hash = dep_graph_.original_hash( old_hash );
+
+      if ( remaining_targets_.erase( target_hash ) ) {
+        target_reduced( target_hash, main_output_hash );
+      }
     }
 
     finished_jobs_++;
   }
+
+  job_timings_.erase( old_hash );
+}
+
+void Reductor::target_reduced( const string & target_hash,
+                               const string & output_hash )
+{
+  if ( download_outputs_ and storage_backend_ != nullptr
+       and not roost::exists( gg::paths::blob( output_hash ) ) ) {
+    pending_downloads_.emplace_back( target_hash, output_hash );
+  }
+  else if ( target_callback_ ) {
+    target_callback_( target_hash, output_hash );
+  }
+}
+
+void Reductor::start_download()
+{
+  vector<pair<string, string>> batch;
+  swap( batch, pending_downloads_ );
+
+  vector<storage::GetRequest> requests;
+  unordered_set<string> requested;
+
+  for ( const auto & target : batch ) {
+    const string & hash = target.second;
+
+    if ( requested.insert( hash ).second and
+         not roost::exists( gg::paths::blob( hash ) ) ) {
+      requests.push_back( { hash, gg::paths::blob( hash ) } );
+      downloaded_bytes_ += gg::hash::size( hash );
+    }
+  }
+
+  /* they all came with an earlier batch */
+  if ( requests.empty() ) {
+    for ( const auto & target : batch ) {
+      if ( target_callback_ ) {
+        target_callback_( target.first, target.second );
+      }
+    }
+    return;
+  }
+
+  downloaded_files_ += requests.size();
+  downloading_ = true;
+
+  exec_loop_.add_child_process( "download",
+    [this, batch, requested] ( const uint64_t, const string &, const int )
+    {
+      downloading_ = false;
+      gg::gc::record_access( vector<string> { requested.begin(), requested.end() } );
+
+      if ( target_callback_ ) {
+        for ( const auto & target : batch ) {
+          target_callback_( target.first, target.second );
+        }
+      }
+    },
+    [this, requests] ()
+    {
+      storage_backend_->get( requests );
+      return EXIT_SUCCESS;
+    } );
 }
 
 vector<string> Reductor::reduce()
@@ -220,10 +341,15 @@ vector<string> Reductor::reduce()
       }
 
       if ( cache_entry.initialized() ) {
-        Thunk thunk { ThunkReader::read( gg::paths::blob( thunk_hash ), thunk_hash ) };
+        /* preloaded thunks may not have a blob */
+        const vector<string> outputs =
+          dep_graph_.has_thunk( thunk_hash )
+          ? dep_graph_.get_thunk( thunk_hash ).outputs()
+          : ThunkReader::read( gg::paths::blob( thunk_hash ), thunk_hash ).outputs();
+
         vector<ThunkOutput> new_outputs;
 
-        for ( const auto & tag : thunk.outputs() ) {
+        for ( const auto & tag : outputs ) {
           Optional<cache::ReductionResult> result = cache::check( gg::hash::for_output( thunk_hash, tag ) );
 
           if ( not result.initialized() ) {
@@ -292,6 +418,10 @@ vector<string> Reductor::reduce()
       }
     } /* while(Q is not empty) */
 
+    if ( not downloading_ and not pending_downloads_.empty() ) {
+      start_download();
+    }
+
     print_status();
 
     const auto poll_result = exec_loop_.loop_once( timeout_check_interval_ == 0s
@@ -327,6 +457,19 @@ vector<string> Reductor::reduce()
         throw runtime_error( "unhandled poller failure happened, job is not finished" );
       }
 
+      for ( auto & ee : exec_engines_ ) {
+        const string summary = ee->summary();
+        if ( summary.length() ) {
+          print_gg_message( "info", ee->label() + " " + summary );
+        }
+      }
+
+      if ( downloaded_files_ > 0 ) {
+        print_gg_message( "info", "downloaded " + to_string( downloaded_files_ )
+                                  + " output file" + ( downloaded_files_ == 1 ? "" : "s" )
+                                  + " (" + format_bytes( downloaded_bytes_ ) + ")" );
+      }
+
       vector<string> final_hashes;
 
       for ( const string & target_hash : target_hashes_ ) {
@@ -394,37 +537,3 @@ void Reductor::upload_dependencies() const
 
   cerr << "done (" << upload_time.count() << " ms)." << endl;
 }
-
-void Reductor::download_targets( const vector<string> & hashes ) const
-{
-  if ( storage_backend_ == nullptr ) {
-    return;
-  }
-
-  vector<storage::GetRequest> download_requests;
-  size_t total_size = 0;
-
-  for ( const string & hash : hashes ) {
-    if ( not roost::exists( gg::paths::blob( hash ) ) ) {
-      download_requests.push_back( { hash, gg::paths::blob( hash ) } );
-      total_size += gg::hash::size( hash );
-    }
-  }
-
-  if ( download_requests.size() == 0 ) {
-    cerr << "No files to download." << endl;
-    return;
-  }
-
-  const string plural = download_requests.size() == 1 ? "" : "s";
-  cerr << "\u2198 Downloading output file" << plural
-       << " (" << format_bytes( total_size ) << ")... ";
-  auto download_time = time_it<milliseconds>(
-    [&download_requests, this]()
-    {
-      storage_backend_->get( download_requests );
-    }
-  );
-
-  cerr << "done (" << download_time.count() << " ms)." << endl;
-}
@@ -8,6 +8,7 @@
 #include <deque>
 #include <memory>
 #include <chrono>
+#include <functional>
 #include <unordered_set>
 #include <unordered_map>
 
@@ -15,9 +16,21 @@
 #include "engine.hh"
 #include "thunk/graph.hh"
 #include "storage/backend.hh"
+#include "util/file_descriptor.hh"
 
 class Reductor
 {
+public:
+  /* called with the original hash of a target and its final output hash,
+     as soon as the target is reduced (and its output downloaded, see
+     set_download_outputs) */
+  typedef std::function<void( const std::string &,
+                              const std::string & )> TargetCallbackFunc;
+
+  /* called with the hash of every finished job and how long it ran */
+  typedef std::function<void( const std::string &,
+                              const std::chrono::milliseconds )> JobCallbackFunc;
+
 private:
   using Clock = std::chrono::steady_clock;
 
@@ -50,11 +63,36 @@ private:
 
   std::unique_ptr<StorageBackend> storage_backend_;
 
+  /* outputs of reduced targets are downloaded in batches, by one child
+     process at a time, so the loop keeps running jobs meanwhile */
+  bool download_outputs_ { false };
+  bool downloading_ { false };
+  std::vector<std::pair<std::string, std::string>> pending_downloads_ {};
+  size_t downloaded_files_ { 0 };
+  size_t downloaded_bytes_ { 0 };
+
+  TargetCallbackFunc target_callback_ {};
+  JobCallbackFunc job_callback_ {};
+
+  /* a line for every finished job: its latency and, if its function
+     reported them, the timings of the invocation */
+  std::unique_ptr<FileDescriptor> timelog_ {};
+  std::unordered_map<std::string, ExecutionResponse::Timings> job_timings_ {};
+
   void finalize_execution( const std::string & old_hash,
                            std::vector<gg::ThunkOutput> && outputs,
                            const float cost = 0.0 );
 
-  bool is_finished() const { return ( remaining_targets_.size() == 0 ); }
+  void write_timelog( const std::string & hash, const std::chrono::milliseconds latency );
+
+  void target_reduced( const std::string & target_hash, const std::string & output_hash );
+  void start_download();
+
+  bool is_finished() const
+  {
+    return remaining_targets_.size() == 0 and pending_downloads_.empty()
+           and not downloading_;
+  }
 
 public:
   Reductor( const std::vector<std::string> & target_hashes,
@@ -63,12 +101,20 @@ public:
             std::unique_ptr<StorageBackend> && storage_backend,
             const std::chrono::milliseconds default_timeout = std::chrono::milliseconds { 0 },
             const size_t timeout_multiplier = 1,
-            const bool status_bar = false );
+            const bool status_bar = false,
+            std::vector<gg::thunk::Thunk> && preloaded_thunks = {} );
 
   std::vector<std::string> reduce();
   void upload_dependencies() const;
-  void download_targets( const std::vector<std::string> & hashes ) const;
   void print_status() const;
+
+  void set_target_callback( TargetCallbackFunc func ) { target_callback_ = func; }
+  void set_job_callback( JobCallbackFunc func ) { job_callback_ = func; }
+
+  /* with remote execution, download the output of every target into
+     .gg/blobs as soon as it is reduced */
+  void set_download_outputs( const bool download ) { download_outputs_ = download; }
+  void set_timelog( const roost::path & path );
 };
 
 #endif /* REDUCTOR_HH */
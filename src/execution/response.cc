@@ -3,24 +3,34 @@
 #include "response.hh"
 
 #include <iostream>
+#include <iomanip>
+#include <sstream>
 #include <stdexcept>
 #include <google/protobuf/util/json_util.h>
 
 #include "protobufs/gg.pb.h"
+#include "protobufs/util.hh"
+#include "util/base64.hh"
+#include "util/compression.hh"
+#include "util/util.hh"
 
 using namespace std;
 using namespace gg;
 using namespace google::protobuf::util;
 
-ExecutionResponse ExecutionResponse::parse_message( const std::string & message )
+const string ExecutionResponse::binary_content_type = "application/x-protobuf";
+
+ExecutionResponse ExecutionResponse::parse_message( const std::string & message,
+                                                    const bool binary )
 {
   ExecutionResponse response;
 
   JsonParseOptions parse_options;
   gg::protobuf::ExecutionResponse response_proto;
 
-  if ( not JsonStringToMessage( message, &response_proto ).ok() ) {
-    cerr << "invalid response: " << message << endl;
+  if ( binary ? not response_proto.ParseFromString( message )
+              : not JsonStringToMessage( message, &response_proto ).ok() ) {
+    cerr << "invalid response: " << ( binary ? "(binary)" : message ) << endl;
     response.status = JobStatus::OperationalFailure;
     return response;
   }
@@ -28,6 +38,29 @@ ExecutionResponse ExecutionResponse::parse_message( const std::string & message
   response.status = static_cast<JobStatus>( response_proto.return_code() );
   response.stdout = response_proto.stdout();
 
+  const auto & cache_proto = response_proto.blob_cache();
+  response.blob_cache.hits = cache_proto.hits();
+  response.blob_cache.misses = cache_proto.misses();
+  response.blob_cache.bytes_saved = cache_proto.bytes_saved();
+  response.blob_cache.bytes_fetched = cache_proto.bytes_fetched();
+  response.blob_cache.evicted_blobs = cache_proto.evicted_blobs();
+  response.blob_cache.evicted_bytes = cache_proto.evicted_bytes();
+
+  const auto & init_proto = response_proto.init();
+  response.cold_start = init_proto.cold();
+  response.init_seconds = init_proto.import_seconds() + init_proto.cache_seconds()
+                          + init_proto.stage_seconds();
+
+  if ( response_proto.has_timings() ) {
+    const auto & timings_proto = response_proto.timings();
+    response.timings = { { "init", timings_proto.init_seconds() },
+                         { "thunk_write", timings_proto.thunk_write_seconds() },
+                         { "fetch", timings_proto.fetch_seconds() },
+                         { "execute", timings_proto.execute_seconds() },
+                         { "collect", timings_proto.collect_seconds() },
+                         { "upload", timings_proto.upload_seconds() } };
+  }
+
   if ( response.status != JobStatus::Success ) {
     return response;
   }
@@ -36,15 +69,108 @@ ExecutionResponse ExecutionResponse::parse_message( const std::string & message
     throw runtime_error( "current implementation only supports one thunk execution per response" );
   }
 
+  if ( response_proto.executed_thunks( 0 ).return_code() ) {
+    response.status = static_cast<JobStatus>( response_proto.executed_thunks( 0 ).return_code() );
+    return response;
+  }
+
   for ( const auto & output_proto : response_proto.executed_thunks( 0 ).outputs() ) {
+    string data;
+
+    try {
+      /* handlers that predate raw_data send base64 in data */
+      data = output_proto.data().length()
+        ? base64::decode( output_proto.data() )
+        : compression::decompress( output_proto.raw_data(),
+            static_cast<compression::Encoding>( output_proto.encoding() ) );
+    }
+    catch ( const exception & e ) {
+      cerr << "invalid output " << output_proto.tag() << ": " << e.what() << endl;
+      response.status = JobStatus::OperationalFailure;
+      response.outputs.clear();
+      return response;
+    }
+
     response.outputs.push_back( { output_proto.tag(),
                                   output_proto.hash(),
                                   output_proto.size(),
                                   output_proto.executable(),
-                                  output_proto.data() } );
+                                  data } );
   }
 
   response.thunk_hash = response_proto.executed_thunks( 0 ).thunk_hash();
 
   return response;
 }
+
+string ExecutionResponse::request_payload( const gg::thunk::Thunk & thunk,
+                                           const bool binary_response )
+{
+  gg::protobuf::ExecutionRequest request = gg::thunk::Thunk::execution_message( { thunk } );
+
+  request.set_raw_outputs( true );
+  for ( const compression::Encoding encoding : compression::supported() ) {
+    request.add_accept_encodings( static_cast<gg::protobuf::Encoding>( encoding ) );
+  }
+  request.set_binary_response( binary_response );
+
+  return protoutil::to_json( request );
+}
+
+bool ExecutionResponse::is_binary( const HTTPResponse & http_response )
+{
+  return http_response.has_header( "Content-Type" ) and
+         http_response.get_header_value( "Content-Type" ).compare(
+           0, binary_content_type.length(), binary_content_type ) == 0;
+}
+
+ExecutionResponse::BlobCacheStats &
+ExecutionResponse::BlobCacheStats::operator+=( const BlobCacheStats & other )
+{
+  hits += other.hits;
+  misses += other.misses;
+  bytes_saved += other.bytes_saved;
+  bytes_fetched += other.bytes_fetched;
+  evicted_blobs += other.evicted_blobs;
+  evicted_bytes += other.evicted_bytes;
+  return *this;
+}
+
+string ExecutionResponse::BlobCacheStats::str() const
+{
+  if ( hits == 0 and misses == 0 ) {
+    return {};
+  }
+
+  return "blob cache: " + to_string( hits ) + " hits, " + to_string( misses )
+         + " misses, " + format_bytes( bytes_saved ) + " saved, "
+         + format_bytes( bytes_fetched ) + " fetched, "
+         + to_string( evicted_blobs ) + " evicted ("
+         + format_bytes( evicted_bytes ) + ")";
+}
+
+void FunctionStats::add( const ExecutionResponse & response )
+{
+  blob_cache_ += response.blob_cache;
+
+  if ( response.cold_start ) {
+    cold_starts_++;
+    init_seconds_ += response.init_seconds;
+  }
+}
+
+string FunctionStats::str() const
+{
+  string result = blob_cache_.str();
+
+  if ( cold_starts_ > 0 ) {
+    ostringstream cold;
+    cold << cold_starts_ << " cold start" << ( cold_starts_ == 1 ? "" : "s" )
+         << " (" << fixed << setprecision( 1 )
+         << ( 1000 * init_seconds_ / cold_starts_ ) << " ms init on average)";
+
+    result += ( result.empty() ? "" : "; " ) + cold.str();
+  }
+
+  return result;
+}
@@ -6,9 +6,12 @@
 #include <string>
 #include <vector>
 #include <exception>
+#include <cstdint>
 #include <stdexcept>
 #include <sys/types.h>
 
+#include "net/http_response.hh"
+#include "thunk/thunk.hh"
 #include "util/optional.hh"
 
 class FetchDependenciesError : public std::exception {};
@@ -37,7 +40,22 @@ public:
     std::string hash;
     off_t size;
     bool is_executable;
-    std::string data;
+    std::string data; /* decoded */
+  };
+
+  /* what the function's blob cache saved, reported by the Lambda and
+     Cloud Functions handlers */
+  struct BlobCacheStats
+  {
+    uint64_t hits { 0 };
+    uint64_t misses { 0 };
+    uint64_t bytes_saved { 0 };
+    uint64_t bytes_fetched { 0 };
+    uint64_t evicted_blobs { 0 };
+    uint64_t evicted_bytes { 0 };
+
+    BlobCacheStats & operator+=( const BlobCacheStats & other );
+    std::string str() const;
   };
 
 private:
@@ -51,7 +69,45 @@ public:
 
   std::string stdout {};
 
-  static ExecutionResponse parse_message( const std::string & message );
+  BlobCacheStats blob_cache {};
+
+  /* where the time of the invocation went, as ( phase, seconds ) in the
+     order of gg.protobuf.InvocationTimings; empty if the handler didn't
+     report it */
+  using Timings = std::vector<std::pair<std::string, double>>;
+  Timings timings {};
+
+  /* the function instance was started for this invocation, and spent
+     init_seconds setting up */
+  bool cold_start { false };
+  double init_seconds { 0 };
+
+  /* binary: message is a serialized gg.protobuf.ExecutionResponse
+     rather than JSON */
+  static ExecutionResponse parse_message( const std::string & message,
+                                          const bool binary = false );
+
+  /* execution request for thunk, asking for outputs as raw bytes,
+     compressed with any encoding this build supports and, if
+     binary_response, for a binary response (see gg.proto) */
+  static std::string request_payload( const gg::thunk::Thunk & thunk,
+                                      const bool binary_response );
+
+  static const std::string binary_content_type;
+  static bool is_binary( const HTTPResponse & http_response );
+};
+
+/* totals over the responses a function engine got, for its summary */
+class FunctionStats
+{
+private:
+  ExecutionResponse::BlobCacheStats blob_cache_ {};
+  size_t cold_starts_ { 0 };
+  double init_seconds_ { 0 };
+
+public:
+  void add( const ExecutionResponse & response );
+  std::string str() const;
 };
 
 #endif /* REMOTE_RESPONSE_HH */
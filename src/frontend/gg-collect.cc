@@ -1,8 +1,12 @@
 /* -*-mode:c++; tab-width: 2; indent-tabs-mode: nil; c-basic-offset: 2 -*- */
 
 #include <iostream>
+#include <vector>
+#include <getopt.h>
+#include <sys/stat.h>
 
 #include "thunk/ggutils.hh"
+#include "thunk/hash_cache.hh"
 #include "util/exception.hh"
 #include "util/path.hh"
 
@@ -11,7 +15,8 @@ using namespace gg;
 
 void usage( const char * argv0 )
 {
-  cerr << argv0 << " FILE..." << endl;
+  cerr << argv0 << " [--ingest, -i link|reflink|copy_file_range|sendfile|copy]"
+       << " [--report, -r] FILE..." << endl;
 }
 
 int main( int argc, char * argv[] )
@@ -26,21 +31,76 @@ int main( int argc, char * argv[] )
       return EXIT_FAILURE;
     }
 
+    const option cmd_options[] = {
+      { "ingest", required_argument, nullptr, 'i' },
+      { "report", no_argument,       nullptr, 'r' },
+      { nullptr,  0,                 nullptr, 0   },
+    };
+
+    roost::IngestMethod ingest_method = roost::IngestMethod::Reflink;
+    bool report = false;
+
+    while ( true ) {
+      const int opt = getopt_long( argc, argv, "i:r", cmd_options, nullptr );
+
+      if ( opt == -1 ) { break; }
+
+      switch ( opt ) {
+      case 'i':
+        ingest_method = roost::ingest_method( optarg );
+        break;
+
+      case 'r':
+        report = true;
+        break;
+
+      default:
+        usage( argv[ 0 ] );
+        return EXIT_FAILURE;
+      }
+    }
+
+    if ( optind >= argc ) {
+      usage( argv[ 0 ] );
+      return EXIT_FAILURE;
+    }
+
     gg::paths::blobs(); // Trigger the exception if GG_DIR is not set.
 
-    for ( int i = 1; i < argc; i++ ) {
+    vector<string> collected;
+
+    for ( int i = optind; i < argc; i++ ) {
       roost::path src { argv[ i ] };
       string hash = gg::hash::file( src );
       roost::path dst = gg::paths::blob( hash );
 
       if ( not roost::exists( dst ) ) {
         const mode_t permission = roost::is_executable( src ) ? 0500 : 0400;
-        roost::copy_then_rename( src, dst, true, permission );
+        const roost::IngestMethod used_method =
+          roost::ingest_file( src, dst, ingest_method, permission );
+
+        if ( used_method == roost::IngestMethod::Link ) {
+          /* linking and the chmod changed the ctime of src, so the entry that
+             gg::hash::file just put in the hash cache no longer matches */
+          struct stat src_info;
+          CheckSystemCall( "stat", stat( src.string().c_str(), &src_info ) );
+          HashCache::instance().put( src_info, hash );
+        }
+
+        if ( report ) {
+          cerr << roost::to_string( used_method ) << " " << src.string() << endl;
+        }
+      }
+      else if ( report ) {
+        cerr << "existing " << src.string() << endl;
       }
 
       cout << hash << endl;
+      collected.emplace_back( move( hash ) );
     }
 
+    gg::gc::record_access( collected );
+
     return EXIT_SUCCESS;
   }
   catch ( const exception &  e ) {
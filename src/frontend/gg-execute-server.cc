@@ -13,15 +13,56 @@
 #include "net/http_response.hh"
 #include "net/http_request_parser.hh"
 #include "execution/loop.hh"
+#include "execution/response.hh"
 #include "thunk/ggutils.hh"
 #include "thunk/thunk.hh"
 #include "util/system_runner.hh"
 #include "util/path.hh"
 #include "util/base64.hh"
+#include "util/compression.hh"
 
 using namespace std;
 using namespace gg;
 
+/* the best encoding that both the client and this build support */
+compression::Encoding pick_encoding( const protobuf::ExecutionRequest & request )
+{
+  for ( const compression::Encoding encoding : compression::supported() ) {
+    for ( const int accepted : request.accept_encodings() ) {
+      if ( accepted == static_cast<int>( encoding ) ) {
+        return encoding;
+      }
+    }
+  }
+
+  return compression::Encoding::Identity;
+}
+
+void set_output_data( protobuf::OutputItem & output_item, const string & data,
+                      const protobuf::ExecutionRequest & request )
+{
+  if ( not request.raw_outputs() ) {
+    output_item.set_data( base64::encode( data ) );
+    return;
+  }
+
+  compression::Encoding encoding = compression::Encoding::Identity;
+  string raw_data;
+
+  if ( data.size() >= compression::THRESHOLD ) {
+    encoding = pick_encoding( request );
+    raw_data = compression::compress( data, encoding );
+  }
+
+  if ( encoding == compression::Encoding::Identity or raw_data.size() >= data.size() ) {
+    encoding = compression::Encoding::Identity;
+    raw_data = data;
+  }
+
+  output_item.set_raw_data( move( raw_data ) );
+  output_item.set_encoding( static_cast<protobuf::Encoding>( encoding ) );
+}
+
 string get_canned_response( const int status, const HTTPRequest & request )
 {
   const static map<int, string> status_messages = {
@@ -140,15 +181,16 @@ int main( int argc, char * argv[] )
                       }
 
                       const auto output_path = paths::blob( result->hash );
-                      const string output_data = result->hash[ 0 ] == 'T'
-                                               ? base64::encode( roost::read_file( output_path ) )
-                                               : "";
 
                       output_item.set_tag( tag );
                       output_item.set_hash( result->hash );
                       output_item.set_size( roost::file_size( output_path ) );
                       output_item.set_executable( roost::is_executable( output_path ) );
-                      output_item.set_data( output_data );
+
+                      if ( result->hash[ 0 ] == 'T' ) {
+                        set_output_data( output_item, roost::read_file( output_path ),
+                                         exec_request );
+                      }
 
                       *execution_response.add_outputs() = output_item;
                     }
@@ -160,15 +202,20 @@ int main( int argc, char * argv[] )
                   response.set_return_code( status );
                   response.set_stdout( "" );
 
-                  const string response_json = protoutil::to_json( response );
+                  const bool binary = exec_request.binary_response();
+                  const string response_body = binary
+                                             ? protoutil::to_string( response )
+                                             : protoutil::to_json( response );
 
                   HTTPResponse http_response;
                   http_response.set_request( http_request );
                   http_response.set_first_line( "HTTP/1.1 200 OK" );
-                  http_response.add_header( HTTPHeader{ "Content-Length", to_string( response_json.size() ) } );
-                  http_response.add_header( HTTPHeader{ "Content-Type", "application/octet-stream" } );
+                  http_response.add_header( HTTPHeader{ "Content-Length", to_string( response_body.size() ) } );
+                  http_response.add_header( HTTPHeader{ "Content-Type",
+                                                        binary ? ExecutionResponse::binary_content_type
+                                                               : "application/octet-stream" } );
                   http_response.done_with_headers();
-                  http_response.read_in_body( response_json );
+                  http_response.read_in_body( response_body );
                   assert( http_response.state() == COMPLETE );
 
                   auto conn = conn_weak.lock();
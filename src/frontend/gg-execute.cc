@@ -3,11 +3,16 @@
 #include <iostream>
 #include <string>
 #include <memory>
+#include <algorithm>
+#include <chrono>
+#include <functional>
 #include <sys/fcntl.h>
 #include <getopt.h>
 #include <vector>
 #include <unordered_set>
+#include <sstream>
 
+#include "execution/loop.hh"
 #include "execution/response.hh"
 #include "net/requests.hh"
 #include "storage/backend.hh"
@@ -31,8 +36,9 @@ using namespace gg::thunk;
 using ReductionResult = gg::cache::ReductionResult;
 
 const bool sandboxed = ( getenv( "GG_SANDBOXED" ) != NULL );
-const string temp_dir_template = "/tmp/thunk-execute";
-const string temp_file_template = "/tmp/thunk-file";
+const string temp_root = safe_getenv_or( "TMPDIR", "/tmp" );
+const string temp_dir_template = temp_root + "/thunk-execute";
+const string temp_file_template = temp_root + "/thunk-file";
 
 vector<string> execute_thunk( const Thunk & original_thunk )
 {
@@ -141,6 +147,8 @@ vector<string> execute_thunk( const Thunk & original_thunk )
     output_hashes.emplace_back( move( outfile_hash ) );
   }
 
+  gg::gc::record_access( output_hashes );
+
   for ( size_t i = thunk.outputs().size() - 1; i < thunk.outputs().size(); i-- ) {
     const string & output = thunk.outputs().at( i );
     const string & outfile_hash = output_hashes.at( i );
@@ -161,11 +169,10 @@ vector<string> execute_thunk( const Thunk & original_thunk )
   return output_hashes;
 }
 
-void do_cleanup( const Thunk & thunk )
+void do_cleanup( const Thunk & thunk, const vector<string> & batch )
 {
-  unordered_set<string> infile_hashes;
-
-  infile_hashes.emplace( thunk.hash() );
+  /* the other thunks in the batch are still needed */
+  unordered_set<string> infile_hashes { batch.begin(), batch.end() };
 
   for ( const Thunk::DataItem & item : thunk.values() ) {
     infile_hashes.emplace( item.first );
@@ -184,19 +191,26 @@ void do_cleanup( const Thunk & thunk )
 }
 
 void fetch_dependencies( unique_ptr<StorageBackend> & storage_backend,
-                         const Thunk & thunk )
+                         const vector<Thunk> & thunks )
 {
   try {
     vector<storage::GetRequest> download_items;
+    unordered_set<string> requested;
     bool executables = false;
 
     auto check_dep =
-      [&download_items, &executables]( const Thunk::DataItem & item ) -> void
+      [&download_items, &requested, &executables]( const Thunk::DataItem & item ) -> void
       {
         const auto target_path = gg::paths::blob( item.first );
 
+        if ( requested.count( item.first ) ) {
+          return;
+        }
+
         if ( not roost::exists( target_path )
              or roost::file_size( target_path ) != gg::hash::size( item.first ) ) {
+          requested.insert( item.first );
+
           if ( executables ) {
             download_items.push_back( { item.first, target_path, 0544 } );
           }
@@ -206,12 +220,15 @@ void fetch_dependencies( unique_ptr<StorageBackend> & storage_backend,
         }
       };
 
-    for_each( thunk.values().cbegin(), thunk.values().cend(),
-              check_dep );
+    for ( const Thunk & thunk : thunks ) {
+      executables = false;
+      for_each( thunk.values().cbegin(), thunk.values().cend(),
+                check_dep );
 
-    executables = true;
-    for_each( thunk.executables().cbegin(), thunk.executables().cend(),
-              check_dep );
+      executables = true;
+      for_each( thunk.executables().cbegin(), thunk.executables().cend(),
+                check_dep );
+    }
 
     if ( download_items.size() > 0 ) {
       storage_backend->get( download_items );
@@ -238,6 +255,515 @@ void upload_output( unique_ptr<StorageBackend> & storage_backend,
   }
 }
 
+struct ExecutionOptions
+{
+  bool get_dependencies { false };
+  bool put_output { false };
+  bool cleanup { false };
+  bool timelog { false };
+};
+
+/* how long each phase of a batch kept at least one process busy, and how
+   much of that time overlapped with the other phases */
+class PhaseTimes
+{
+private:
+  using Clock = chrono::steady_clock;
+  using Interval = pair<Clock::time_point, Clock::time_point>;
+
+  const chrono::milliseconds start_ {
+    chrono::duration_cast<chrono::milliseconds>(
+      chrono::system_clock::now().time_since_epoch() ) };
+  const Clock::time_point begin_ { Clock::now() };
+  vector<pair<string, vector<Interval>>> phases_ {};
+
+  static int64_t busy_ms( vector<Interval> intervals )
+  {
+    sort( intervals.begin(), intervals.end() );
+
+    Clock::duration busy { 0 };
+    Optional<Interval> current;
+
+    for ( const Interval & interval : intervals ) {
+      if ( current.initialized() and interval.first <= current->second ) {
+        current->second = max( current->second, interval.second );
+        continue;
+      }
+
+      if ( current.initialized() ) {
+        busy += current->second - current->first;
+      }
+      current.reset( interval );
+    }
+
+    if ( current.initialized() ) {
+      busy += current->second - current->first;
+    }
+
+    return chrono::duration_cast<chrono::milliseconds>( busy ).count();
+  }
+
+public:
+  PhaseTimes( const vector<string> & phases )
+  {
+    for ( const string & phase : phases ) {
+      phases_.emplace_back( phase, vector<Interval> {} );
+    }
+  }
+
+  static Clock::time_point now() { return Clock::now(); }
+
+  void add( const string & phase, const Clock::time_point & begin )
+  {
+    for ( auto & entry : phases_ ) {
+      if ( entry.first == phase ) {
+        entry.second.emplace_back( begin, Clock::now() );
+      }
+    }
+  }
+
+  /* in the format of TimeLog: the start time, then a line for each phase */
+  string str() const
+  {
+    ostringstream oss;
+    oss << start_.count() << endl;
+
+    vector<Interval> all;
+    int64_t total_busy = 0;
+
+    for ( const auto & entry : phases_ ) {
+      const int64_t busy = busy_ms( entry.second );
+      oss << entry.first << " " << busy << endl;
+
+      total_busy += busy;
+      all.insert( all.end(), entry.second.begin(), entry.second.end() );
+    }
+
+    const int64_t wall = chrono::duration_cast<chrono::milliseconds>(
+      Clock::now() - begin_ ).count();
+
+    oss << "wall " << wall << endl
+        << "overlap " << max<int64_t>( 0, total_busy - busy_ms( all ) ) << endl;
+
+    return oss.str();
+  }
+};
+
+/* runs a step of the execution, reporting its failure instead of throwing */
+JobStatus run_stage( const function<void()> & stage, const char * argv0 )
+{
+  try {
+    stage();
+    return JobStatus::Success;
+  }
+  catch ( const FetchDependenciesError & e ) {
+    print_nested_exception( e );
+    return JobStatus::FetchDependenciesFailure;
+  }
+  catch ( const ExecutionError & e ) {
+    print_nested_exception( e );
+    return JobStatus::ExecutionFailure;
+  }
+  catch ( const UploadOutputError & e ) {
+    print_nested_exception( e );
+    return JobStatus::UploadOutputFailure;
+  }
+  catch ( const exception & e ) {
+    print_exception( argv0, e );
+    return JobStatus::OperationalFailure;
+  }
+}
+
+/* take out an advisory lock on the thunk, in case
+   other gg-execute processes are running at the same time */
+FileDescriptor lock_thunk( const string & thunk_hash )
+{
+  const string thunk_path = gg::paths::blob( thunk_hash ).string();
+  FileDescriptor raw_thunk { CheckSystemCall( "open( " + thunk_path + " )",
+                                              open( thunk_path.c_str(), O_RDONLY ) ) };
+  raw_thunk.block_for_exclusive_lock();
+  return raw_thunk;
+}
+
+Thunk read_thunk( const string & thunk_hash )
+{
+  Thunk thunk = ThunkReader::read( gg::paths::blob( thunk_hash ) );
+
+  vector<string> accessed { thunk_hash };
+  for ( const Thunk::DataItem & item : thunk.values() ) {
+    accessed.emplace_back( item.first );
+  }
+  for ( const Thunk::DataItem & item : thunk.executables() ) {
+    accessed.emplace_back( item.first );
+  }
+  gg::gc::record_access( accessed );
+
+  return thunk;
+}
+
+/* timelogs: ( name, log ) */
+void save_timelogs( const vector<pair<string, string>> & timelogs,
+                    unique_ptr<StorageBackend> & storage_backend )
+{
+  if ( storage_backend == nullptr ) {
+    for ( const auto & timelog : timelogs ) {
+      cout << timelog.second << endl;
+    }
+    return;
+  }
+
+  vector<TempFile> tmplogs;
+  vector<storage::PutRequest> requests;
+
+  for ( const auto & timelog : timelogs ) {
+    tmplogs.emplace_back( temp_root + "/timelog" );
+    tmplogs.back().fd().write( timelog.second, true );
+    tmplogs.back().fd().close();
+
+    requests.emplace_back( tmplogs.back().name(), "timelog/" + timelog.first );
+  }
+
+  storage_backend->put( requests );
+}
+
+/* runs one thunk of the batch; failures are reported, not thrown */
+JobStatus execute( const string & thunk_hash,
+                   const vector<string> & batch,
+                   const ExecutionOptions & options,
+                   PhaseTimes & phase_times,
+                   const char * argv0 )
+{
+  return run_stage( [&]() {
+    Optional<TimeLog> timelog;
+    unique_ptr<StorageBackend> storage_backend;
+
+    if ( options.timelog ) { timelog.reset(); }
+
+    FileDescriptor raw_thunk = lock_thunk( thunk_hash );
+    Thunk thunk = read_thunk( thunk_hash );
+
+    if ( timelog.initialized() ) { timelog->add_point( "read_thunk" ); }
+
+    if ( options.get_dependencies or options.put_output ) {
+      storage_backend = StorageBackend::create_backend( gg::remote::storage_backend_uri() );
+    }
+
+    if ( options.cleanup ) {
+      do_cleanup( thunk, batch );
+    }
+
+    if ( timelog.initialized() ) { timelog->add_point( "do_cleanup" ); }
+
+    auto begin = PhaseTimes::now();
+
+    if ( options.get_dependencies ) {
+      fetch_dependencies( storage_backend, { thunk } );
+      phase_times.add( "fetch", begin );
+    }
+
+    if ( timelog.initialized() ) { timelog->add_point( "get_dependencies" ); }
+
+    begin = PhaseTimes::now();
+    vector<string> output_hashes = execute_thunk( thunk );
+    phase_times.add( "execute", begin );
+
+    if ( timelog.initialized() ) { timelog->add_point( "execute" ); }
+
+    if ( options.put_output ) {
+      begin = PhaseTimes::now();
+      upload_output( storage_backend, output_hashes );
+      phase_times.add( "upload", begin );
+    }
+
+    if ( timelog.initialized() ) {
+      timelog->add_point( "upload_output" );
+      save_timelogs( { { thunk_hash, timelog->str() } }, storage_backend );
+    }
+  }, argv0 );
+}
+
+/* fetches the dependencies of the whole batch at once, so the thunks that
+   run in parallel don't download the same blobs. the thunks that can't be
+   read here are left for execute() to report. */
+void prefetch_dependencies( const vector<string> & thunk_hashes,
+                            PhaseTimes & phase_times )
+{
+  const auto begin = PhaseTimes::now();
+
+  vector<Thunk> thunks;
+
+  for ( const string & thunk_hash : thunk_hashes ) {
+    try {
+      thunks.emplace_back( ThunkReader::read( gg::paths::blob( thunk_hash ) ) );
+    }
+    catch ( const exception & ) {}
+  }
+
+  try {
+    auto storage_backend = StorageBackend::create_backend( gg::remote::storage_backend_uri() );
+    fetch_dependencies( storage_backend, thunks );
+  }
+  catch ( const exception & e ) {
+    /* each thunk tries again on its own, and reports its own failure */
+    print_nested_exception( e );
+  }
+
+  phase_times.add( "fetch", begin );
+}
+
+/* runs the batch as a pipeline: the dependencies of the next thunks are
+   fetched while a thunk executes, and outputs are uploaded as soon as they
+   are produced. the fetches go in order, one group of up to `jobs` thunks
+   at a time, so a blob that two thunks share is only downloaded once; the
+   fetch and the upload that are in flight split max_requests between them. */
+vector<JobStatus> execute_pipelined( const vector<string> & thunk_hashes,
+                                     const ExecutionOptions & options,
+                                     const size_t jobs,
+                                     const size_t max_requests,
+                                     PhaseTimes & phase_times,
+                                     const char * argv0 )
+{
+  const size_t count = thunk_hashes.size();
+  const size_t requests_per_process = max<size_t>( 1, max_requests / 2 );
+
+  vector<JobStatus> statuses( count, JobStatus::Success );
+  vector<unique_ptr<Thunk>> thunks( count );
+  vector<vector<string>> output_hashes( count );
+  vector<FileDescriptor> locks;
+  vector<TimeLog> timelogs( options.timelog ? count : 0 );
+
+  auto add_point =
+    [&timelogs]( const size_t index, const string & title )
+    {
+      if ( not timelogs.empty() ) { timelogs[ index ].add_point( title ); }
+    };
+
+  for ( size_t i = 0; i < count; i++ ) {
+    statuses[ i ] = run_stage( [&]() {
+      locks.emplace_back( lock_thunk( thunk_hashes[ i ] ) );
+      thunks[ i ] = make_unique<Thunk>( read_thunk( thunk_hashes[ i ] ) );
+    }, argv0 );
+
+    add_point( i, "read_thunk" );
+  }
+
+  ExecutionLoop exec_loop;
+
+  size_t next_fetch = 0;
+  size_t fetched = 0; /* thunks that are done with their fetch, in order */
+  bool fetching = false;
+  vector<size_t> fetch_retries; /* thunks of a failed group, last first */
+
+  size_t next_execute = 0;
+  size_t running = 0;
+
+  vector<size_t> upload_queue;
+  bool uploading = false;
+
+  size_t finished = 0;
+
+  auto finish =
+    [&statuses, &finished]( const size_t index, const JobStatus status )
+    {
+      statuses[ index ] = status;
+      finished++;
+    };
+
+  for ( size_t i = 0; i < count; i++ ) {
+    if ( statuses[ i ] != JobStatus::Success ) {
+      finished++;
+    }
+  }
+
+  auto start_fetch =
+    [&]( const vector<size_t> & group, const size_t end )
+    {
+      fetching = true;
+
+      exec_loop.add_child_process( "fetch",
+        [&, group, end, begin = PhaseTimes::now()]
+        ( const uint64_t, const string &, const int status )
+        {
+          phase_times.add( "fetch", begin );
+          fetching = false;
+
+          if ( status and group.size() > 1 ) {
+            /* a thunk whose dependencies can't be fetched fails the whole
+               group; fetch them one at a time, so that the others still run */
+            fetch_retries.insert( fetch_retries.end(), group.rbegin(), group.rend() );
+            return;
+          }
+
+          for ( const size_t index : group ) {
+            add_point( index, "get_dependencies" );
+
+            if ( status ) {
+              finish( index, static_cast<JobStatus>( status ) );
+            }
+          }
+
+          if ( fetch_retries.empty() ) {
+            fetched = end;
+          }
+        },
+        [&, group]()
+        {
+          return to_underlying( run_stage( [&]() {
+            vector<Thunk> group_thunks;
+            for ( const size_t index : group ) {
+              group_thunks.push_back( *thunks[ index ] );
+            }
+
+            auto storage_backend = StorageBackend::create_backend(
+              gg::remote::storage_backend_uri(), requests_per_process );
+            fetch_dependencies( storage_backend, group_thunks );
+          }, argv0 ) );
+        },
+        false );
+    };
+
+  while ( finished < count ) {
+    /* fetch the dependencies of the next thunks, as many as can run at
+       once, while the ones before them run */
+    if ( not fetching and not fetch_retries.empty() ) {
+      const size_t index = fetch_retries.back();
+      fetch_retries.pop_back();
+      start_fetch( { index }, next_fetch );
+    }
+
+    while ( not fetching and next_fetch < count ) {
+      vector<size_t> group;
+
+      for ( ; next_fetch < count and group.size() < jobs; next_fetch++ ) {
+        if ( statuses[ next_fetch ] == JobStatus::Success and options.get_dependencies ) {
+          group.push_back( next_fetch );
+          add_point( next_fetch, "fetch_wait" );
+        }
+      }
+
+      if ( group.empty() ) {
+        fetched = next_fetch;
+      }
+      else {
+        start_fetch( group, next_fetch );
+      }
+    }
+
+    /* execute the thunks whose dependencies are in place */
+    while ( running < jobs and next_execute < fetched ) {
+      const size_t index = next_execute++;
+
+      if ( statuses[ index ] != JobStatus::Success ) {
+        continue;
+      }
+
+      add_point( index, "execute_wait" );
+      running++;
+
+      exec_loop.add_child_process( thunk_hashes[ index ],
+        [&, index, begin = PhaseTimes::now()]( const uint64_t, const string &, const int status )
+        {
+          phase_times.add( "execute", begin );
+          add_point( index, "execute" );
+          running--;
+
+          if ( status ) {
+            finish( index, static_cast<JobStatus>( status ) );
+            return;
+          }
+
+          for ( const string & tag : thunks[ index ]->outputs() ) {
+            const auto result = gg::cache::check( thunks[ index ]->output_hash( tag ) );
+
+            if ( not result.initialized() ) {
+              finish( index, JobStatus::ExecutionFailure );
+              return;
+            }
+
+            output_hashes[ index ].push_back( result->hash );
+          }
+
+          if ( options.put_output ) {
+            upload_queue.push_back( index );
+          }
+          else {
+            finish( index, JobStatus::Success );
+          }
+        },
+        [&, index]()
+        {
+          return to_underlying( run_stage( [&]() {
+            execute_thunk( *thunks[ index ] );
+          }, argv0 ) );
+        },
+        false );
+    }
+
+    /* upload everything that was produced since the last upload started */
+    if ( not uploading and not upload_queue.empty() ) {
+      const vector<size_t> batch = move( upload_queue );
+      upload_queue.clear();
+      uploading = true;
+
+      for ( const size_t index : batch ) {
+        add_point( index, "upload_wait" );
+      }
+
+      exec_loop.add_child_process( "upload",
+        [&, batch, begin = PhaseTimes::now()]( const uint64_t, const string &, const int status )
+        {
+          phase_times.add( "upload", begin );
+
+          for ( const size_t index : batch ) {
+            add_point( index, "upload_output" );
+            finish( index, static_cast<JobStatus>( status ) );
+          }
+
+          uploading = false;
+        },
+        [&, batch]()
+        {
+          return to_underlying( run_stage( [&]() {
+            vector<string> hashes;
+            for ( const size_t index : batch ) {
+              hashes.insert( hashes.end(), output_hashes[ index ].begin(),
+                             output_hashes[ index ].end() );
+            }
+
+            auto storage_backend = StorageBackend::create_backend(
+              gg::remote::storage_backend_uri(), requests_per_process );
+            upload_output( storage_backend, hashes );
+          }, argv0 ) );
+        },
+        false );
+    }
+
+    if ( finished < count ) {
+      exec_loop.loop_once();
+    }
+  }
+
+  if ( options.timelog ) {
+    run_stage( [&]() {
+      unique_ptr<StorageBackend> storage_backend;
+      if ( options.get_dependencies or options.put_output ) {
+        storage_backend = StorageBackend::create_backend(
+          gg::remote::storage_backend_uri(), max_requests );
+      }
+
+      vector<pair<string, string>> logs;
+      for ( size_t i = 0; i < count; i++ ) {
+        logs.emplace_back( thunk_hashes[ i ], timelogs[ i ].str() );
+      }
+      logs.emplace_back( "pipeline/" + thunk_hashes.front(), phase_times.str() );
+
+      save_timelogs( logs, storage_backend );
+    }, argv0 );
+  }
+
+  return statuses;
+}
+
 void usage( const char * argv0 )
 {
   cerr << "Usage: " << argv0 << " [options] THUNK-HASH..." << endl
@@ -247,6 +773,11 @@ void usage( const char * argv0 )
   << " -p, --put-output        Upload the output to the remote storage" << endl
   << " -C, --cleanup           Remove unnecessary blobs in .gg dir" << endl
   << " -T, --timelog           Produce timing log for this execution" << endl
+  << " -j, --jobs=N            Execute up to N thunks in parallel (default: 1)" << endl
+  << " -s, --status-file=FILE  Write the status of each thunk to FILE" << endl
+  << " -P, --pipeline          Fetch, execute and upload different thunks at the same time" << endl
+  << " -r, --max-requests=N    Keep at most N storage requests in flight (default: 32)" << endl
+  << " -t, --timings-file=FILE Write the time spent fetching, executing and uploading to FILE" << endl
   << endl;
 }
 
@@ -262,38 +793,57 @@ int main( int argc, char * argv[] )
       return to_underlying( JobStatus::OperationalFailure );
     }
 
-    bool get_dependencies = false;
-    bool put_output = false;
-    bool cleanup = false;
-    Optional<TimeLog> timelog;
-    unique_ptr<StorageBackend> storage_backend;
+    ExecutionOptions options;
+    size_t jobs = 1;
+    string status_file;
+    bool pipeline = false;
+    size_t max_requests = 32;
+    string timings_file;
 
     const option command_line_options[] = {
-      { "get-dependencies", no_argument, nullptr, 'g' },
-      { "put-output",       no_argument, nullptr, 'p' },
-      { "cleanup",          no_argument, nullptr, 'C' },
-      { "timelog",          no_argument, nullptr, 'T' },
+      { "get-dependencies", no_argument,       nullptr, 'g' },
+      { "put-output",       no_argument,       nullptr, 'p' },
+      { "cleanup",          no_argument,       nullptr, 'C' },
+      { "timelog",          no_argument,       nullptr, 'T' },
+      { "jobs",             required_argument, nullptr, 'j' },
+      { "status-file",      required_argument, nullptr, 's' },
+      { "pipeline",         no_argument,       nullptr, 'P' },
+      { "max-requests",     required_argument, nullptr, 'r' },
+      { "timings-file",     required_argument, nullptr, 't' },
       { nullptr, 0, nullptr, 0 },
     };
 
     while ( true ) {
-      const int opt = getopt_long( argc, argv, "gpCT", command_line_options, nullptr );
+      const int opt = getopt_long( argc, argv, "gpCTj:s:Pr:t:", command_line_options, nullptr );
 
       if ( opt == -1 ) {
         break;
       }
 
       switch ( opt ) {
-      case 'g': get_dependencies = true; break;
-      case 'p': put_output = true; break;
-      case 'C': cleanup = true; break;
-      case 'T': timelog.reset(); break;
+      case 'g': options.get_dependencies = true; break;
+      case 'p': options.put_output = true; break;
+      case 'C': options.cleanup = true; break;
+      case 'T': options.timelog = true; break;
+      case 'j': jobs = stoul( optarg ); break;
+      case 's': status_file = optarg; break;
+      case 'P': pipeline = true; break;
+      case 'r': max_requests = stoul( optarg ); break;
+      case 't': timings_file = optarg; break;
 
       default:
         throw runtime_error( "invalid option: " + string { argv[ optind - 1 ] } );
       }
     }
 
+    if ( jobs == 0 ) {
+      throw runtime_error( "jobs cannot be zero" );
+    }
+
+    if ( max_requests == 0 ) {
+      throw runtime_error( "max requests cannot be zero" );
+    }
+
     vector<string> thunk_hashes;
 
     for ( int i = optind; i < argc; i++ ) {
@@ -305,74 +855,86 @@ int main( int argc, char * argv[] )
       return to_underlying( JobStatus::OperationalFailure );
     }
 
-    gg::models::init();
+    if ( options.cleanup and ( jobs > 1 or pipeline ) ) {
+      throw runtime_error( "--cleanup cannot be used with --jobs or --pipeline" );
+    }
 
-    for ( const string & thunk_hash : thunk_hashes ) {
-      /* take out an advisory lock on the thunk, in case
-         other gg-execute processes are running at the same time */
-      const string thunk_path = gg::paths::blob( thunk_hash ).string();
-      FileDescriptor raw_thunk { CheckSystemCall( "open( " + thunk_path + " )",
-                                                  open( thunk_path.c_str(), O_RDONLY ) ) };
-      raw_thunk.block_for_exclusive_lock();
+    /* gg-gc waits until this run is done */
+    gg::gc::hold_lock();
 
-      Thunk thunk = ThunkReader::read( thunk_path );
+    gg::models::init();
 
-      if ( timelog.initialized() ) { timelog->add_point( "read_thunk" ); }
+    /* a failed thunk doesn't stop the rest of the batch */
+    vector<JobStatus> statuses( thunk_hashes.size(), JobStatus::Success );
+    PhaseTimes phase_times { { "fetch", "execute", "upload" } };
 
-      if ( get_dependencies or put_output ) {
-        storage_backend = StorageBackend::create_backend( gg::remote::storage_backend_uri() );
+    if ( pipeline ) {
+      statuses = execute_pipelined( thunk_hashes, options, jobs, max_requests,
+                                    phase_times, argv[ 0 ] );
+    }
+    else if ( jobs == 1 or thunk_hashes.size() == 1 ) {
+      for ( size_t i = 0; i < thunk_hashes.size(); i++ ) {
+        statuses[ i ] = execute( thunk_hashes[ i ], thunk_hashes, options,
+                                 phase_times, argv[ 0 ] );
       }
-
-      if ( cleanup ) {
-        do_cleanup( thunk );
+    }
+    else {
+      if ( options.get_dependencies ) {
+        prefetch_dependencies( thunk_hashes, phase_times );
       }
 
-      if ( timelog.initialized() ) { timelog->add_point( "do_cleanup" ); }
+      ExecutionLoop exec_loop;
+      size_t next = 0;
+      size_t running = 0;
+
+      while ( next < thunk_hashes.size() or running > 0 ) {
+        while ( running < jobs and next < thunk_hashes.size() ) {
+          const size_t index = next++;
+          running++;
+
+          /* the children can't report their phases, so all of their
+             time counts as execution */
+          exec_loop.add_child_process( thunk_hashes[ index ],
+            [&statuses, &running, &phase_times, index, begin = PhaseTimes::now()]
+            ( const uint64_t, const string &, const int status )
+            {
+              statuses[ index ] = static_cast<JobStatus>( status );
+              phase_times.add( "execute", begin );
+              running--;
+            },
+            [&thunk_hashes, &options, &phase_times, index, argv]()
+            {
+              return to_underlying( execute( thunk_hashes[ index ], thunk_hashes,
+                                             options, phase_times, argv[ 0 ] ) );
+            },
+            false );
+        }
 
-      if ( get_dependencies ) {
-        fetch_dependencies( storage_backend, thunk );
+        exec_loop.loop_once();
       }
+    }
 
-      if ( timelog.initialized() ) { timelog->add_point( "get_dependencies" ); }
-
-      vector<string> output_hashes = execute_thunk( thunk );
-
-      if ( timelog.initialized() ) { timelog->add_point( "execute" ); }
+    if ( not timings_file.empty() ) {
+      roost::atomic_create( phase_times.str(), timings_file );
+    }
 
-      if ( put_output ) {
-        upload_output( storage_backend, output_hashes );
+    if ( not status_file.empty() ) {
+      ostringstream status_lines;
+      for ( size_t i = 0; i < thunk_hashes.size(); i++ ) {
+        status_lines << thunk_hashes[ i ] << " "
+                     << to_underlying( statuses[ i ] ) << endl;
       }
+      roost::atomic_create( status_lines.str(), status_file );
+    }
 
-      if ( timelog.initialized() ) { timelog->add_point( "upload_output" ); }
-
-      if ( timelog.initialized() and storage_backend != nullptr ) {
-        TempFile tmplog { "/tmp/timelog" };
-        tmplog.fd().write( timelog->str(), true );
-        tmplog.fd().close();
-
-        vector<storage::PutRequest> requests;
-        requests.emplace_back( tmplog.name(), "timelog/" + thunk_hash );
-        storage_backend->put( requests );
-      }
-      else if ( timelog.initialized() ) {
-        cout << timelog->str() << endl;
+    for ( const JobStatus status : statuses ) {
+      if ( status != JobStatus::Success ) {
+        return to_underlying( status );
       }
     }
 
     return to_underlying( JobStatus::Success );
   }
-  catch ( const FetchDependenciesError & e ) {
-    print_nested_exception( e );
-    return to_underlying( JobStatus::FetchDependenciesFailure );
-  }
-  catch ( const ExecutionError & e ) {
-    print_nested_exception( e );
-    return to_underlying( JobStatus::ExecutionFailure );
-  }
-  catch ( const UploadOutputError & e ) {
-    print_nested_exception( e );
-    return to_underlying( JobStatus::UploadOutputFailure );
-  }
   catch ( const exception & e ) {
     print_exception( argv[ 0 ], e );
     return to_underlying( JobStatus::OperationalFailure );
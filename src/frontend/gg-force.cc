@@ -14,6 +14,7 @@
 #include "storage/backend_local.hh"
 #include "storage/backend_s3.hh"
 #include "thunk/ggutils.hh"
+#include "thunk/graph_manifest.hh"
 #include "thunk/placeholder.hh"
 #include "thunk/thunk_reader.hh"
 #include "thunk/thunk.hh"
@@ -26,6 +27,7 @@
 #include "tui/status_bar.hh"
 #include "util/digest.hh"
 #include "util/exception.hh"
+#include "util/file_descriptor.hh"
 #include "util/optional.hh"
 #include "util/path.hh"
 #include "util/timeit.hh"
@@ -50,7 +52,9 @@ void usage( const char * argv0 )
        << "       " << "[-s|--no-status] [-d|--no-download] [-S|--sandboxed]" << endl
        << "       " << "[[-j|--jobs=<N>] [-e|--engine=<name>[=ENGINE_ARGS]]]... " << endl
        << "       " << "[[-j|--jobs=<N>] [-f|--fallback-engine=<name>[=ENGINE_ARGS]]]..." << endl
-       << "       " << "[-T|--timeout=<t>] [-m|--timeout-multiplier=<N>] THUNKS..." << endl
+       << "       " << "[-T|--timeout=<t>] [-m|--timeout-multiplier=<N>]" << endl
+       << "       " << "[-P|--progress-fd=<fd>] [-L|--timelog=<file>]" << endl
+       << "       " << "[-g|--graph=<manifest>] THUNKS..." << endl
        << endl
        << "Available engines:" << endl
        << "  - local   Executes the jobs on the local machine" << endl
@@ -59,6 +63,23 @@ void usage( const char * argv0 )
        << "  - meow    Executes the jobs on AWS Lambda with long-running workers" << endl
        << "  - gcloud  Executes the jobs on Google Cloud Functions" << endl
        << endl
+       << "Progress lines written to --progress-fd:" << endl
+       << "  - job <thunk-hash> <milliseconds>       a job finished" << endl
+       << "  - target <thunk-hash> <output-hash>     a target is reduced (and" << endl
+       << "                                          downloaded, unless -d)" << endl
+       << endl
+       << "Lines written to --timelog, one for every finished job:" << endl
+       << "  <thunk-hash> <milliseconds> [<phase>=<milliseconds>]..." << endl
+       << "  where the phases (init, thunk_write, fetch, execute, collect and" << endl
+       << "  upload) are reported by the lambda and gcloud functions" << endl
+       << endl
+       << "With --graph, the thunks and targets are read from a graph manifest" << endl
+       << "written by the SDK, and the outputs go to the target names it lists." << endl
+       << endl
+       << "meow workers invoked with GG_MEOW_IDLE_TIMEOUT=<seconds> outlive the run" << endl
+       << "and reconnect to the next one on the same address, keeping their objects;" << endl
+       << "with GG_MEOW_ATTACH set, only such already-running workers are used." << endl
+       << endl
        << "Environment variables:" << endl
        << "  - " << FORCE_NO_STATUS << endl
        << "  - " << FORCE_DEFAULT_ENGINE << endl
@@ -168,6 +189,9 @@ int main( int argc, char * argv[] )
     size_t timeout_multiplier = 1;
     bool status_bar = !( getenv( FORCE_NO_STATUS ) != nullptr );
     bool no_download = false;
+    unique_ptr<FileDescriptor> progress_fd;
+    string timelog_filename;
+    string graph_filename;
 
     size_t total_max_jobs = 0;
     size_t max_jobs = thread::hardware_concurrency();
@@ -183,11 +207,14 @@ int main( int argc, char * argv[] )
       { "engine",             required_argument, nullptr, 'e' },
       { "fallback-engine",    required_argument, nullptr, 'f' },
       { "no-download",        no_argument,       nullptr, 'd' },
+      { "progress-fd",        required_argument, nullptr, 'P' },
+      { "timelog",            required_argument, nullptr, 'L' },
+      { "graph",              required_argument, nullptr, 'g' },
       { nullptr,              0,                 nullptr,  0  },
     };
 
     while ( true ) {
-      const int opt = getopt_long( argc, argv, "sSj:T:e:d", long_options, NULL );
+      const int opt = getopt_long( argc, argv, "sSj:T:e:dP:L:g:", long_options, NULL );
 
       if ( opt == -1 ) {
         break;
@@ -228,6 +255,18 @@ int main( int argc, char * argv[] )
         timeout_multiplier = stoul( optarg );
         break;
 
+      case 'P':
+        progress_fd = make_unique<FileDescriptor>( stoi( optarg ) );
+        break;
+
+      case 'L':
+        timelog_filename = optarg;
+        break;
+
+      case 'g':
+        graph_filename = optarg;
+        break;
+
       default:
         throw runtime_error( "invalid option" );
       }
@@ -241,14 +280,30 @@ int main( int argc, char * argv[] )
 
     gg::models::init();
 
+    /* gg-gc waits until this run is done */
+    gg::gc::hold_lock();
+
     vector<string> target_filenames;
     vector<string> target_hashes;
+    vector<Thunk> preloaded_thunks;
+
+    if ( not graph_filename.empty() ) {
+      GraphManifest graph { graph_filename };
+      preloaded_thunks = move( graph.thunks() );
+
+      for ( const GraphManifest::Target & target : graph.targets() ) {
+        target_hashes.emplace_back( target.first );
+        target_filenames.emplace_back( target.second );
+      }
+    }
 
     for ( int i = optind; i < argc; i++ ) {
       target_filenames.emplace_back( argv[ i ] );
     }
 
-    for ( const string & target_filename : target_filenames ) {
+    /* the targets from the graph manifest are already hashed */
+    for ( size_t i = target_hashes.size(); i < target_filenames.size(); i++ ) {
+      const string & target_filename = target_filenames[ i ];
       string thunk_hash;
 
       /* first check if this file is actually a placeholder */
@@ -304,13 +359,32 @@ int main( int argc, char * argv[] )
                         move( fallback_engines ),
                         move( storage_backend ),
                         std::chrono::milliseconds { timeout * 1000 },
-                        timeout_multiplier, status_bar };
+                        timeout_multiplier, status_bar,
+                        move( preloaded_thunks ) };
+
+    if ( timelog_filename.length() ) {
+      reductor.set_timelog( timelog_filename );
+    }
+
+    reductor.set_download_outputs( not no_download );
+
+    if ( progress_fd ) {
+      reductor.set_job_callback(
+        [&progress_fd] ( const string & hash, const chrono::milliseconds latency )
+        {
+          progress_fd->write( "job " + hash + " " + to_string( latency.count() ) + "\n" );
+        } );
+
+      reductor.set_target_callback(
+        [&progress_fd] ( const string & hash, const string & output_hash )
+        {
+          progress_fd->write( "target " + hash + " " + output_hash + "\n" );
+        } );
+    }
 
     reductor.upload_dependencies();
     vector<string> reduced_hashes = reductor.reduce();
     if ( not no_download ) {
-      reductor.download_targets( reduced_hashes );
-
       for ( size_t i = 0; i < reduced_hashes.size(); i++ ) {
         roost::copy_then_rename( gg::paths::blob( reduced_hashes[ i ] ), target_filenames[ i ] );
 
@@ -0,0 +1,481 @@
+/* -*-mode:c++; tab-width: 2; indent-tabs-mode: nil; c-basic-offset: 2 -*- */
+
+#include <iostream>
+#include <fstream>
+#include <string>
+#include <vector>
+#include <deque>
+#include <algorithm>
+#include <unordered_map>
+#include <unordered_set>
+#include <ctime>
+#include <cstdlib>
+#include <getopt.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/stat.h>
+
+#include "thunk/ggutils.hh"
+#include "thunk/placeholder.hh"
+#include "thunk/thunk_reader.hh"
+#include "thunk/thunk.hh"
+#include "util/exception.hh"
+#include "util/file_descriptor.hh"
+#include "util/path.hh"
+
+using namespace std;
+using namespace gg;
+using namespace gg::thunk;
+
+/* gg-gc keeps what it knows about .gg in .gg/gc/state, in the same format
+   as the journal that gg-execute, gg-collect, gg-create-thunk and the SDK
+   append to (see gg::gc in thunk/ggutils.hh). A run folds the journal into
+   the state, so it only looks at what changed since the last run; the
+   blobs directory is only listed, and the working tree only scanned for
+   placeholders, on the first run or with --rescan. */
+
+struct GCState
+{
+  unordered_map<string, time_t> blobs {};         /* hash -> last access */
+  unordered_map<string, string> reductions {};    /* key -> output hash */
+  unordered_map<string, string> placeholders {};  /* path -> thunk hash */
+};
+
+void usage( const char * argv0 )
+{
+  cerr << "Usage: " << argv0 << " [-m|--max-bytes=<N>[K|M|G]] [-n|--dry-run]" << endl
+       << "       " << "[-p|--pin=<target>]... [-u|--unpin=<target>]... [-r|--rescan]" << endl
+       << "       " << "[<path>...]" << endl
+       << endl
+       << "Evicts the least recently used blobs from .gg/blobs until they take at" << endl
+       << "most <N> bytes. Blobs reachable from a pinned target or from a live" << endl
+       << "placeholder are never evicted. A target is a placeholder or a thunk hash;" << endl
+       << "pins are kept in .gg/gc/pins. Without --max-bytes, only updates the" << endl
+       << "state and prints the usage. Waits for running gg-force and gg-execute" << endl
+       << "processes to finish." << endl
+       << endl
+       << "Placeholders written by gg tools are journaled. Others are found by" << endl
+       << "scanning the given files and directories (by default, the directory" << endl
+       << "that contains .gg) on the first run and with --rescan." << endl
+       << endl;
+}
+
+/* blobs can also go away under gg-gc, e.g. with gg-execute --cleanup */
+void remove_if_exists( const roost::path & path )
+{
+  if ( unlink( path.string().c_str() ) != 0 and errno != ENOENT ) {
+    throw unix_error( "unlink " + path.string() );
+  }
+}
+
+uint64_t parse_size( const string & str )
+{
+  size_t pos;
+  uint64_t size = stoull( str, &pos );
+  const string suffix = str.substr( pos );
+
+  if ( suffix == "" ) { return size; }
+  if ( suffix == "K" ) { return size << 10; }
+  if ( suffix == "M" ) { return size << 20; }
+  if ( suffix == "G" ) { return size << 30; }
+
+  throw runtime_error( "invalid size: " + str );
+}
+
+string target_hash( const string & target )
+{
+  Optional<ThunkPlaceholder> placeholder = ThunkPlaceholder::read( target );
+  if ( placeholder.initialized() ) {
+    return placeholder->content_hash();
+  }
+
+  if ( target.length() != gg::hash::length ) {
+    throw runtime_error( "not a placeholder or a hash: " + target );
+  }
+
+  return target;
+}
+
+void load_records( const roost::path & path, GCState & state )
+{
+  ifstream fin { path.string() };
+  string line;
+
+  while ( getline( fin, line ) ) {
+    /* a partial last line from a writer that died is skipped */
+    if ( fin.eof() ) {
+      break;
+    }
+
+    const size_t first = line.find( ' ', 2 );
+    if ( line.length() < 3 or line[ 1 ] != ' ' or first == string::npos ) {
+      continue;
+    }
+
+    const string key = line.substr( 2, first - 2 );
+    const string value = line.substr( first + 1 );
+
+    switch ( line[ 0 ] ) {
+    case 'A':
+    {
+      time_t & last_access = state.blobs[ value ];
+      last_access = max( last_access, static_cast<time_t>( stoll( key ) ) );
+      break;
+    }
+
+    case 'R':
+      state.reductions[ key ] = value;
+      break;
+
+    case 'P':
+      state.placeholders[ value ] = key;
+      break;
+    }
+  }
+}
+
+void save_state( const roost::path & path, const GCState & state )
+{
+  string contents;
+
+  for ( const auto & blob : state.blobs ) {
+    contents += "A " + to_string( blob.second ) + " " + blob.first + "\n";
+  }
+
+  for ( const auto & reduction : state.reductions ) {
+    contents += "R " + reduction.first + " " + reduction.second + "\n";
+  }
+
+  for ( const auto & placeholder : state.placeholders ) {
+    contents += "P " + placeholder.second + " " + placeholder.first + "\n";
+  }
+
+  roost::atomic_create( contents, path );
+}
+
+/* list the blobs and reductions directories: picks up blobs that were put
+   there by tools that don't write to the journal (with their mtime as
+   their last access) and forgets the ones that are gone */
+void rescan( GCState & state )
+{
+  unordered_map<string, time_t> blobs;
+
+  for ( const string & name : roost::list_directory( gg::paths::blobs() ) ) {
+    struct stat info;
+    if ( name.length() != gg::hash::length or
+         stat( gg::paths::blob( name ).string().c_str(), &info ) != 0 or
+         not S_ISREG( info.st_mode ) ) {
+      continue;
+    }
+
+    auto known = state.blobs.find( name );
+    blobs[ name ] = ( known != state.blobs.end() )
+                    ? max( known->second, info.st_mtime )
+                    : info.st_mtime;
+  }
+
+  state.blobs = move( blobs );
+  state.reductions.clear();
+
+  for ( const string & name : roost::list_directory( gg::paths::reductions() ) ) {
+    if ( name[ 0 ] == '.' ) {
+      continue;
+    }
+
+    Optional<cache::ReductionResult> result = cache::check( name );
+    if ( result.initialized() ) {
+      state.reductions[ name ] = result->hash;
+    }
+  }
+}
+
+/* the placeholders in path, a file or a directory that is walked without
+   following symlinks or going into .gg directories */
+void scan_placeholders( const roost::path & path, GCState & state )
+{
+  struct stat info;
+  if ( lstat( path.string().c_str(), &info ) != 0 ) {
+    return;
+  }
+
+  try {
+    if ( S_ISDIR( info.st_mode ) ) {
+      for ( const string & name : roost::list_directory( path ) ) {
+        if ( name != "." and name != ".." and name != ".gg" ) {
+          scan_placeholders( path / name, state );
+        }
+      }
+    }
+    else if ( S_ISREG( info.st_mode ) ) {
+      Optional<ThunkPlaceholder> placeholder = ThunkPlaceholder::read( path.string() );
+      if ( placeholder.initialized() ) {
+        state.placeholders[ roost::canonical( path ).string() ] = placeholder->content_hash();
+      }
+    }
+  }
+  catch ( const exception & ) {
+    /* files and directories that can't be read are skipped */
+  }
+}
+
+/* every blob reachable from roots: the infiles of a thunk, its reductions
+   and whatever those reduce to */
+unordered_set<string> reachable_blobs( const vector<string> & roots,
+                                       const GCState & state )
+{
+  unordered_set<string> reachable;
+  deque<string> queue { roots.begin(), roots.end() };
+
+  auto follow_reduction =
+    [&state, &queue] ( const string & key )
+    {
+      auto reduction = state.reductions.find( key );
+      if ( reduction != state.reductions.end() ) {
+        queue.push_back( reduction->second );
+      }
+    };
+
+  while ( not queue.empty() ) {
+    const string hash = gg::hash::base( queue.front() );
+    queue.pop_front();
+
+    if ( not reachable.insert( hash ).second ) {
+      continue;
+    }
+
+    if ( gg::hash::type( hash ) != ObjectType::Thunk ) {
+      continue;
+    }
+
+    follow_reduction( hash );
+
+    const roost::path thunk_path = gg::paths::blob( hash );
+    if ( not roost::exists( thunk_path ) ) {
+      continue;
+    }
+
+    const Thunk thunk = ThunkReader::read( thunk_path, hash );
+
+    for ( const string & output : thunk.outputs() ) {
+      follow_reduction( gg::hash::for_output( hash, output ) );
+    }
+
+    for ( const Thunk::DataItem & item : thunk.values() ) {
+      queue.push_back( item.first );
+    }
+
+    for ( const Thunk::DataItem & item : thunk.executables() ) {
+      queue.push_back( item.first );
+    }
+
+    for ( const Thunk::DataItem & item : thunk.thunks() ) {
+      queue.push_back( item.first );
+    }
+  }
+
+  return reachable;
+}
+
+int main( int argc, char * argv[] )
+{
+  try {
+    if ( argc <= 0 ) {
+      abort();
+    }
+
+    bool limit = false;
+    uint64_t max_bytes = 0;
+    bool dry_run = false;
+    bool full_rescan = false;
+    vector<string> pin_targets;
+    vector<string> unpin_targets;
+
+    const option cmd_options[] = {
+      { "max-bytes", required_argument, nullptr, 'm' },
+      { "dry-run",   no_argument,       nullptr, 'n' },
+      { "pin",       required_argument, nullptr, 'p' },
+      { "unpin",     required_argument, nullptr, 'u' },
+      { "rescan",    no_argument,       nullptr, 'r' },
+      { "help",      no_argument,       nullptr, 'h' },
+      { nullptr,     0,                 nullptr,  0  },
+    };
+
+    while ( true ) {
+      const int opt = getopt_long( argc, argv, "m:np:u:rh", cmd_options, nullptr );
+
+      if ( opt == -1 ) { break; }
+
+      switch ( opt ) {
+      case 'm':
+        limit = true;
+        max_bytes = parse_size( optarg );
+        break;
+
+      case 'n': dry_run = true; break;
+      case 'p': pin_targets.emplace_back( optarg ); break;
+      case 'u': unpin_targets.emplace_back( optarg ); break;
+      case 'r': full_rescan = true; break;
+
+      default:
+        usage( argv[ 0 ] );
+        return EXIT_FAILURE;
+      }
+    }
+
+    vector<roost::path> scan_paths { argv + optind, argv + argc };
+    if ( scan_paths.empty() ) {
+      scan_paths.push_back( roost::dirname( gg::paths::root() ) );
+    }
+
+    const roost::path state_path = gg::paths::gc() / "state";
+    const roost::path pins_path = gg::paths::gc() / "pins";
+    const roost::path journal_path = gg::paths::gc_journal();
+    const roost::path folding_path = gg::paths::gc() / "journal.folding";
+
+    /* one gg-gc at a time, once the tools that hold a shared lock (see
+       gg::gc::hold_lock) are done; no records are appended while it runs */
+    const roost::path lock_path = gg::paths::gc_lock();
+    FileDescriptor lock { CheckSystemCall( "open (" + lock_path.string() + ")",
+                                           open( lock_path.string().c_str(),
+                                                 O_RDWR | O_CREAT | O_CLOEXEC, 0644 ) ) };
+    lock.block_for_exclusive_lock();
+
+    /* pins */
+    unordered_set<string> pins;
+    if ( roost::exists( pins_path ) ) {
+      ifstream fin { pins_path.string() };
+      string line;
+      while ( getline( fin, line ) ) {
+        if ( not line.empty() ) {
+          pins.insert( line );
+        }
+      }
+    }
+
+    if ( pin_targets.size() or unpin_targets.size() ) {
+      for ( const string & target : pin_targets ) {
+        pins.insert( target_hash( target ) );
+      }
+
+      for ( const string & target : unpin_targets ) {
+        pins.erase( target_hash( target ) );
+      }
+
+      string contents;
+      for ( const string & pin : pins ) {
+        contents += pin + "\n";
+      }
+      roost::atomic_create( contents, pins_path );
+    }
+
+    /* state, then the journal on top of it. a journal left over by a run
+       that died is folded in first. */
+    GCState state;
+    const bool first_run = not roost::exists( state_path );
+
+    if ( not first_run ) {
+      load_records( state_path, state );
+    }
+
+    if ( roost::exists( folding_path ) ) {
+      load_records( folding_path, state );
+    }
+
+    if ( roost::exists( journal_path ) ) {
+      /* the next writers start a new journal */
+      roost::rename( journal_path, folding_path );
+      load_records( folding_path, state );
+    }
+
+    if ( first_run or full_rescan ) {
+      rescan( state );
+
+      for ( const roost::path & path : scan_paths ) {
+        scan_placeholders( path, state );
+      }
+    }
+
+    /* roots: pins and the placeholders that still point to their thunks */
+    vector<string> roots { pins.begin(), pins.end() };
+
+    for ( auto it = state.placeholders.begin(); it != state.placeholders.end(); ) {
+      Optional<ThunkPlaceholder> placeholder = ThunkPlaceholder::read( it->first );
+
+      if ( placeholder.initialized() and placeholder->content_hash() == it->second ) {
+        roots.push_back( it->second );
+        it++;
+      }
+      else {
+        it = state.placeholders.erase( it );
+      }
+    }
+
+    const unordered_set<string> reachable = reachable_blobs( roots, state );
+
+    uint64_t total_bytes = 0;
+    vector<pair<time_t, string>> candidates;
+
+    for ( const auto & blob : state.blobs ) {
+      total_bytes += gg::hash::size( blob.first );
+      if ( reachable.count( blob.first ) == 0 ) {
+        candidates.emplace_back( blob.second, blob.first );
+      }
+    }
+
+    /* least recently used first */
+    sort( candidates.begin(), candidates.end() );
+
+    size_t evicted_blobs = 0;
+    uint64_t evicted_bytes = 0;
+    unordered_set<string> evicted;
+
+    for ( const auto & candidate : candidates ) {
+      if ( not limit or total_bytes <= max_bytes ) {
+        break;
+      }
+
+      const string & hash = candidate.second;
+      const uint64_t size = gg::hash::size( hash );
+
+      if ( not dry_run ) {
+        remove_if_exists( gg::paths::blob( hash ) );
+        state.blobs.erase( hash );
+      }
+
+      evicted.insert( hash );
+      evicted_blobs++;
+      evicted_bytes += size;
+      total_bytes -= size;
+    }
+
+    /* cached reductions to evicted blobs would send gg-force to them */
+    for ( auto it = state.reductions.begin(); it != state.reductions.end(); ) {
+      if ( evicted.count( gg::hash::base( it->second ) ) and not dry_run ) {
+        remove_if_exists( gg::paths::reduction( it->first ) );
+        it = state.reductions.erase( it );
+      }
+      else {
+        it++;
+      }
+    }
+
+    if ( not dry_run ) {
+      save_state( state_path, state );
+      remove_if_exists( folding_path );
+    }
+
+    cout << "blobs=" << ( state.blobs.size() - ( dry_run ? evicted_blobs : 0 ) )
+         << " bytes=" << total_bytes
+         << " reachable=" << reachable.size()
+         << " pins=" << pins.size()
+         << " placeholders=" << state.placeholders.size()
+         << " evicted_blobs=" << evicted_blobs
+         << " evicted_bytes=" << evicted_bytes << endl;
+
+    return EXIT_SUCCESS;
+  }
+  catch ( const exception &  e ) {
+    print_exception( argv[ 0 ], e );
+    return EXIT_FAILURE;
+  }
+}
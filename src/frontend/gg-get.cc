@@ -39,6 +39,8 @@ int main( int argc, char * argv[] )
         cerr << "GET " << request.object_key << " -> "
              << request.filename.string() << endl;
       } );
+
+    gg::gc::record_access( { argv + 1, argv + argc } );
   }
   catch ( const exception &  e ) {
     print_exception( argv[ 0 ], e );
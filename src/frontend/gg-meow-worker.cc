@@ -3,16 +3,28 @@
 #include <iostream>
 #include <string>
 #include <vector>
+#include <list>
+#include <algorithm>
+#include <unordered_map>
+#include <unordered_set>
 #include <limits>
 #include <stdexcept>
 #include <cstdlib>
+#include <chrono>
+#include <thread>
+#include <getopt.h>
+#include <unistd.h>
+#include <sys/stat.h>
+#include <sys/statvfs.h>
 
 #include "protobufs/gg.pb.h"
+#include "protobufs/meow.pb.h"
 #include "protobufs/util.hh"
 #include "net/address.hh"
 #include "net/http_response.hh"
 #include "net/http_request.hh"
 #include "thunk/ggutils.hh"
+#include "thunk/thunk_reader.hh"
 #include "execution/loop.hh"
 #include "execution/meow/message.hh"
 #include "execution/meow/util.hh"
@@ -24,15 +36,169 @@
 
 using namespace std;
 using namespace gg;
+using namespace gg::thunk;
 using namespace meow;
 
 const bool timelog = ( getenv( "GG_EXECUTE_TIMELOG" ) != nullptr );
 
+/* how often a worker without a coordinator tries to connect */
+const chrono::milliseconds reconnect_interval { 500 };
+
+/* by default, the blob cache of a persistent worker takes up to this
+   fraction of the file system that holds .gg/blobs */
+const double default_cache_fraction = 0.5;
+
 class ProgramFinished : public exception {};
 
 void usage( char * argv0 )
 {
-  cerr << "Usage: " << argv0 << " DESTINATION PORT" << endl;
+  cerr << "Usage: " << argv0 << " [options] DESTINATION PORT" << endl
+  << endl
+  << "Options: " << endl
+  << " -i, --idle-timeout=SECONDS  After a coordinator is done, keep connecting to" << endl
+  << "                             the next one, until idle for SECONDS" << endl
+  << " -c, --cache-bytes=N         With --idle-timeout, keep at most N bytes of blobs" << endl
+  << "                             for the next coordinators (default: half of the" << endl
+  << "                             file system)" << endl
+  << " -d, --deadline=SECONDS      SECONDS after starting, stop taking work and" << endl
+  << "                             disconnect, even in the middle of a thunk" << endl
+  << endl;
+}
+
+/* a size-bounded LRU cache over .gg/blobs, for the persistent workers that
+   keep their blobs for the next coordinators (like BlobCache in the
+   handlers). Blobs that a running thunk needs are never evicted. */
+class BlobCache
+{
+private:
+  typedef list<pair<string, uint64_t>> BlobList;
+
+  uint64_t capacity_;
+  uint64_t size_ { 0 };
+  BlobList blobs_ {};  /* hash and size, least recently used first */
+  unordered_map<string, BlobList::iterator> index_ {};
+  unordered_map<string, size_t> in_use_ {};
+
+  void drop_reductions( const unordered_set<string> & evicted )
+  {
+    for ( const string & name : roost::list_directory( gg::paths::reductions() ) ) {
+      if ( name[ 0 ] == '.' ) {
+        continue;
+      }
+
+      Optional<cache::ReductionResult> result = cache::check( name );
+      if ( result.initialized() and evicted.count( gg::hash::base( result->hash ) ) ) {
+        unlink( gg::paths::reduction( name ).string().c_str() );
+      }
+    }
+  }
+
+public:
+  BlobCache( const uint64_t capacity )
+    : capacity_( capacity )
+  {
+    /* the blobs left by an earlier worker in this container, oldest first */
+    vector<pair<time_t, string>> existing;
+
+    for ( const string & name : roost::list_directory( gg::paths::blobs() ) ) {
+      struct stat info;
+      if ( name.length() == gg::hash::length and
+           lstat( gg::paths::blob( name ).string().c_str(), &info ) == 0 and
+           not S_ISDIR( info.st_mode ) ) {
+        existing.emplace_back( info.st_mtime, name );
+      }
+    }
+
+    sort( existing.begin(), existing.end() );
+
+    for ( const auto & blob : existing ) {
+      touch( blob.second );
+    }
+  }
+
+  /* account for a blob that was just written or used, as the most
+     recently used */
+  void touch( const string & hash )
+  {
+    auto it = index_.find( hash );
+    if ( it != index_.end() ) {
+      size_ -= it->second->second;
+      blobs_.erase( it->second );
+      index_.erase( it );
+    }
+
+    struct stat info;
+    if ( lstat( gg::paths::blob( hash ).string().c_str(), &info ) != 0 ) {
+      return;
+    }
+
+    index_[ hash ] = blobs_.emplace( blobs_.end(), hash, info.st_size );
+    size_ += info.st_size;
+  }
+
+  void acquire( const vector<string> & hashes )
+  {
+    for ( const string & hash : hashes ) {
+      in_use_[ hash ]++;
+    }
+  }
+
+  void release( const vector<string> & hashes )
+  {
+    for ( const string & hash : hashes ) {
+      auto it = in_use_.find( hash );
+      if ( it != in_use_.end() and --it->second == 0 ) {
+        in_use_.erase( it );
+      }
+    }
+  }
+
+  /* evict the least recently used blobs that are not in use until the
+     cache fits in its capacity */
+  void trim()
+  {
+    unordered_set<string> evicted;
+
+    for ( auto it = blobs_.begin(); it != blobs_.end() and size_ > capacity_; ) {
+      if ( in_use_.count( it->first ) ) {
+        it++;
+        continue;
+      }
+
+      unlink( gg::paths::blob( it->first ).string().c_str() );
+      evicted.insert( it->first );
+      size_ -= it->second;
+      index_.erase( it->first );
+      it = blobs_.erase( it );
+    }
+
+    /* gg-execute would take a cached reduction to an evicted output as done */
+    if ( not evicted.empty() ) {
+      cerr << "[evict] " << evicted.size() << " blobs" << endl;
+      drop_reductions( evicted );
+    }
+  }
+};
+
+uint64_t default_cache_bytes()
+{
+  struct statvfs info;
+  CheckSystemCall( "statvfs", statvfs( gg::paths::blobs().string().c_str(), &info ) );
+  return static_cast<uint64_t>( info.f_blocks * info.f_frsize * default_cache_fraction );
+}
+
+/* the Hey payload: what the coordinator doesn't have to send again */
+string worker_info()
+{
+  protobuf::meow::WorkerInfo info;
+
+  for ( const string & blob : roost::list_directory( gg::paths::blobs() ) ) {
+    if ( not roost::is_directory( gg::paths::blob( blob ) ) ) {
+      info.add_objects( blob );
+    }
+  }
+
+  return protoutil::to_string( info );
 }
 
 int main( int argc, char * argv[] )
@@ -42,134 +208,331 @@ int main( int argc, char * argv[] )
       abort();
     }
 
-    if ( argc != 3 ) {
+    chrono::seconds idle_timeout { 0 };
+    uint64_t cache_bytes = 0;
+    chrono::seconds deadline_after { 0 };
+
+    const option command_line_options[] = {
+      { "idle-timeout", required_argument, nullptr, 'i' },
+      { "cache-bytes",  required_argument, nullptr, 'c' },
+      { "deadline",     required_argument, nullptr, 'd' },
+      { nullptr, 0, nullptr, 0 },
+    };
+
+    while ( true ) {
+      const int opt = getopt_long( argc, argv, "i:c:d:", command_line_options, nullptr );
+
+      if ( opt == -1 ) {
+        break;
+      }
+
+      switch ( opt ) {
+      case 'i': idle_timeout = chrono::seconds { stoul( optarg ) }; break;
+      case 'c': cache_bytes = stoull( optarg ); break;
+      case 'd': deadline_after = chrono::seconds { stoul( optarg ) }; break;
+
+      default:
+        usage( argv[ 0 ] );
+        return EXIT_FAILURE;
+      }
+    }
+
+    if ( argc - optind != 2 ) {
       usage( argv[ 0 ] );
       return EXIT_FAILURE;
     }
 
-    int port_argv = stoi( argv[ 2 ] );
+    int port_argv = stoi( argv[ optind + 1 ] );
     if ( port_argv <= 0 or port_argv > numeric_limits<uint16_t>::max() ) {
       throw runtime_error( "invalid port" );
     }
 
-    Address coordinator_addr { argv[ 1 ], static_cast<uint16_t>( port_argv ) };
+    Address coordinator_addr { argv[ optind ], static_cast<uint16_t>( port_argv ) };
     ExecutionLoop loop;
 
+    /* without an idle timeout, the worker serves one coordinator, and
+       gg-execute cleans up after every thunk. a persistent worker keeps
+       its blobs for the next coordinators, up to cache_bytes. */
+    const bool persistent = idle_timeout.count() > 0;
+
+    unique_ptr<BlobCache> blob_cache;
+    if ( persistent ) {
+      blob_cache = make_unique<BlobCache>( cache_bytes ? cache_bytes
+                                                       : default_cache_bytes() );
+      blob_cache->trim();
+    }
+
+    size_t running_jobs = 0;
+    auto last_active = chrono::steady_clock::now();
+
+    /* the deadline bounds the worker's lifetime, busy or not */
+    const bool has_deadline = deadline_after.count() > 0;
+    const auto deadline = chrono::steady_clock::now() + deadline_after;
+
+    auto time_left =
+      [] ( const chrono::steady_clock::time_point & until ) -> chrono::milliseconds
+      {
+        return chrono::duration_cast<chrono::milliseconds>(
+          until - chrono::steady_clock::now() );
+      };
+
+    auto idle_time_left =
+      [&] () { return time_left( last_active + idle_timeout ); };
+
+    /* leaving closes the connection; the coordinator tries the thunk
+       we were running again */
+    auto check_deadline =
+      [&] ()
+      {
+        if ( has_deadline and time_left( deadline ).count() <= 0 ) {
+          cerr << "[deadline]" << endl;
+          throw ProgramFinished();
+        }
+      };
+
     MessageParser message_parser;
-    /* let's make a connection back to the coordinator */
-    shared_ptr<TCPConnection> connection = loop.make_connection<TCPConnection>( coordinator_addr,
-      [&message_parser] ( shared_ptr<TCPConnection>, string && data ) {
-        message_parser.parse( data );
-        return true;
-      },
-      [] () {
-        cerr << "Error." << endl;
-      },
-      [] () {
-        throw ProgramFinished();
-      } );
-
-    Message hello_message { Message::OpCode::Hey, "" };
-    connection->enqueue_write( hello_message.str() );
-
-    while( loop.loop_once( -1 ).result == Poller::Result::Type::Success ) {
-      while ( not message_parser.empty() ) {
-        const Message & message = message_parser.front();
-
-        switch ( message.opcode() ) {
-        case Message::OpCode::Put:
-        {
-          const string hash = handle_put_message( message );
-          cerr << "[put] " << hash << endl;
-          break;
+    bool session_over = false;
+    bool heard_back = false;
+
+    while ( true ) {
+      message_parser = {};
+      session_over = false;
+      heard_back = false;
+
+      /* let's make a connection back to the coordinator */
+      shared_ptr<TCPConnection> connection;
+
+      try {
+        connection = loop.make_connection<TCPConnection>( coordinator_addr,
+          [&message_parser, &heard_back] ( shared_ptr<TCPConnection>, string && data ) {
+            heard_back = true;
+            message_parser.parse( data );
+            return true;
+          },
+          [persistent] () {
+            if ( not persistent ) {
+              cerr << "Error." << endl;
+            }
+          },
+          [&session_over] () {
+            session_over = true;
+          } );
+
+        /* the coordinator won't send us the objects we already have */
+        Message hello_message { Message::OpCode::Hey, worker_info() };
+        connection->enqueue_write( hello_message.str() );
+      }
+      catch ( const unix_error & ) {
+        if ( not persistent ) {
+          throw;
         }
 
-        case Message::OpCode::Get:
-        {
-          const string & hash = message.payload();
-          string object_data = roost::read_file( gg::paths::blob( hash ) );
-          Message message { Message::OpCode::Put, move( object_data ) };
-          connection->enqueue_write( message.str() );
-          cerr << "[get] " << hash << endl;
+        session_over = true;
+      }
+
+      while ( not session_over ) {
+        check_deadline();
+
+        int timeout_ms = -1;
+        if ( persistent and running_jobs == 0 ) {
+          timeout_ms = idle_time_left().count();
+
+          if ( timeout_ms <= 0 ) {
+            /* the coordinator will hand our work to another worker */
+            throw ProgramFinished();
+          }
+        }
+
+        if ( has_deadline ) {
+          const int deadline_ms = max<int>( time_left( deadline ).count(), 1 );
+          timeout_ms = ( timeout_ms < 0 ) ? deadline_ms : min( timeout_ms, deadline_ms );
+        }
+
+        const auto result = loop.loop_once( timeout_ms ).result;
+        if ( result != Poller::Result::Type::Success and
+             result != Poller::Result::Type::Timeout ) {
           break;
         }
 
-        case Message::OpCode::Execute:
-        {
-          protobuf::RequestItem execution_request;
-          protoutil::from_string( message.payload(), execution_request );
-
-          /* let's write the thunk to disk first */
-          roost::atomic_create( base64::decode( execution_request.data() ),
-                                gg::paths::blob( execution_request.hash() ) );
-
-          /* making it cheaper to copy */
-          execution_request.set_data( "" );
-
-          /* now we can execute it */
-          cerr << "[execute] " << execution_request.hash() << endl;
-          loop.add_child_process( execution_request.hash(),
-            [hash=execution_request.hash(), execution_request, &connection]
-            ( const uint64_t, const string &, const int status ) mutable {
-              if ( status ) {
-                /* execution failed */
-                Message message { Message::OpCode::ExecutionFailed, move( hash ) };
-                connection->enqueue_write( message.str() );
-                return;
-              }
+        while ( not message_parser.empty() ) {
+          const Message & message = message_parser.front();
 
-              const string & hash = execution_request.hash();
-              protobuf::ResponseItem execution_response;
-              execution_response.set_thunk_hash( execution_request.hash() );
+          switch ( message.opcode() ) {
+          case Message::OpCode::Put:
+          {
+            const string hash = handle_put_message( message );
+            cerr << "[put] " << hash << endl;
 
-              for ( const auto & tag : execution_request.outputs() ) {
-                protobuf::OutputItem output_item;
-                Optional<cache::ReductionResult> result = cache::check( gg::hash::for_output( hash, tag ) );
+            if ( blob_cache ) {
+              blob_cache->touch( hash );
+            }
 
-                if ( not result.initialized() ) {
-                  throw runtime_error( "output not found" );
-                }
+            break;
+          }
+
+          case Message::OpCode::Get:
+          {
+            const string & hash = message.payload();
+            string object_data = roost::read_file( gg::paths::blob( hash ) );
+            Message message { Message::OpCode::Put, move( object_data ) };
+            connection->enqueue_write( message.str() );
+            cerr << "[get] " << hash << endl;
+            break;
+          }
 
-                const auto output_path = paths::blob( result->hash );
-                const string output_data = ""; // base64::encode( roost::read_file( output_path ) );
+          case Message::OpCode::Execute:
+          {
+            check_deadline();
 
-                output_item.set_tag( tag );
-                output_item.set_hash( result->hash );
-                output_item.set_size( roost::file_size( output_path ) );
-                output_item.set_executable( roost::is_executable( output_path ) );
-                output_item.set_data( output_data );
+            protobuf::RequestItem execution_request;
+            protoutil::from_string( message.payload(), execution_request );
 
-                *execution_response.add_outputs() = output_item;
+            /* let's write the thunk to disk first */
+            roost::atomic_create( base64::decode( execution_request.data() ),
+                                  gg::paths::blob( execution_request.hash() ) );
+
+            /* making it cheaper to copy */
+            execution_request.set_data( "" );
+
+            /* the thunk and its infiles stay in the cache while it runs */
+            vector<string> thunk_blobs { execution_request.hash() };
+
+            if ( blob_cache ) {
+              const Thunk thunk = ThunkReader::read( gg::paths::blob( execution_request.hash() ),
+                                                     execution_request.hash() );
+
+              for ( const Thunk::DataItem & item : thunk.values() ) {
+                thunk_blobs.push_back( item.first );
               }
 
-              Message message { Message::OpCode::Executed, protoutil::to_string( execution_response ) };
-              connection->enqueue_write( message.str() );
-            },
-            [hash=execution_request.hash()]()
-            {
-              vector<string> command { "gg-execute-static",
-                                       "--get-dependencies",
-                                       "--put-output",
-                                       "--cleanup",
-                                       hash };
-
-              if ( timelog ) {
-                command.push_back( "--timelog" );
+              for ( const Thunk::DataItem & item : thunk.executables() ) {
+                thunk_blobs.push_back( item.first );
               }
 
-              return ezexec( command[ 0 ], command, {}, true, true );
-            },
-            false
-          );
+              blob_cache->acquire( thunk_blobs );
+            }
+
+            /* now we can execute it */
+            cerr << "[execute] " << execution_request.hash() << endl;
+            running_jobs++;
+            last_active = chrono::steady_clock::now();
+
+            loop.add_child_process( execution_request.hash(),
+              [hash=execution_request.hash(), execution_request, connection,
+               thunk_blobs, &running_jobs, &last_active, &blob_cache]
+              ( const uint64_t, const string &, const int status ) mutable {
+                running_jobs--;
+                last_active = chrono::steady_clock::now();
+
+                if ( blob_cache ) {
+                  /* gg-execute fetched the infiles and wrote the outputs */
+                  for ( const string & blob : thunk_blobs ) {
+                    blob_cache->touch( blob );
+                  }
+
+                  for ( const auto & tag : execution_request.outputs() ) {
+                    Optional<cache::ReductionResult> result =
+                      cache::check( gg::hash::for_output( execution_request.hash(), tag ) );
+
+                    if ( result.initialized() ) {
+                      blob_cache->touch( result->hash );
+                    }
+                  }
+
+                  blob_cache->release( thunk_blobs );
+                  blob_cache->trim();
+                }
 
-          break;
-        }
+                if ( status ) {
+                  /* execution failed */
+                  Message message { Message::OpCode::ExecutionFailed, move( hash ) };
+                  connection->enqueue_write( message.str() );
+                  return;
+                }
+
+                const string & hash = execution_request.hash();
+                protobuf::ResponseItem execution_response;
+                execution_response.set_thunk_hash( execution_request.hash() );
+
+                for ( const auto & tag : execution_request.outputs() ) {
+                  protobuf::OutputItem output_item;
+                  Optional<cache::ReductionResult> result = cache::check( gg::hash::for_output( hash, tag ) );
+
+                  if ( not result.initialized() ) {
+                    throw runtime_error( "output not found" );
+                  }
+
+                  const auto output_path = paths::blob( result->hash );
+                  const string output_data = ""; // base64::encode( roost::read_file( output_path ) );
+
+                  output_item.set_tag( tag );
+                  output_item.set_hash( result->hash );
+                  output_item.set_size( roost::file_size( output_path ) );
+                  output_item.set_executable( roost::is_executable( output_path ) );
+                  output_item.set_data( output_data );
 
-        default:
-          throw runtime_error( "unhandled opcode" );
+                  *execution_response.add_outputs() = output_item;
+                }
+
+                Message message { Message::OpCode::Executed, protoutil::to_string( execution_response ) };
+                connection->enqueue_write( message.str() );
+              },
+              [hash=execution_request.hash(), persistent]()
+              {
+                vector<string> command { "gg-execute-static",
+                                         "--get-dependencies",
+                                         "--put-output" };
+
+                if ( not persistent ) {
+                  command.push_back( "--cleanup" );
+                }
+
+                command.push_back( hash );
+
+                if ( timelog ) {
+                  command.push_back( "--timelog" );
+                }
+
+                return ezexec( command[ 0 ], command, {}, true, true );
+              },
+              false
+            );
+
+            break;
+          }
+
+          default:
+            throw runtime_error( "unhandled opcode" );
+          }
+
+          message_parser.pop();
         }
+      }
+
+      if ( not persistent ) {
+        break;
+      }
 
-        message_parser.pop();
+      /* the blobs of a thunk that is still running stay in the cache, and
+         its result has nowhere to go */
+      while ( running_jobs > 0 ) {
+        check_deadline();
+        loop.loop_once( has_deadline ? max<int>( time_left( deadline ).count(), 1 ) : -1 );
+      }
+
+      check_deadline();
+
+      if ( idle_time_left().count() <= 0 ) {
+        break;
+      }
+
+      if ( not heard_back ) {
+        /* no coordinator is listening yet */
+        auto wait = min( reconnect_interval, idle_time_left() );
+        if ( has_deadline ) {
+          wait = min( wait, time_left( deadline ) );
+        }
+        this_thread::sleep_for( wait );
       }
     }
   }
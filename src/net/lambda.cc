@@ -6,6 +6,8 @@
 #include <stdexcept>
 
 #include "awsv4_sig.hh"
+#include "util/uri.hh"
+#include "util/util.hh"
 
 using namespace std;
 using InvocationType = LambdaInvocationRequest::InvocationType;
@@ -37,6 +39,26 @@ std::string LambdaInvocationRequest::endpoint( const std::string & region )
   return "lambda." + region + ".amazonaws.com";
 }
 
+static const char * const LAMBDA_ENDPOINT_ENV = "GG_LAMBDA_ENDPOINT";
+
+Address LambdaInvocationRequest::address( const std::string & region )
+{
+  if ( getenv( LAMBDA_ENDPOINT_ENV ) == nullptr ) {
+    return { endpoint( region ), "https" };
+  }
+
+  const ParsedURI uri { safe_getenv( LAMBDA_ENDPOINT_ENV ) };
+  const uint16_t port = uri.port.get_or( 0 );
+
+  return { uri.host, port ? to_string( port ) : uri.protocol };
+}
+
+bool LambdaInvocationRequest::is_secure()
+{
+  return getenv( LAMBDA_ENDPOINT_ENV ) == nullptr or
+         ParsedURI( safe_getenv( LAMBDA_ENDPOINT_ENV ) ).protocol != "http";
+}
+
 LambdaInvocationRequest::LambdaInvocationRequest( const AWSCredentials & credentials,
                                                   const string & region,
                                                   const string & function_name,
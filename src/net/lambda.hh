@@ -6,6 +6,7 @@
 #include <string>
 
 #include "aws.hh"
+#include "address.hh"
 
 class LambdaInvocationRequest : public AWSRequest
 {
@@ -15,6 +16,12 @@ public:
 
   static std::string endpoint( const std::string & region );
 
+  /* where to send the invocations: the regional endpoint, or the one in
+     GG_LAMBDA_ENDPOINT (http://HOST:PORT) if it is set, e.g. a local
+     emulator */
+  static Address address( const std::string & region );
+  static bool is_secure();
+
   LambdaInvocationRequest( const AWSCredentials & credentials,
                            const std::string & region,
                            const std::string & function_name,
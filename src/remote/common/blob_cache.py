@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+from collections import OrderedDict
+
+from ggpaths import GG_DIR, GGPaths
+
+# Size of the blob cache, in bytes. Defaults to a fraction of the file
+# system that holds GG_DIR (/tmp on Lambda and Cloud Functions).
+CACHE_BYTES_ENV = 'GG_BLOB_CACHE_BYTES'
+DEFAULT_CACHE_FRACTION = 0.5
+
+# Space left free for the thunk-execute directories and the outputs
+MIN_FREE_BYTES = 64 * 1024 * 1024
+
+THUNK_MAGIC = b'##GGTHUNK##'
+
+# Access journal that gg-execute keeps for gg-gc; recency is tracked in
+# memory here, so it is only allowed to grow within an invocation
+GC_JOURNAL = os.path.join(GG_DIR, 'gc', 'journal')
+
+def hash_size(blob_hash):
+    return int(blob_hash[-8:], 16)
+
+def free_bytes(path):
+    st = os.statvfs(path)
+    return st.f_bavail * st.f_frsize
+
+def default_capacity(path):
+    st = os.statvfs(path)
+    return int(st.f_blocks * st.f_frsize * DEFAULT_CACHE_FRACTION)
+
+def _varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+def thunk_dependencies(data):
+    """Hashes of the values and executables of a serialized thunk"""
+    if not data.startswith(THUNK_MAGIC):
+        raise ValueError("not a thunk")
+
+    deps = []
+    pos = len(THUNK_MAGIC)
+    while pos < len(data):
+        key, pos = _varint(data, pos)
+        field, wire_type = key >> 3, key & 0x7
+
+        if wire_type == 0:
+            _, pos = _varint(data, pos)
+            continue
+
+        if wire_type != 2:
+            raise ValueError("unexpected wire type in thunk")
+
+        length, pos = _varint(data, pos)
+        if field in (2, 4): # values, executables
+            item = data[pos:pos + length].decode('ascii')
+            deps += [item.split('=', 1)[0]]
+        pos += length
+
+    return deps
+
+class BlobCache:
+    """Size-bounded LRU cache over GGPaths.blobs that outlives invocations
+    in a warm container. Pinned blobs, such as the packaged executables,
+    are never evicted; neither are the blobs that the running invocation
+    needs. Counters are per invocation (see reset_stats)."""
+
+    def __init__(self, capacity=None):
+        if capacity is None:
+            capacity = int(os.environ.get(CACHE_BYTES_ENV, 0)) or \
+                       default_capacity(GGPaths.blobs)
+
+        self.capacity = capacity
+        # hash -> bytes it takes in /tmp, least recently used first (a
+        # staged executable only takes a symlink)
+        self.blobs = OrderedDict()
+        self.size = 0
+        self.pinned = set()
+
+        self.reset_stats()
+        self.scan()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_fetched = 0
+        self.evicted_blobs = 0
+        self.evicted_bytes = 0
+
+    def scan(self):
+        """Pick up the blobs already on disk, oldest first"""
+        entries = []
+        for blob in os.listdir(GGPaths.blobs):
+            try:
+                st = os.lstat(GGPaths.blob_path(blob))
+            except FileNotFoundError:
+                continue
+            entries += [(st.st_mtime, blob, st.st_size)]
+
+        self.blobs.clear()
+        self.size = 0
+        for _, blob, size in sorted(entries):
+            self.blobs[blob] = size
+            self.size += size
+
+    def pin(self, blob_hash):
+        self.pinned.add(blob_hash)
+
+    def stage_executables(self, executables_dir):
+        """Make the executables packaged with the function available as
+        pinned blobs. They are linked rather than copied: hardlinked if
+        they are on the same file system, symlinked otherwise; only a
+        file that isn't executable yet is copied and made executable."""
+        if not os.path.exists(executables_dir):
+            return
+
+        for exe in os.listdir(executables_dir):
+            blob_path = GGPaths.blob_path(exe)
+            exe_path = os.path.join(executables_dir, exe)
+
+            if not os.path.exists(blob_path):
+                if not os.access(exe_path, os.X_OK):
+                    shutil.copy(exe_path, blob_path)
+                    os.chmod(blob_path, os.stat(blob_path).st_mode | 0o111)
+                else:
+                    try:
+                        os.link(exe_path, blob_path)
+                    except OSError:
+                        os.symlink(os.path.abspath(exe_path), blob_path)
+
+                self.add(exe)
+
+            self.pin(exe)
+
+    def add(self, blob_hash):
+        """Account for a blob that was just written, as most recently used"""
+        try:
+            size = os.lstat(GGPaths.blob_path(blob_hash)).st_size
+        except FileNotFoundError:
+            return
+
+        self.size += size - self.blobs.pop(blob_hash, 0)
+        self.blobs[blob_hash] = size
+
+    def lookup(self, deps):
+        """Mark the dependencies that are cached as recently used and count
+        hits and misses. Returns the number of bytes that have to be
+        fetched."""
+        missing = 0
+        for dep in set(deps):
+            size = hash_size(dep)
+            if dep in self.blobs:
+                self.blobs.move_to_end(dep)
+                self.hits += 1
+                self.bytes_saved += size
+            else:
+                self.misses += 1
+                missing += size
+
+        self.bytes_fetched += missing
+        return missing
+
+    def make_room(self, nbytes=0, keep=(), capacity=None):
+        """Evict least recently used blobs, except pinned ones and the ones
+        in keep, until nbytes more fit in the cache and on disk"""
+        if capacity is None:
+            capacity = self.capacity
+
+        evicted = []
+        for blob in list(self.blobs):
+            if (self.size + nbytes <= capacity and
+                free_bytes(GGPaths.blobs) >= nbytes + MIN_FREE_BYTES):
+                break
+
+            if blob in self.pinned or blob in keep:
+                continue
+
+            size = self.blobs.pop(blob)
+            self.size -= size
+            try:
+                os.remove(GGPaths.blob_path(blob))
+            except FileNotFoundError:
+                pass
+
+            self.evicted_blobs += 1
+            self.evicted_bytes += size
+            evicted += [blob]
+
+        if evicted:
+            self.drop_reductions(set(evicted))
+
+    def shrink(self, keep=()):
+        """Evict down to half the capacity (when the disk is out of space)"""
+        self.make_room(0, keep, self.capacity // 2)
+
+    def finish(self, keep=()):
+        """Trim the cache back to its capacity after an invocation"""
+        self.make_room(0, keep)
+
+        try:
+            os.remove(GC_JOURNAL)
+        except FileNotFoundError:
+            pass
+
+    def drop_reductions(self, evicted):
+        for reduction in os.listdir(GGPaths.reductions):
+            rpath = GGPaths.reduction_path(reduction)
+            try:
+                with open(rpath, "r") as fin:
+                    output_hash = fin.read().split(" ")[0].strip()
+            except FileNotFoundError:
+                continue
+
+            if output_hash in evicted:
+                os.remove(rpath)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'bytesSaved': self.bytes_saved,
+            'bytesFetched': self.bytes_fetched,
+            'evictedBlobs': self.evicted_blobs,
+            'evictedBytes': self.evicted_bytes,
+            'size': self.size,
+            'capacity': self.capacity
+        }
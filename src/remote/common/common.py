@@ -1,5 +1,6 @@
 import os
 import stat
+import time
 import subprocess as sub
 import base64
 import hashlib
@@ -19,9 +20,134 @@ def make_executable(path):
     st = os.stat(path)
     os.chmod(path, st.st_mode | stat.S_IEXEC)
 
-def run_command(command):
+# How much of the output of a command is kept for the error reports
+OUTPUT_TAIL_BYTES = 64 * 1024
+
+READ_SIZE = 64 * 1024
+
+class OutputTail:
+    """Ring buffer that keeps the last max_bytes written to it"""
+
+    def __init__(self, max_bytes=OUTPUT_TAIL_BYTES):
+        self.max_bytes = max_bytes
+        self.buffer = bytearray()
+        self.dropped = 0
+
+    def write(self, data):
+        self.buffer += data
+        excess = len(self.buffer) - self.max_bytes
+        if excess > 0:
+            del self.buffer[:excess]
+            self.dropped += excess
+
+    def value(self):
+        text = self.buffer.decode('utf-8', errors='replace')
+        if self.dropped:
+            text = "[{} bytes omitted]\n".format(self.dropped) + text
+        return text
+
+def run_command(command, max_bytes=OUTPUT_TAIL_BYTES):
+    """Runs command and returns its exit code and the tail of its output
+    (stdout and stderr), which is read as it is produced"""
+    tail = OutputTail(max_bytes)
+
+    with sub.Popen(command, stdout=sub.PIPE, stderr=sub.STDOUT) as proc:
+        for block in iter(lambda: proc.stdout.read1(READ_SIZE), b''):
+            tail.write(block)
+
+    return proc.returncode, tail.value()
+
+# JobStatus::OperationalFailure
+OPERATIONAL_FAILURE = 3
+
+# Scratch space of the function; gg-execute creates its temporary files
+# in the same place. It is /tmp unless TMPDIR says otherwise, as it does
+# for the instances of the local emulator, which share one /tmp.
+TMP_DIR = os.environ.get('TMPDIR', '/tmp')
+
+# Where gg-execute writes the status of each thunk in a batch, and the
+# time it spent in each phase
+STATUS_FILE = os.path.join(TMP_DIR, 'gg-execute.status')
+TIMINGS_FILE = os.path.join(TMP_DIR, 'gg-execute.timings')
+
+def batch_options(thunk_hashes):
+    """gg-execute options for a batch: its thunks run in parallel, up to
+    one per CPU, and each of them gets its own status. A batch of more
+    than one thunk is pipelined, so its downloads and uploads overlap with
+    the execution."""
+    for path in (STATUS_FILE, TIMINGS_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+
+    jobs = min(len(thunk_hashes), os.cpu_count() or 1)
+    options = ['--jobs={}'.format(jobs),
+               '--status-file={}'.format(STATUS_FILE),
+               '--timings-file={}'.format(TIMINGS_FILE)]
+
+    if len(thunk_hashes) > 1:
+        options += ['--pipeline']
+
+    return options
+
+def read_phase_times():
+    """Seconds that gg-execute spent fetching, executing and uploading, from
+    the --timings-file it just wrote. The lines are in the format of a
+    timelog: the start time, then the milliseconds of each phase."""
+    phases = {}
     try:
-        output = sub.check_output(command, stderr=sub.STDOUT)
-        return 0, output.decode('utf-8')
-    except sub.CalledProcessError as exc:
-        return exc.returncode, exc.output.decode('utf-8')
+        with open(TIMINGS_FILE, 'r') as fin:
+            for line in fin.readlines()[1:]:
+                name, ms = line.split()
+                phases[name] = int(ms) / 1000
+    except FileNotFoundError:
+        pass
+
+    return phases
+
+def read_statuses():
+    """thunk hash -> status, for the batch that gg-execute just ran"""
+    statuses = {}
+    try:
+        with open(STATUS_FILE, 'r') as fin:
+            for line in fin:
+                thunk_hash, status = line.split()
+                statuses[thunk_hash] = int(status)
+    except FileNotFoundError:
+        pass
+
+    return statuses
+
+class Timings:
+    """Seconds spent in each phase, as name + 'Seconds'; a phase ends
+    when phase() is called with its name"""
+
+    def __init__(self, start=None):
+        self.timings = {}
+        self.last = time.perf_counter() if start is None else start
+
+    def lap(self):
+        """Seconds since the last phase ended, which starts a new one"""
+        now = time.perf_counter()
+        seconds = now - self.last
+        self.last = now
+        return seconds
+
+    def phase(self, name):
+        self.add(name, self.lap())
+
+    def add(self, name, seconds):
+        key = name + 'Seconds'
+        self.timings[key] = self.timings.get(key, 0) + seconds
+
+class InitTimings(Timings):
+    """Timings of the one-time setup of a function instance, reported by
+    its first invocation; the ones after it are warm"""
+
+    def __init__(self, start):
+        super().__init__(start)
+        self.timings = {'cold': True}
+
+    def take(self):
+        timings = self.timings
+        self.timings = {'cold': False}
+        return timings
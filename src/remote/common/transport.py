@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+import os
+import zlib
+import struct
+from base64 import b64encode
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Response formats for the handlers; see ExecutionRequest in gg.proto.
+# Clients that don't ask for raw outputs get them base64-encoded in
+# OutputItem.data, as before.
+
+BINARY_CONTENT_TYPE = 'application/x-protobuf'
+
+# Outputs smaller than this are not worth compressing (compression::THRESHOLD)
+COMPRESSION_THRESHOLD = 1024
+
+READ_SIZE = 64 * 1024
+
+# gg.protobuf.Encoding
+ENCODINGS = {'IDENTITY': 0, 'DEFLATE': 1, 'ZSTD': 2}
+
+# Encodings this handler can produce, best first
+SUPPORTED_ENCODINGS = (['ZSTD'] if zstandard else []) + ['DEFLATE']
+
+def _compressor(encoding, size):
+    if encoding == 'ZSTD':
+        # with the size in the frame, the client can decode it in one go
+        return zstandard.ZstdCompressor().compressobj(size=size)
+    return zlib.compressobj()
+
+class ResponseFormat:
+    def __init__(self, event):
+        self.raw_outputs = event.get('rawOutputs', False)
+        self.binary = event.get('binaryResponse', False)
+
+        accepted = event.get('acceptEncodings', [])
+        self.encoding = next((e for e in SUPPORTED_ENCODINGS if e in accepted),
+                             'IDENTITY')
+
+    def output_data(self, path):
+        """OutputItem fields carrying the contents of path, read in chunks
+        and compressed as they are read"""
+        if not self.raw_outputs:
+            with open(path, 'rb') as fin:
+                return {'data': b64encode(fin.read()).decode('ascii')}
+
+        size = os.path.getsize(path)
+        if self.encoding != 'IDENTITY' and size >= COMPRESSION_THRESHOLD:
+            compressor = _compressor(self.encoding, size)
+            chunks = []
+            with open(path, 'rb') as fin:
+                for block in iter(lambda: fin.read(READ_SIZE), b''):
+                    chunks += [compressor.compress(block)]
+            chunks += [compressor.flush()]
+
+            raw_data = b''.join(chunks)
+            if len(raw_data) < size:
+                return {'rawData': raw_data, 'encoding': self.encoding}
+
+        with open(path, 'rb') as fin:
+            return {'rawData': fin.read(), 'encoding': 'IDENTITY'}
+
+def to_json(response):
+    """response with its bytes fields base64-encoded, as in the JSON
+    mapping of protobuf"""
+    for executed_thunk in response.get('executedThunks', []):
+        for output in executed_thunk['outputs']:
+            if 'rawData' in output:
+                output['rawData'] = b64encode(output['rawData']).decode('ascii')
+
+    return response
+
+# Fields of the messages in an ExecutionResponse: (name, number, type),
+# where type is 'varint', 'enum', 'double', 'string', 'bytes' or a nested
+# message
+
+BLOB_CACHE_STATS = (('hits', 1, 'varint'), ('misses', 2, 'varint'),
+                    ('bytesSaved', 3, 'varint'), ('bytesFetched', 4, 'varint'),
+                    ('evictedBlobs', 5, 'varint'), ('evictedBytes', 6, 'varint'),
+                    ('size', 7, 'varint'), ('capacity', 8, 'varint'))
+
+OUTPUT_ITEM = (('tag', 1, 'string'), ('hash', 2, 'string'),
+               ('size', 3, 'varint'), ('executable', 4, 'varint'),
+               ('data', 5, 'string'), ('rawData', 6, 'bytes'),
+               ('encoding', 7, 'enum'))
+
+RESPONSE_ITEM = (('thunkHash', 1, 'string'), ('outputs', 2, OUTPUT_ITEM),
+                 ('returnCode', 3, 'varint'))
+
+INIT_TIMINGS = (('cold', 1, 'varint'), ('importSeconds', 2, 'double'),
+                ('cacheSeconds', 3, 'double'), ('stageSeconds', 4, 'double'))
+
+INVOCATION_TIMINGS = (('initSeconds', 1, 'double'),
+                      ('thunkWriteSeconds', 2, 'double'),
+                      ('fetchSeconds', 3, 'double'),
+                      ('executeSeconds', 4, 'double'),
+                      ('collectSeconds', 5, 'double'),
+                      ('uploadSeconds', 6, 'double'))
+
+EXECUTION_RESPONSE = (('executedThunks', 1, RESPONSE_ITEM),
+                      ('returnCode', 2, 'varint'), ('stdout', 3, 'string'),
+                      ('blobCache', 4, BLOB_CACHE_STATS),
+                      ('init', 5, INIT_TIMINGS),
+                      ('timings', 6, INVOCATION_TIMINGS))
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def _length_delimited(number, data):
+    return _varint(number << 3 | 2) + _varint(len(data)) + data
+
+def _encode(message, fields):
+    out = b''
+    for name, number, kind in fields:
+        value = message.get(name)
+        if value is None:
+            continue
+
+        for item in (value if isinstance(value, list) else [value]):
+            if isinstance(kind, tuple):
+                out += _length_delimited(number, _encode(item, kind))
+                continue
+
+            if kind == 'enum':
+                item = ENCODINGS[item]
+
+            if kind in ('varint', 'enum'):
+                if item:
+                    out += _varint(number << 3) + _varint(int(item))
+            elif kind == 'double':
+                if item:
+                    out += _varint(number << 3 | 1) + struct.pack('<d', item)
+            elif item:
+                if kind == 'string':
+                    item = item.encode('utf-8')
+                out += _length_delimited(number, item)
+
+    return out
+
+def to_protobuf(response):
+    """response as a serialized gg.protobuf.ExecutionResponse"""
+    return _encode(response, EXECUTION_RESPONSE)
@@ -59,7 +59,9 @@ def create_function_package(label, output, function_execs, gg_execute_static, gg
         "gg-execute-static": gg_execute_static,
         "main.py": "%s_function/main.py" % label,
         "ggpaths.py": "common/ggpaths.py",
-        "common.py": "common/common.py"
+        "common.py": "common/common.py",
+        "blob_cache.py": "common/blob_cache.py",
+        "transport.py": "common/transport.py"
     }
 
     if label == 'meow':
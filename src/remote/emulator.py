@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+
+"""Serves the gg functions on this machine, behind the same HTTP APIs as
+AWS Lambda and Google Cloud Functions, to benchmark the engines and the
+handlers without a cloud account.
+
+Every instance of a function is a worker process that imports its main.py
+once and then handles one invocation at a time, keeping its GG_DIR and
+scratch directory between invocations like a warm container. Instances
+start on demand (with an optional extra cold-start delay), idle ones are
+reused most recently used first and are recycled after --idle-timeout.
+Invocations over --concurrency, or over the --rate token bucket, are
+throttled with a 429, which the engines treat as a rate limit.
+
+The functions need a storage backend that this machine can reach, e.g. a
+local Redis:
+
+    redis-server --port 6379 &
+    export GG_STORAGE_URI=redis://127.0.0.1:6379
+
+    ./emulator.py --port 9001 &
+    GG_LAMBDA_ENDPOINT=http://127.0.0.1:9001 gg force --engine lambda ...
+    GG_GCLOUD_FUNCTION=http://127.0.0.1:9001/gg gg force --engine gcloud ...
+    GG_LAMBDA_ENDPOINT=http://127.0.0.1:9001 gg force --engine meow=127.0.0.1 ...
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import argparse
+import threading
+import traceback
+import multiprocessing
+import importlib.util
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Files of each function package, as in create-function.py
+COMMON_FILES = {
+    "ggpaths.py": "common/ggpaths.py",
+    "common.py": "common/common.py",
+    "blob_cache.py": "common/blob_cache.py",
+    "transport.py": "common/transport.py"
+}
+
+LABELS = ('lambda', 'gcloud', 'meow')
+
+LAMBDA_PATH_PREFIX = '/2015-03-31/functions/'
+MEOW_FUNCTION = 'gg-meow-function'
+
+class Request:
+    """The part of a Flask request that the Cloud Functions handler uses"""
+
+    def __init__(self, body):
+        self.data = body
+
+    def get_json(self):
+        return json.loads(self.data)
+
+def normalize_gcloud_result(result):
+    """(status, headers, body) of what a Flask view returned"""
+    status, headers = 200, {}
+    if isinstance(result, tuple):
+        if len(result) == 3:
+            result, status, headers = result
+        elif len(result) == 2:
+            # (body, status) or (body, headers)
+            result, extra = result
+            if isinstance(extra, int):
+                status = extra
+            else:
+                headers = extra
+        else:
+            result, = result
+
+    if isinstance(result, str):
+        result = result.encode('utf-8')
+
+    return status, dict(headers), result
+
+def worker_main(label, package_dir, instance_dir, cold_start, conn):
+    """Body of an instance: sets up its own GG_DIR and scratch space, loads
+    the handler, then serves the invocations that come through conn"""
+    os.environ['GG_DIR'] = os.path.join(instance_dir, '_gg')
+    os.environ['GG_CACHE_DIR'] = os.path.join(instance_dir, '_gg', '_cache')
+    os.environ['TMPDIR'] = os.path.join(instance_dir, 'tmp')
+    os.makedirs(os.environ['TMPDIR'], exist_ok=True)
+
+    # what runs before the handler in a real container
+    time.sleep(cold_start)
+
+    spec = importlib.util.spec_from_file_location(
+        'main', os.path.join(package_dir, 'main.py'))
+    main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(main)
+
+    conn.send(True)
+
+    while True:
+        try:
+            body = conn.recv()
+        except EOFError:
+            return
+
+        try:
+            if label == 'gcloud':
+                result = normalize_gcloud_result(main.handler(Request(body)))
+            else:
+                result = main.handler(json.loads(body), None)
+
+            conn.send(('ok', result))
+        except Exception as ex:
+            conn.send(('error', {
+                'errorMessage': str(ex),
+                'errorType': type(ex).__name__,
+                'stackTrace': traceback.format_exc().splitlines()
+            }))
+
+class InvocationTimeout(Exception):
+    pass
+
+class InstanceCrashed(Exception):
+    pass
+
+class Instance:
+    def __init__(self, label, package_dir, instance_dir, cold_start):
+        self.instance_dir = instance_dir
+        self.last_used = time.monotonic()
+
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=worker_main, daemon=True,
+            args=(label, package_dir, instance_dir, cold_start, child_conn))
+        self.process.start()
+        child_conn.close()
+
+    def wait_ready(self, timeout):
+        if not self.conn.poll(timeout):
+            raise InvocationTimeout()
+
+        try:
+            self.conn.recv()
+        except EOFError:
+            raise InstanceCrashed()
+
+    def invoke(self, body, timeout):
+        try:
+            self.conn.send(body)
+            if not self.conn.poll(timeout):
+                raise InvocationTimeout()
+
+            return self.conn.recv()
+        except (EOFError, BrokenPipeError):
+            raise InstanceCrashed()
+
+    def stop(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        shutil.rmtree(self.instance_dir, ignore_errors=True)
+
+class Throttled(Exception):
+    pass
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+        if self.tokens < 1:
+            return False
+
+        self.tokens -= 1
+        return True
+
+class Emulator:
+    """Instances of each function, and the limits that all of them share,
+    like the ones of an account"""
+
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.idle = {label: [] for label in LABELS}
+        self.in_flight = 0
+        self.next_id = 0
+        self.bucket = TokenBucket(args.rate, args.burst) if args.rate else None
+        self.stats = Counter()
+
+        self.packages = {}
+        for label in LABELS:
+            self.packages[label] = self.make_package(label)
+
+        for _ in range(args.warm):
+            instance = self.start_instance(args.function)
+            instance.wait_ready(args.timeout)
+            self.idle[args.function].append(instance)
+
+        threading.Thread(target=self.recycle_idle, daemon=True).start()
+
+    def make_package(self, label):
+        """A directory laid out like the package of the function"""
+        package_dir = os.path.join(self.args.root, label + '_function')
+        os.makedirs(package_dir, exist_ok=True)
+
+        files = dict(COMMON_FILES)
+        files['main.py'] = '%s_function/main.py' % label
+        files = {name: os.path.join(SRC_DIR, path)
+                 for name, path in files.items()}
+        files['gg-execute-static'] = self.args.gg_execute_static
+        if label == 'meow':
+            files['gg-meow-worker'] = self.args.gg_meow_worker
+
+        for name, path in files.items():
+            if not path:
+                continue
+
+            link = os.path.join(package_dir, name)
+            if os.path.lexists(link):
+                os.remove(link)
+            os.symlink(os.path.abspath(path), link)
+
+        return package_dir
+
+    def start_instance(self, label):
+        with self.lock:
+            instance_dir = os.path.join(self.args.root, 'instances',
+                                        str(self.next_id))
+            self.next_id += 1
+            self.stats['coldStarts'] += 1
+
+        return Instance(label, self.packages[label], instance_dir,
+                        self.args.cold_start)
+
+    def acquire(self, label):
+        """An idle instance of label, or None if a new one has to be
+        started; raises Throttled if the invocation is over the limits"""
+        with self.lock:
+            if self.bucket and not self.bucket.take():
+                self.stats['throttled'] += 1
+                raise Throttled()
+
+            if self.in_flight >= self.args.concurrency:
+                self.stats['throttled'] += 1
+                raise Throttled()
+
+            self.in_flight += 1
+            self.stats['invocations'] += 1
+
+            if self.idle[label]:
+                return self.idle[label].pop()
+
+        return None
+
+    def release(self, label, instance):
+        with self.lock:
+            self.in_flight -= 1
+            if instance:
+                instance.last_used = time.monotonic()
+                self.idle[label].append(instance)
+
+    def recycle_idle(self):
+        while True:
+            time.sleep(1)
+            expired = []
+            deadline = time.monotonic() - self.args.idle_timeout
+            with self.lock:
+                for label, instances in self.idle.items():
+                    keep = self.args.warm if label == self.args.function else 0
+                    while len(instances) > keep and instances[0].last_used < deadline:
+                        expired += [instances.pop(0)]
+
+            for instance in expired:
+                instance.stop()
+
+    def invoke(self, label, body):
+        """(status, result) of running the handler of label on body, where
+        status is 'ok', 'error' or 'timeout'"""
+        return self.run(label, self.acquire(label), body)
+
+    def run(self, label, instance, body):
+        """invoke() on an instance that acquire() returned"""
+        start = time.monotonic()
+        cold = instance is None
+
+        try:
+            if cold:
+                instance = self.start_instance(label)
+                instance.wait_ready(self.args.timeout)
+
+            status, result = instance.invoke(body, self.args.timeout)
+        except (InvocationTimeout, InstanceCrashed) as ex:
+            instance.stop()
+            instance = None
+            self.count('errors')
+            if isinstance(ex, InvocationTimeout):
+                return 'timeout', "Task timed out after {:.2f} seconds".format(
+                    self.args.timeout)
+            return 'error', {'errorMessage': 'instance exited',
+                             'errorType': 'Runtime.ExitError'}
+        finally:
+            self.release(label, instance)
+
+        if status == 'error':
+            self.count('errors')
+
+        if self.args.verbose:
+            print("{} {} {:.3f}s {}".format(label, 'cold' if cold else 'warm',
+                                            time.monotonic() - start, status),
+                  file=sys.stderr)
+
+        return status, result
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def summary(self):
+        with self.lock:
+            stats = Counter(self.stats)
+
+        return " ".join("{}={}".format(key, stats[key])
+                        for key in ('invocations', 'coldStarts', 'throttled',
+                                    'errors'))
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.emulator.args.verbose:
+            super().log_message(format, *args)
+
+    def send(self, status, body=b'', headers=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        emulator = self.server.emulator
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        try:
+            if self.path.startswith(LAMBDA_PATH_PREFIX):
+                self.invoke_lambda(emulator, body)
+            else:
+                self.invoke_gcloud(emulator, body)
+        except Throttled:
+            self.send(429, json.dumps({'message': 'Rate Exceeded.'}),
+                      {'x-amzn-ErrorType': 'TooManyRequestsException',
+                       'Content-Type': 'application/json'})
+
+    def invoke_lambda(self, emulator, body):
+        function_name = self.path[len(LAMBDA_PATH_PREFIX):].split('/')[0]
+        label = 'meow' if function_name == MEOW_FUNCTION else 'lambda'
+
+        if self.headers.get('x-amz-invocation-type') == 'Event':
+            # the instance is taken now, so that throttling is reported
+            instance = emulator.acquire(label)
+            threading.Thread(target=emulator.run, args=(label, instance, body),
+                             daemon=True).start()
+            self.send(202)
+            return
+
+        status, result = emulator.invoke(label, body)
+
+        if status == 'ok':
+            self.send(200, json.dumps(result),
+                      {'Content-Type': 'application/json'})
+        else:
+            if status == 'timeout':
+                result = {'errorMessage': result}
+            self.send(200, json.dumps(result),
+                      {'Content-Type': 'application/json',
+                       'X-Amz-Function-Error': 'Unhandled'})
+
+    def invoke_gcloud(self, emulator, body):
+        status, result = emulator.invoke('gcloud', body)
+
+        if status == 'ok':
+            self.send(result[0], result[2], result[1])
+        elif status == 'timeout':
+            self.send(408, result)
+        else:
+            self.send(500, "\n".join(result.get('stackTrace',
+                                                [result['errorMessage']])))
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve the gg functions locally, behind the Lambda and "
+                    "Cloud Functions invocation APIs.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9001)
+    parser.add_argument('--function', choices=LABELS, default='lambda',
+                        help="function that the warm instances run")
+    parser.add_argument('--warm', type=int, default=0,
+                        help="instances started in advance and kept warm")
+    parser.add_argument('--concurrency', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="invocations running at once, over which they "
+                             "are throttled")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="invocations per second, over which they are "
+                             "throttled (default: no limit)")
+    parser.add_argument('--burst', type=int, default=0,
+                        help="invocations allowed at once over the rate")
+    parser.add_argument('--cold-start', type=float, default=0,
+                        help="seconds added to the start of an instance")
+    parser.add_argument('--idle-timeout', type=float, default=300,
+                        help="seconds after which an idle instance is "
+                             "recycled")
+    parser.add_argument('--timeout', type=float, default=300,
+                        help="seconds an invocation may take")
+    parser.add_argument('--root', default='/tmp/gg-emulator',
+                        help="directory for the packages and the instances")
+    parser.add_argument('--gg-execute-static', dest='gg_execute_static',
+                        default=shutil.which("gg-execute-static"))
+    parser.add_argument('--gg-meow-worker', dest='gg_meow_worker',
+                        default=shutil.which("gg-meow-worker-static"))
+    parser.add_argument('--verbose', action='store_true', default=False)
+
+    args = parser.parse_args()
+
+    if not args.gg_execute_static:
+        raise Exception("Cannot find gg-execute-static")
+
+    shutil.rmtree(os.path.join(args.root, 'instances'), ignore_errors=True)
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.emulator = Emulator(args)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt()
+
+    signal.signal(signal.SIGTERM, stop)
+
+    print("Serving on http://{}:{}/".format(args.host, args.port),
+          file=sys.stderr)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+    print(server.emulator.summary(), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
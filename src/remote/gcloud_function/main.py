@@ -1,13 +1,14 @@
 #!/usr/bin/env python3
 
+import time
+init_start = time.perf_counter()
+
 import os
 import sys
-import time
-import shutil
 import subprocess as sub
 import logging
 import json
-from base64 import b64decode, b64encode
+from base64 import b64decode
 
 # Set up environment variables necessary
 curdir = os.path.dirname(__file__)
@@ -23,84 +24,168 @@ if not os.environ.get('GG_CACHE_DIR'):
 
 # Now we can import gg stuff...
 from ggpaths import GGPaths, GGCache
-from common import is_executable, make_executable, run_command
+from common import is_executable, run_command, Timings, InitTimings, \
+                   batch_options, read_statuses, read_phase_times, \
+                   OPERATIONAL_FAILURE, TMP_DIR
+from blob_cache import BlobCache, thunk_dependencies
+from transport import ResponseFormat, BINARY_CONTENT_TYPE, to_json, to_protobuf
+
+init_timings = InitTimings(init_start)
+init_timings.phase('import')
+
+# One-time setup when the instance starts. Blobs stay in /tmp between
+# invocations of a warm instance
+blob_cache = BlobCache()
+init_timings.phase('cache')
+
+blob_cache.stage_executables(os.path.join(curdir, 'executables'))
+init_timings.phase('stage')
 
 def is_hash_for_thunk(hash):
     return len(hash) > 0 and hash[0] == 'T'
 
+def make_response(response, response_format):
+    if response_format.binary:
+        return (to_protobuf(response), 200,
+                {'Content-Type': BINARY_CONTENT_TYPE})
+
+    return json.dumps(to_json(response))
+
 def handler(request):
+    timings = Timings()
+
     event = request.get_json()
 
+    # {"warmup": true} only starts the instance (the setup above)
+    if event.get('warmup'):
+        return json.dumps({
+            'returnCode': 0,
+            'stdout': '',
+            'init': init_timings.take(),
+            'timings': timings.timings
+        })
+
     os.environ['GG_STORAGE_URI'] = event['storageBackend']
     thunks = event['thunks']
     timelog = event.get('timelog')
+    response_format = ResponseFormat(event)
 
-    # Write thunks to disk
+    blob_cache.reset_stats()
+
+    # Blobs this invocation needs, which must not be evicted
+    keep = set()
+    thunk_data = {}
     for thunk_item in thunks:
-        thunk_data = b64decode(thunk_item['data'])
-        with open(GGPaths.blob_path(thunk_item['hash']), "wb") as fout:
-            fout.write(thunk_data)
+        thunk_data[thunk_item['hash']] = b64decode(thunk_item['data'])
+        keep.add(thunk_item['hash'])
 
-    # Move executables from Lambda package to .gg directory
-    executables_dir = os.path.join(curdir, 'executables')
-    if os.path.exists(executables_dir):
-        for exe in os.listdir(executables_dir):
-            blob_path = GGPaths.blob_path(exe)
-            exe_path = os.path.join(executables_dir, exe)
+    deps = []
+    for data in thunk_data.values():
+        deps += thunk_dependencies(data)
+    keep.update(deps)
 
-            if not os.path.exists(blob_path):
-                shutil.copy(exe_path, blob_path)
-                make_executable(blob_path)
+    # Make room for the thunks and the dependencies that have to be fetched
+    blob_cache.make_room(sum(len(data) for data in thunk_data.values()) +
+                         blob_cache.lookup(deps), keep)
 
     # Remove old thunk-execute directories
-    os.system("rm -rf /tmp/thunk-execute.*")
+    os.system("rm -rf {}/thunk-execute.*".format(TMP_DIR))
+    timings.phase('init')
 
-    # Execute the thunk, and upload the result
+    # Write thunks to disk
+    for thunk_hash, data in thunk_data.items():
+        with open(GGPaths.blob_path(thunk_hash), "wb") as fout:
+            fout.write(data)
+        blob_cache.add(thunk_hash)
+
+    timings.phase('thunkWrite')
+
+    # Execute the thunk, and upload the result; the blobs it leaves
+    # behind are kept for the next invocations
     command = ["gg-execute-static",
                "--get-dependencies",
-               "--put-output",
-               "--cleanup"]
+               "--put-output"]
 
     if timelog:
         command += ["--timelog"]
 
-    return_code, stdout = run_command(command +
-         [x['hash'] for x in thunks])
+    # Independent thunks in a batch run in parallel and fail on their own
+    thunk_hashes = [x['hash'] for x in thunks]
+    command += batch_options(thunk_hashes)
+
+    return_code, stdout = run_command(command + thunk_hashes)
+    statuses = read_statuses()
+
+    # The phases of gg-execute can overlap; if it didn't get to report
+    # them, all of its time counts as execution
+    gg_execute_seconds = timings.lap()
+    phases = read_phase_times()
+    timings.add('fetch', phases.get('fetch', 0))
+    timings.add('execute', phases.get('execute', gg_execute_seconds))
+    timings.add('upload', phases.get('upload', 0))
+
+    for dep in deps:
+        blob_cache.add(dep)
 
     executed_thunks = []
+    failed = 0
 
     for thunk in thunks:
+        thunk_code = statuses.get(thunk['hash'], return_code)
         outputs = []
 
         for output_tag in thunk['outputs']:
             output_hash = GGCache.check(thunk['hash'], output_tag)
 
-            if not output_hash:
-                return json.dumps({
-                    'returnCode': return_code,
-                    'stdout': stdout
-                })
+            if thunk_code or not output_hash:
+                thunk_code = thunk_code or return_code or OPERATIONAL_FAILURE
+                outputs = []
+                break
 
-            data = None
-            if is_hash_for_thunk(output_hash):
-                with open(GGPaths.blob_path(output_hash), 'rb') as tin:
-                    data = b64encode(tin.read()).decode('ascii')
+            blob_cache.add(output_hash)
+            keep.add(output_hash)
 
-            outputs += [{
+            output = {
                 'tag': output_tag,
                 'hash': output_hash,
                 'size': os.path.getsize(GGPaths.blob_path(output_hash)),
-                'executable': is_executable(GGPaths.blob_path(output_hash)),
-                'data': data
-            }]
+                'executable': is_executable(GGPaths.blob_path(output_hash))
+            }
+
+            if is_hash_for_thunk(output_hash):
+                output.update(response_format.output_data(
+                    GGPaths.blob_path(output_hash)))
+
+            outputs += [output]
+
+        if thunk_code:
+            failed += 1
 
         executed_thunks += [{
             'thunkHash': thunk['hash'],
+            'returnCode': thunk_code,
             'outputs': outputs
         }]
 
-    return json.dumps({
+    blob_cache.finish(keep)
+    timings.phase('collect')
+
+    # The invocation fails only if none of its thunks succeeded; otherwise
+    # the failed ones are reported in executedThunks
+    if failed == len(thunks):
+        return make_response({
+            'returnCode': executed_thunks[0]['returnCode'],
+            'stdout': stdout,
+            'blobCache': blob_cache.stats(),
+            'init': init_timings.take(),
+            'timings': timings.timings
+        }, response_format)
+
+    return make_response({
         'returnCode': 0,
-        'stdout': '',
-        'executedThunks': executed_thunks
-    })
+        'stdout': stdout if failed else '',
+        'executedThunks': executed_thunks,
+        'blobCache': blob_cache.stats(),
+        'init': init_timings.take(),
+        'timings': timings.timings
+    }, response_format)
@@ -1,12 +1,13 @@
 #!/usr/bin/env python3.6
 
+import time
+init_start = time.perf_counter()
+
 import os
 import sys
-import time
 import errno
-import shutil
 import subprocess as sub
-from base64 import b64decode, b64encode
+from base64 import b64decode
 
 # Set up environment variables necessary
 curdir = os.path.dirname(__file__)
@@ -21,19 +22,67 @@ if not os.environ.get('GG_CACHE_DIR'):
     os.environ['GG_CACHE_DIR'] = "/tmp/_gg/_cache"
 
 # Now we can import gg stuff...
-from ggpaths import GGPaths, GGCache, make_gg_dirs
-from common import is_executable, make_executable, run_command
+from ggpaths import GGPaths, GGCache
+from common import is_executable, run_command, Timings, InitTimings, \
+                   batch_options, read_statuses, read_phase_times, \
+                   OPERATIONAL_FAILURE, TMP_DIR
+from blob_cache import BlobCache, thunk_dependencies
+from transport import ResponseFormat, to_json
+
+init_timings = InitTimings(init_start)
+init_timings.phase('import')
+
+# One-time setup when the container starts. Blobs stay in /tmp between
+# invocations of a warm container
+blob_cache = BlobCache()
+init_timings.phase('cache')
+
+blob_cache.stage_executables(os.path.join(curdir, 'executables'))
+init_timings.phase('stage')
 
 def is_hash_for_thunk(hash):
     return len(hash) > 0 and hash[0] == 'T'
 
 def handler(event, context):
+    timings = Timings()
+
+    # {"warmup": true} only starts the container (the setup above)
+    if event.get('warmup'):
+        return {
+            'returnCode': 0,
+            'stdout': '',
+            'init': init_timings.take(),
+            'timings': timings.timings
+        }
+
     os.environ['GG_STORAGE_URI'] = event['storageBackend']
     thunks = event['thunks']
     timelog = event.get('timelog')
 
+    # Lambda returns JSON, so a binary response is never sent
+    response_format = ResponseFormat(event)
+
     # Remove old thunk-execute directories
-    os.system("rm -rf /tmp/thunk-execute.*")
+    os.system("rm -rf {}/thunk-execute.*".format(TMP_DIR))
+
+    blob_cache.reset_stats()
+
+    # Blobs this invocation needs, which must not be evicted
+    keep = set()
+    thunk_data = {}
+    for thunk_item in thunks:
+        thunk_data[thunk_item['hash']] = b64decode(thunk_item['data'])
+        keep.add(thunk_item['hash'])
+
+    deps = []
+    for data in thunk_data.values():
+        deps += thunk_dependencies(data)
+    keep.update(deps)
+
+    # Make room for the thunks and the dependencies that have to be fetched
+    blob_cache.make_room(sum(len(data) for data in thunk_data.values()) +
+                         blob_cache.lookup(deps), keep)
+    timings.phase('init')
 
     # Write thunks to disk
 
@@ -41,83 +90,113 @@ def handler(event, context):
 
     while True:
         try:
-            for thunk_item in thunks:
-                thunk_data = b64decode(thunk_item['data'])
-                if os.path.exists(GGPaths.blob_path(thunk_item['hash'])):
-                    os.remove(GGPaths.blob_path(thunk_item['hash']))
-                with open(GGPaths.blob_path(thunk_item['hash']), "wb") as fout:
-                    fout.write(thunk_data)
-
-            # Move executables from Lambda package to .gg directory
-            executables_dir = os.path.join(curdir, 'executables')
-            if os.path.exists(executables_dir):
-                for exe in os.listdir(executables_dir):
-                    blob_path = GGPaths.blob_path(exe)
-                    exe_path = os.path.join(executables_dir, exe)
-
-                    if not os.path.exists(blob_path):
-                        shutil.copy(exe_path, blob_path)
-                        make_executable(blob_path)
+            for thunk_hash, data in thunk_data.items():
+                if os.path.exists(GGPaths.blob_path(thunk_hash)):
+                    os.remove(GGPaths.blob_path(thunk_hash))
+                with open(GGPaths.blob_path(thunk_hash), "wb") as fout:
+                    fout.write(data)
+                blob_cache.add(thunk_hash)
 
             break
 
         except OSError as ex:
             if not tried_once and ex.errno == errno.ENOSPC:
-                # there's no space left; let's get rid of GG_DIR and try again
+                # there's no space left; evict the least recently used
+                # half of the cache and try again
                 tried_once = True
-                os.system("rm -rf '{}'".format(GGPaths.blobs))
-                os.system("rm -rf '{}'".format(GGPaths.reductions))
-                make_gg_dirs()
+                blob_cache.shrink(keep)
                 continue
             else:
                 raise
 
-    # Execute the thunk, and upload the result
+    timings.phase('thunkWrite')
+
+    # Execute the thunk, and upload the result; the blobs it leaves
+    # behind are kept for the next invocations
     command = ["gg-execute-static",
                "--get-dependencies",
-               "--put-output",
-               "--cleanup"]
+               "--put-output"]
 
     if timelog:
         command += ["--timelog"]
 
-    return_code, stdout = run_command(command +
-         [x['hash'] for x in thunks])
+    # Independent thunks in a batch run in parallel and fail on their own
+    thunk_hashes = [x['hash'] for x in thunks]
+    command += batch_options(thunk_hashes)
+
+    return_code, stdout = run_command(command + thunk_hashes)
+    statuses = read_statuses()
+
+    # The phases of gg-execute can overlap; if it didn't get to report
+    # them, all of its time counts as execution
+    gg_execute_seconds = timings.lap()
+    phases = read_phase_times()
+    timings.add('fetch', phases.get('fetch', 0))
+    timings.add('execute', phases.get('execute', gg_execute_seconds))
+    timings.add('upload', phases.get('upload', 0))
+
+    for dep in deps:
+        blob_cache.add(dep)
 
     executed_thunks = []
+    failed = 0
 
     for thunk in thunks:
+        thunk_code = statuses.get(thunk['hash'], return_code)
         outputs = []
 
         for output_tag in thunk['outputs']:
             output_hash = GGCache.check(thunk['hash'], output_tag)
 
-            if not output_hash:
-                return {
-                    'returnCode': return_code,
-                    'stdout': stdout
-                }
+            if thunk_code or not output_hash:
+                thunk_code = thunk_code or return_code or OPERATIONAL_FAILURE
+                outputs = []
+                break
 
-            data = None
-            if is_hash_for_thunk(output_hash):
-                with open(GGPaths.blob_path(output_hash), 'rb') as tin:
-                    data = b64encode(tin.read()).decode('ascii')
+            blob_cache.add(output_hash)
+            keep.add(output_hash)
 
-            outputs += [{
+            output = {
                 'tag': output_tag,
                 'hash': output_hash,
                 'size': os.path.getsize(GGPaths.blob_path(output_hash)),
-                'executable': is_executable(GGPaths.blob_path(output_hash)),
-                'data': data
-            }]
+                'executable': is_executable(GGPaths.blob_path(output_hash))
+            }
+
+            if is_hash_for_thunk(output_hash):
+                output.update(response_format.output_data(
+                    GGPaths.blob_path(output_hash)))
+
+            outputs += [output]
+
+        if thunk_code:
+            failed += 1
 
         executed_thunks += [{
             'thunkHash': thunk['hash'],
+            'returnCode': thunk_code,
             'outputs': outputs
         }]
 
-    return {
+    blob_cache.finish(keep)
+    timings.phase('collect')
+
+    # The invocation fails only if none of its thunks succeeded; otherwise
+    # the failed ones are reported in executedThunks
+    if failed == len(thunks):
+        return to_json({
+            'returnCode': executed_thunks[0]['returnCode'],
+            'stdout': stdout,
+            'blobCache': blob_cache.stats(),
+            'init': init_timings.take(),
+            'timings': timings.timings
+        })
+
+    return to_json({
         'returnCode': 0,
-        'stdout': '',
-        'executedThunks': executed_thunks
-    }
+        'stdout': stdout if failed else '',
+        'executedThunks': executed_thunks,
+        'blobCache': blob_cache.stats(),
+        'init': init_timings.take(),
+        'timings': timings.timings
+    })
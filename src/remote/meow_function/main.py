@@ -22,6 +22,9 @@ if not os.environ.get('GG_CACHE_DIR'):
 # Now we can import gg stuff...
 from common import run_command
 
+# Seconds before the function times out that the worker leaves
+DEADLINE_MARGIN = 30
+
 def handler(event, context):
     os.environ['GG_STORAGE_URI'] = event['storageBackend']
     coordinator_address = event['coordinator']
@@ -30,8 +33,22 @@ def handler(event, context):
     if event.get('timelog'):
         os.environ['GG_EXECUTE_TIMELOG'] = '1'
 
-    return_code, stdout = run_command(["gg-meow-worker",
-        coordinator_host, coordinator_port])
+    command = ["gg-meow-worker"]
+
+    # Keep the worker, and the blobs it has, for the coordinators that come
+    # after this one
+    idle_timeout = event.get('idleTimeout', 0)
+    if idle_timeout:
+        command += ["--idle-timeout={}".format(idle_timeout)]
+
+    # Busy or not, leave before the function times out, so that the
+    # coordinator sees the worker go and runs its thunk somewhere else
+    if context:
+        remaining = context.get_remaining_time_in_millis() // 1000
+        command += ["--deadline={}".format(max(1, remaining - DEADLINE_MARGIN))]
+
+    return_code, stdout = run_command(command +
+        [coordinator_host, coordinator_port])
 
     print(stdout)
     print(return_code)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+"""
+Checks the eviction order of the handlers' blob cache (blob_cache.py):
+least recently used first, never a pinned blob or one the invocation
+keeps, and the reductions that point to evicted blobs go with them.
+"""
+
+import os
+import sys
+import tempfile
+
+BLOB_SIZE = 100
+
+def blob_name(name):
+    return 'V' + name * 43 + '%08x' % BLOB_SIZE
+
+def main():
+    num_failed = 0
+
+    def check(what, expected, actual):
+        nonlocal num_failed
+        if expected != actual:
+            num_failed += 1
+            print("TEST FAILED: %s (expected %r, got %r)" %
+                  (what, expected, actual))
+
+    with tempfile.TemporaryDirectory() as gg_dir:
+        os.environ['GG_DIR'] = gg_dir
+        from ggpaths import GGPaths, GGCache
+        from blob_cache import BlobCache
+
+        def write_blob(name):
+            blob = blob_name(name)
+            with open(GGPaths.blob_path(blob), 'wb') as fout:
+                fout.write(b'x' * BLOB_SIZE)
+            cache.add(blob)
+            return blob
+
+        def cached():
+            return [blob for blob in cache.blobs
+                    if os.path.exists(GGPaths.blob_path(blob))]
+
+        cache = BlobCache(capacity=3 * BLOB_SIZE)
+        a, b, c = write_blob('a'), write_blob('b'), write_blob('c')
+        check("size of three blobs", 3 * BLOB_SIZE, cache.size)
+
+        # a is used again, so b is the least recently used
+        check("bytes to fetch", BLOB_SIZE, cache.lookup([a, blob_name('z')]))
+        cache.make_room(BLOB_SIZE)
+        check("evicts the least recently used blob", [c, a], cached())
+        check("deletes the evicted blob", False,
+              os.path.exists(GGPaths.blob_path(b)))
+
+        d = write_blob('d')
+        cache.make_room(BLOB_SIZE, keep={c})
+        check("skips the blobs the invocation keeps", [c, d], cached())
+
+        cache.pin(c)
+        GGCache.insert('T' + 'c' * 43 + '00000010', c)
+        GGCache.insert('T' + 'd' * 43 + '00000010', d)
+        cache.make_room(3 * BLOB_SIZE)
+        check("never evicts a pinned blob", [c], cached())
+        check("size after evictions", BLOB_SIZE, cache.size)
+        check("drops reductions to evicted blobs",
+              ['T' + 'c' * 43 + '00000010'], os.listdir(GGPaths.reductions))
+        check("evicted blobs", 3, cache.stats()['evictedBlobs'])
+        check("evicted bytes", 3 * BLOB_SIZE, cache.stats()['evictedBytes'])
+
+        # a warm container picks up what is on disk, oldest first
+        e = write_blob('e')
+        os.utime(GGPaths.blob_path(c), (0, 0))
+        check("scans the blobs on disk", [c, e],
+              list(BlobCache(capacity=3 * BLOB_SIZE).blobs))
+
+    print("%d failed checks" % num_failed)
+    return num_failed
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""
+Checks that the outputs that the handlers compress (transport.py) are
+decompressed by gg's decoder (compression-roundtrip) and the other way
+around, for every encoding that both sides support.
+"""
+
+import os
+import sys
+import zlib
+import tempfile
+import subprocess as sp
+
+import transport
+
+SAMPLES = [
+    # (name, data)
+    ('text', b''.join(b'line %d of the output\n' % i for i in range(20000))),
+    ('random', os.urandom(64 * 1024)),
+    ('small', b'tiny output'),
+    ('empty', b''),
+]
+
+def cpp_supported():
+    proc = sp.run(['compression-roundtrip', 'supported'], stdout=sp.PIPE,
+                  check=True)
+    return proc.stdout.decode('ascii').split()
+
+def cpp(command, encoding, data, tmp):
+    in_path = os.path.join(tmp, 'in')
+    out_path = os.path.join(tmp, 'out')
+    with open(in_path, 'wb') as fout:
+        fout.write(data)
+
+    if sp.run(['compression-roundtrip', command, encoding, in_path,
+               out_path]).returncode != 0:
+        return None
+
+    with open(out_path, 'rb') as fin:
+        return fin.read()
+
+def py_decompress(encoding, data):
+    if encoding == 'ZSTD':
+        return transport.zstandard.ZstdDecompressor().decompress(data)
+    if encoding == 'DEFLATE':
+        return zlib.decompress(data)
+    return data
+
+def py_decompress_or_none(encoding, data):
+    return None if data is None else py_decompress(encoding, data)
+
+def main():
+    num_failed = 0
+    encodings = [e for e in ['DEFLATE', 'ZSTD']
+                 if e in cpp_supported() and e in transport.SUPPORTED_ENCODINGS]
+
+    def check(what, expected, actual):
+        nonlocal num_failed
+        if expected != actual:
+            num_failed += 1
+            print("TEST FAILED: %s" % what)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for encoding in encodings:
+            for name, data in SAMPLES:
+                path = os.path.join(tmp, name)
+                with open(path, 'wb') as fout:
+                    fout.write(data)
+
+                # handler -> client
+                response_format = transport.ResponseFormat({
+                    'rawOutputs': True, 'acceptEncodings': [encoding]})
+                output = response_format.output_data(path)
+
+                if name == 'text':
+                    check("%s: %s is not compressed" % (encoding, name),
+                          encoding, output['encoding'])
+
+                check("%s: %s from the handler" % (encoding, name), data,
+                      cpp('decompress', output['encoding'], output['rawData'],
+                          tmp))
+
+                # client -> handler
+                check("%s: %s to the handler" % (encoding, name), data,
+                      py_decompress_or_none(encoding,
+                                            cpp('compress', encoding, data,
+                                                tmp)))
+
+        if 'ZSTD' in encodings:
+            # frames from a streaming compressor don't record their size
+            compressor = transport.zstandard.ZstdCompressor().compressobj()
+            data = SAMPLES[0][1]
+            frame = compressor.compress(data) + compressor.flush()
+            check("ZSTD: frame without a content size", data,
+                  cpp('decompress', 'ZSTD', frame, tmp))
+
+    print("%s: %d failed checks" % (", ".join(encodings), num_failed))
+    return num_failed
+
+if __name__ == '__main__':
+    sys.exit(main())
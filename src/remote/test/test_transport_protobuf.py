@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+"""
+Checks that the ExecutionResponses that the handlers serialize by hand
+(transport.to_protobuf) are the ones that protoc's code for gg.proto
+(gg_pb2, generated next to this script) produces from the same response
+in its JSON mapping.
+"""
+
+import sys
+import copy
+
+import transport
+
+try:
+    from google.protobuf import json_format
+    import gg_pb2
+except ImportError as ex:
+    print("skipped: %s" % ex)
+    sys.exit(77)
+
+OUTPUT = {
+    'tag': 'output', 'hash': 'V' + 'a' * 43 + '0000000d', 'size': 13,
+    'executable': True, 'rawData': b'\x00output\xffdata', 'encoding': 'ZSTD'
+}
+
+RESPONSES = [
+    # (name, response)
+    ('empty', {}),
+    ('zero values', {
+        'returnCode': 0, 'stdout': '',
+        'executedThunks': [{'thunkHash': 'T' + 'b' * 43 + '00000010',
+                            'outputs': [], 'returnCode': 0}],
+        'blobCache': {'hits': 0, 'size': 0},
+    }),
+    ('full', {
+        'returnCode': 1, 'stdout': 'stdout with unicode: é中',
+        'executedThunks': [
+            {'thunkHash': 'T' + 'c' * 43 + '00000010',
+             'outputs': [OUTPUT,
+                         {'tag': 'log', 'hash': 'V' + 'd' * 43 + '00000004',
+                          'size': 4, 'data': 'bG9n', 'encoding': 'IDENTITY'}],
+             'returnCode': 0},
+            {'thunkHash': 'T' + 'e' * 43 + '00000010', 'outputs': [],
+             'returnCode': 2},
+        ],
+        'blobCache': {'hits': 3, 'misses': 1, 'bytesSaved': 5 << 33,
+                      'bytesFetched': 300, 'evictedBlobs': 2,
+                      'evictedBytes': 1 << 40, 'size': 123456789,
+                      'capacity': 1 << 41},
+        'init': {'cold': True, 'importSeconds': 0.25, 'cacheSeconds': 1e-9,
+                 'stageSeconds': 3.5},
+        'timings': {'initSeconds': 0.1, 'thunkWriteSeconds': 0.2,
+                    'fetchSeconds': 0.3, 'executeSeconds': 12.5,
+                    'collectSeconds': 0.5, 'uploadSeconds': 0.75},
+    }),
+]
+
+def main():
+    num_failed = 0
+
+    def check(what, expected, actual):
+        nonlocal num_failed
+        if expected != actual:
+            num_failed += 1
+            print("TEST FAILED: %s" % what)
+
+    for name, response in RESPONSES:
+        serialized = transport.to_protobuf(copy.deepcopy(response))
+
+        expected = json_format.ParseDict(
+            transport.to_json(copy.deepcopy(response)),
+            gg_pb2.ExecutionResponse())
+
+        check("%s: parses to the same message" % name, expected,
+              gg_pb2.ExecutionResponse.FromString(serialized))
+        check("%s: same bytes as protoc's code" % name,
+              expected.SerializeToString(deterministic=True), serialized)
+
+    print("%d failed checks" % num_failed)
+    return num_failed
+
+if __name__ == '__main__':
+    sys.exit(main())
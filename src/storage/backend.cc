@@ -28,7 +28,8 @@ void StorageBackend::set_available( const std::string & hash )
 }
 
 
-unique_ptr<StorageBackend> StorageBackend::create_backend( const string & uri )
+unique_ptr<StorageBackend> StorageBackend::create_backend( const string & uri,
+                                                           const size_t max_requests )
 {
   ParsedURI endpoint { uri };
 
@@ -42,14 +43,16 @@ unique_ptr<StorageBackend> StorageBackend::create_backend( const string & uri )
       endpoint.host,
       endpoint.options.count( "region" )
         ? endpoint.options[ "region" ]
-        : "us-east-1" );
+        : "us-east-1",
+      max_requests );
   }
   else if ( endpoint.protocol == "gs" ) {
     backend = make_unique<GoogleStorageBackend>(
       ( endpoint.username.length() or endpoint.password.length() )
         ? GoogleStorageCredentials { endpoint.username, endpoint.password }
         : GoogleStorageCredentials {},
-      endpoint.host );
+      endpoint.host,
+      max_requests );
   }
   else if ( endpoint.protocol == "redis" ) {
     RedisClientConfig config;
@@ -57,6 +60,9 @@ unique_ptr<StorageBackend> StorageBackend::create_backend( const string & uri )
     config.port = endpoint.port.get_or( config.port );
     config.username = endpoint.username;
     config.password = endpoint.password;
+    if ( max_requests ) {
+      config.max_threads = max_requests;
+    }
 
     backend = make_unique<RedisStorageBackend>( config );
   }
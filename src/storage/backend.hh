@@ -30,7 +30,10 @@ public:
   bool is_available( const std::string & hash );
   void set_available( const std::string & hash );
 
-  static std::unique_ptr<StorageBackend> create_backend( const std::string & uri );
+  /* max_requests caps the requests that a put() or get() has in flight;
+     zero keeps the default of the backend */
+  static std::unique_ptr<StorageBackend> create_backend( const std::string & uri,
+                                                         const size_t max_requests = 0 );
 
   virtual ~StorageBackend() {}
 };
@@ -6,9 +6,11 @@ using namespace std;
 using namespace storage;
 
 GoogleStorageBackend::GoogleStorageBackend( const GoogleStorageCredentials & credentials,
-                                            const string & bucket )
+                                            const string & bucket,
+                                            const size_t max_requests )
   : client_( { credentials.access_key(), credentials.secret_key() },
-             { "", bucket + ".storage.googleapis.com", 32, 1 } ), bucket_( bucket )
+             { "", bucket + ".storage.googleapis.com",
+               max_requests ? max_requests : 32, 1 } ), bucket_( bucket )
 {}
 
 void GoogleStorageBackend::put( const std::vector<PutRequest> & requests,
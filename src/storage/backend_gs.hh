@@ -15,7 +15,8 @@ private:
 
 public:
   GoogleStorageBackend( const GoogleStorageCredentials & credentials,
-                        const std::string & bucket );
+                        const std::string & bucket,
+                        const size_t max_requests = 0 );
 
   void put( const std::vector<storage::PutRequest> & requests,
             const PutCallback & success_callback = []( const storage::PutRequest & ){} ) override;
@@ -7,8 +7,10 @@ using namespace storage;
 
 S3StorageBackend::S3StorageBackend( const AWSCredentials & credentials,
                                     const string & s3_bucket,
-                                    const string & s3_region )
-  : client_( credentials, { s3_region } ), bucket_( s3_bucket )
+                                    const string & s3_region,
+                                    const size_t max_requests )
+  : client_( credentials, { s3_region, "", max_requests ? max_requests : 32 } ),
+    bucket_( s3_bucket )
 {}
 
 void S3StorageBackend::put( const std::vector<PutRequest> & requests,
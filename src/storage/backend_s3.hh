@@ -16,7 +16,8 @@ private:
 public:
   S3StorageBackend( const AWSCredentials & credentials,
                     const std::string & s3_bucket,
-                    const std::string & s3_region );
+                    const std::string & s3_region,
+                    const size_t max_requests = 0 );
 
   void put( const std::vector<storage::PutRequest> & requests,
             const PutCallback & success_callback = []( const storage::PutRequest & ){} ) override;
@@ -4,6 +4,9 @@
 
 #include <sstream>
 #include <iomanip>
+#include <ctime>
+#include <memory>
+#include <mutex>
 #include <sys/types.h>
 #include <sys/fcntl.h>
 #include <fcntl.h>
@@ -12,6 +15,7 @@
 #include <crypto++/hex.h>
 #include <crypto++/base64.h>
 
+#include "hash_cache.hh"
 #include "thunk_reader.hh"
 #include "util/digest.hh"
 #include "util/exception.hh"
@@ -143,10 +147,10 @@ namespace gg {
       return index_path;
     }
 
-    roost::path hash_cache()
+    roost::path hash_index()
     {
-      const static roost::path hash_cache_path = get_inner_directory( "hash_cache" );
-      return hash_cache_path;
+      const static roost::path hash_index_path = root() / "hash_index";
+      return hash_index_path;
     }
 
     roost::path dependency_cache()
@@ -167,6 +171,24 @@ namespace gg {
       return index_path;
     }
 
+    roost::path gc()
+    {
+      const static roost::path gc_path = get_inner_directory( "gc" );
+      return gc_path;
+    }
+
+    roost::path gc_journal()
+    {
+      const static roost::path journal_path = gc() / "journal";
+      return journal_path;
+    }
+
+    roost::path gc_lock()
+    {
+      const static roost::path lock_path = gc() / "lock";
+      return lock_path;
+    }
+
     roost::path blob( const string & hash )
     {
       return blobs() / hash;
@@ -197,13 +219,6 @@ namespace gg {
       return remote_dir;
     }
 
-    roost::path hash_cache_entry( const string & filename, const struct stat & stat_entry )
-    {
-      const string cache_key = to_string( stat_entry.st_dev ) + "-"
-        + to_string( stat_entry.st_ino ) + "-" + roost::rbasename( filename ).string();
-      return hash_cache() / cache_key;
-    }
-
     roost::path dependency_cache_entry( const string & cache_key )
     {
       return dependency_cache() / cache_key;
@@ -261,6 +276,84 @@ namespace gg {
     void insert( const string & old_hash, const string & new_hash )
     {
       roost::atomic_create( new_hash, gg::paths::reduction( old_hash ) );
+      gc::record_reduction( old_hash, new_hash );
+    }
+
+  }
+
+  namespace gc {
+
+    void hold_lock()
+    {
+      static mutex lock_mutex;
+      static unique_ptr<FileDescriptor> lock;
+
+      unique_lock<mutex> guard { lock_mutex };
+
+      if ( lock ) {
+        return;
+      }
+
+      try {
+        const string lock_path = gg::paths::gc_lock().string();
+        const int fd = open( lock_path.c_str(), O_RDWR | O_CREAT | O_CLOEXEC, 0644 );
+
+        if ( fd < 0 ) {
+          return;
+        }
+
+        lock = make_unique<FileDescriptor>( fd );
+        lock->block_for_shared_lock();
+      }
+      catch ( const exception & ) {
+        /* without the lock, gg-gc may evict what this process is using */
+      }
+    }
+
+    void append_to_journal( const string & records )
+    {
+      hold_lock();
+
+      try {
+        const string journal = gg::paths::gc_journal().string();
+        const int fd = open( journal.c_str(), O_WRONLY | O_APPEND | O_CREAT | O_CLOEXEC, 0644 );
+
+        if ( fd < 0 ) {
+          return;
+        }
+
+        FileDescriptor journal_fd { fd };
+        journal_fd.write( records );
+      }
+      catch ( const exception & ) {
+        /* a missing entry only makes a blob look older to gg-gc */
+      }
+    }
+
+    void record_access( const vector<string> & hashes )
+    {
+      if ( hashes.empty() ) {
+        return;
+      }
+
+      const string now = to_string( time( nullptr ) );
+      string records;
+
+      for ( const string & hash : hashes ) {
+        records += "A " + now + " " + gg::hash::base( hash ) + "\n";
+      }
+
+      append_to_journal( records );
+    }
+
+    void record_reduction( const string & key, const string & output_hash )
+    {
+      append_to_journal( "R " + key + " " + output_hash + "\n" );
+    }
+
+    void record_placeholder( const string & hash, const roost::path & path )
+    {
+      append_to_journal( "P " + hash + " " + roost::canonical( path ).string() + "\n" );
     }
 
   }
@@ -316,35 +409,17 @@ namespace gg {
     {
       struct stat file_stat;
       CheckSystemCall( "stat", stat( path.string().c_str(), &file_stat ) );
-      const auto cache_entry_path = gg::paths::hash_cache_entry( path.string(), file_stat );
-
-      if ( roost::exists( cache_entry_path ) ) {
-        string cache_entry = roost::read_file( cache_entry_path );
-        vector<string> cache_contents = split( cache_entry, " " );
 
-        if ( cache_contents.size() != 6 ) {
-          throw runtime_error( "bad cache entry: " + cache_entry_path.string() );
-        }
+      HashCache & hash_cache = HashCache::instance();
+      Optional<string> cached_hash = hash_cache.get( file_stat );
 
-        if ( cache_contents.at( 0 ) == to_string( file_stat.st_size )
-             and cache_contents.at( 1 ) == to_string( file_stat.st_mtim.tv_sec )
-             and cache_contents.at( 2 ) == to_string( file_stat.st_mtim.tv_nsec )
-             and cache_contents.at( 3 ) == to_string( file_stat.st_ctim.tv_sec )
-             and cache_contents.at( 4 ) == to_string( file_stat.st_ctim.tv_nsec ) ) {
-          /* cache hit! */
-          return cache_contents.at( 5 );
-        }
+      if ( cached_hash.initialized() ) {
+        /* cache hit! */
+        return *cached_hash;
       }
 
       const string computed_hash = gg::hash::file_force( path, type );
-
-      roost::atomic_create( to_string( file_stat.st_size ) + " "
-                            + to_string( file_stat.st_mtim.tv_sec ) + " "
-                            + to_string( file_stat.st_mtim.tv_nsec ) + " "
-                            + to_string( file_stat.st_ctim.tv_sec ) + " "
-                            + to_string( file_stat.st_ctim.tv_nsec ) + " "
-                            + computed_hash,
-                            cache_entry_path );
+      hash_cache.put( file_stat, computed_hash );
 
       return computed_hash;
     }
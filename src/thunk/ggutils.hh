@@ -20,16 +20,18 @@ namespace gg {
     roost::path reductions();
     roost::path metadata();
     roost::path remotes();
-    roost::path hash_cache();
+    roost::path hash_index();
     roost::path dependency_cache();
     roost::path inclue_cache();
     roost::path blueprints();
+    roost::path gc();
+    roost::path gc_journal();
+    roost::path gc_lock();
 
     roost::path blob( const std::string & hash );
     roost::path reduction( const std::string & hash );
     roost::path metadata( const std::string & hash );
     roost::path remote( const std::string & hash );
-    roost::path hash_cache_entry( const std::string & filename, const struct stat & stat_entry );
     roost::path dependency_cache_entry( const std::string & cache_key );
     roost::path include_cache_entry( const std::string & hash );
     roost::path blueprint( const std::string & hash );
@@ -41,6 +43,26 @@ namespace gg {
     std::string storage_backend_uri();
   }
 
+  /* the access journal read by gg-gc: one line per event, appended with a
+     single O_APPEND write, so that concurrent writers don't interleave.
+
+       A <time> <hash>          blob was read or written
+       R <key> <output-hash>    reduction was cached
+       P <hash> <path>          placeholder for a thunk was written
+
+     recording is best-effort and never fails the caller.
+
+     gg-gc holds an exclusive lock on paths::gc_lock() while it runs; tools
+     that read or add blobs hold a shared one until they exit (hold_lock, also
+     taken by the first record), so gg-gc neither evicts the blobs of a
+     running tool nor misses the records it appends. */
+  namespace gc {
+    void hold_lock();
+    void record_access( const std::vector<std::string> & hashes );
+    void record_reduction( const std::string & key, const std::string & output_hash );
+    void record_placeholder( const std::string & hash, const roost::path & path );
+  }
+
   namespace cache {
     struct ReductionResult
     {
@@ -26,7 +26,14 @@ string ExecutionGraph::add_thunk( const string & full_hash )
     return hash;
   }
 
-  Thunk thunk { move( ThunkReader::read( gg::paths::blob( hash ), hash ) ) };
+  auto preloaded = preloaded_thunks_.find( hash );
+  Thunk thunk { ( preloaded != preloaded_thunks_.end() )
+                ? move( preloaded->second )
+                : ThunkReader::read( gg::paths::blob( hash ), hash ) };
+
+  if ( preloaded != preloaded_thunks_.end() ) {
+    preloaded_thunks_.erase( preloaded );
+  }
 
   /* creating the entry */
   referencing_thunks_[ hash ];
@@ -67,6 +74,14 @@ string ExecutionGraph::add_thunk( const string & full_hash )
   return hash;
 }
 
+void ExecutionGraph::preload_thunk( Thunk && thunk )
+{
+  const string hash = thunk.hash();
+  preloaded_thunks_.emplace( piecewise_construct,
+                             forward_as_tuple( hash ),
+                             forward_as_tuple( move( thunk ) ) );
+}
+
 void ExecutionGraph::update_hash( const string & old_hash,
                                   const vector<ThunkOutput> & outputs )
 {
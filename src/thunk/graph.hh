@@ -19,6 +19,9 @@ class ExecutionGraph
 private:
   std::unordered_map<std::string, gg::thunk::Thunk> thunks_ {};
 
+  /* thunks that were loaded up front and are not read from their blobs */
+  std::unordered_map<std::string, gg::thunk::Thunk> preloaded_thunks_ {};
+
   std::unordered_map<std::string, std::unordered_set<std::string>> referencing_thunks_ {};
 
   std::unordered_set<std::string> value_dependencies_ {};
@@ -32,6 +35,7 @@ private:
 
 public:
   std::string add_thunk( const std::string & hash );
+  void preload_thunk( gg::thunk::Thunk && thunk );
 
   Optional<std::unordered_set<std::string>>
   force_thunk( const std::string & old_hash,
@@ -46,6 +50,8 @@ public:
   std::unordered_set<std::string>
   order_one_dependencies( const std::string & hash ) const;
 
+  bool has_thunk( const std::string & hash ) const { return thunks_.count( hash ) > 0; }
+
   const gg::thunk::Thunk &
   get_thunk( const std::string & hash ) const { return thunks_.at( hash ); }
 
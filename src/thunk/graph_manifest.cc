@@ -0,0 +1,57 @@
+/* -*-mode:c++; tab-width: 2; indent-tabs-mode: nil; c-basic-offset: 2 -*- */
+
+#include "graph_manifest.hh"
+
+#include <stdexcept>
+
+#include "protobufs/gg.pb.h"
+#include "thunk/ggutils.hh"
+#include "util/serialization.hh"
+
+using namespace std;
+using namespace gg;
+using namespace gg::thunk;
+
+GraphManifest::GraphManifest( const roost::path & path )
+{
+  ProtobufDeserializer deserializer { path.string() };
+
+  if ( deserializer.read_string( graph::MAGIC_NUMBER.length() ) != graph::MAGIC_NUMBER ) {
+    throw runtime_error( "not a graph manifest: " + path.string() );
+  }
+
+  uint32_t length;
+
+  while ( true ) {
+    if ( not deserializer.read_varint32( length ) ) {
+      throw runtime_error( "truncated graph manifest: " + path.string() );
+    }
+
+    if ( length == 0 ) {
+      break;
+    }
+
+    const string serialized_thunk = MAGIC_NUMBER + deserializer.read_string( length );
+    protobuf::Thunk thunk_proto;
+
+    if ( serialized_thunk.length() != MAGIC_NUMBER.length() + length or
+         not thunk_proto.ParseFromArray( serialized_thunk.data() + MAGIC_NUMBER.length(),
+                                         length ) ) {
+      throw runtime_error( "invalid thunk in graph manifest: " + path.string() );
+    }
+
+    thunks_.emplace_back( thunk_proto );
+    thunks_.back().set_hash( gg::hash::compute( serialized_thunk, ObjectType::Thunk ) );
+  }
+
+  protobuf::GraphIndex index_proto;
+
+  if ( not deserializer.read_varint32( length ) or
+       not index_proto.ParseFromString( deserializer.read_string( length ) ) ) {
+    throw runtime_error( "invalid graph manifest index: " + path.string() );
+  }
+
+  for ( const protobuf::GraphTarget & target : index_proto.targets() ) {
+    targets_.emplace_back( target.hash(), target.name() );
+  }
+}
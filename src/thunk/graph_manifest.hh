@@ -0,0 +1,46 @@
+/* -*-mode:c++; tab-width: 2; indent-tabs-mode: nil; c-basic-offset: 2 -*- */
+
+#ifndef GRAPH_MANIFEST_HH
+#define GRAPH_MANIFEST_HH
+
+#include <string>
+#include <vector>
+#include <utility>
+
+#include "thunk/thunk.hh"
+#include "util/path.hh"
+
+/* A whole thunk graph in one file, as written by the SDK:
+
+     ##GGGRAPH##
+     varint length, Thunk protobuf (without the thunk magic number)
+     ...
+     varint 0
+     varint length, GraphIndex protobuf
+
+   Thunks come in dependency order, and a thunk's hash is the hash of its
+   serialized form (magic number and protobuf), as if it were a blob. */
+
+class GraphManifest
+{
+public:
+  typedef std::pair<std::string, std::string> Target; /* hash, name */
+
+private:
+  std::vector<gg::thunk::Thunk> thunks_ {};
+  std::vector<Target> targets_ {};
+
+public:
+  GraphManifest( const roost::path & path );
+
+  std::vector<gg::thunk::Thunk> & thunks() { return thunks_; }
+  const std::vector<Target> & targets() const { return targets_; }
+};
+
+namespace gg {
+  namespace graph {
+    const std::string MAGIC_NUMBER = "##GGGRAPH##";
+  }
+}
+
+#endif /* GRAPH_MANIFEST_HH */
@@ -0,0 +1,123 @@
+/* -*-mode:c++; tab-width: 2; indent-tabs-mode: nil; c-basic-offset: 2 -*- */
+
+#include "hash_cache.hh"
+
+#include <fcntl.h>
+#include <cstdlib>
+#include <sstream>
+
+#include "thunk/ggutils.hh"
+#include "util/exception.hh"
+#include "util/file_descriptor.hh"
+
+using namespace std;
+
+static uint64_t to_ns( const struct timespec & ts )
+{
+  return static_cast<uint64_t>( ts.tv_sec ) * 1000000000ULL + ts.tv_nsec;
+}
+
+HashCache::HashCache( const roost::path & path )
+  : path_( path )
+{
+  load();
+}
+
+string HashCache::to_record( const Key & key, const Entry & entry )
+{
+  ostringstream record;
+  record << key.dev << ' ' << key.ino << ' ' << entry.size << ' '
+         << entry.mtime_ns << ' ' << entry.ctime_ns << ' ' << entry.hash
+         << '\n';
+  return record.str();
+}
+
+void HashCache::load()
+{
+  const int fd_num = open( path_.string().c_str(), O_RDONLY );
+
+  if ( fd_num < 0 ) {
+    if ( errno == ENOENT ) { return; }
+    throw unix_error( "open (" + path_.string() + ")" );
+  }
+
+  FileDescriptor file { fd_num };
+  string contents;
+  while ( not file.eof() ) { contents += file.read(); }
+
+  size_t line_start = 0;
+  size_t line_end;
+
+  while ( ( line_end = contents.find( '\n', line_start ) ) != string::npos ) {
+    istringstream record { contents.substr( line_start, line_end - line_start ) };
+    line_start = line_end + 1;
+
+    Key key;
+    Entry entry;
+
+    /* a partial line left behind by a crashed writer is just skipped */
+    if ( record >> key.dev >> key.ino >> entry.size >> entry.mtime_ns
+                >> entry.ctime_ns >> entry.hash ) {
+      entries_[ key ] = move( entry );
+      log_records_++;
+    }
+  }
+
+  if ( log_records_ >= COMPACTION_THRESHOLD and log_records_ > 2 * entries_.size() ) {
+    compact();
+  }
+}
+
+void HashCache::compact()
+{
+  string contents;
+
+  for ( const auto & item : entries_ ) {
+    contents += to_record( item.first, item.second );
+  }
+
+  /* appends racing with the rename are lost, which only costs a rehash */
+  roost::atomic_create( contents, path_ );
+  log_records_ = entries_.size();
+}
+
+Optional<string> HashCache::get( const struct stat & file_stat )
+{
+  unique_lock<mutex> lock { mutex_ };
+
+  auto entry = entries_.find( { file_stat.st_dev, file_stat.st_ino } );
+
+  if ( entry == entries_.end()
+       or entry->second.size != file_stat.st_size
+       or entry->second.mtime_ns != to_ns( file_stat.st_mtim )
+       or entry->second.ctime_ns != to_ns( file_stat.st_ctim ) ) {
+    return {};
+  }
+
+  return { true, entry->second.hash };
+}
+
+void HashCache::put( const struct stat & file_stat, const string & hash )
+{
+  unique_lock<mutex> lock { mutex_ };
+
+  const Key key { file_stat.st_dev, file_stat.st_ino };
+  Entry entry { file_stat.st_size, to_ns( file_stat.st_mtim ),
+                to_ns( file_stat.st_ctim ), hash };
+
+  /* O_APPEND and a single write keep concurrent writers from interleaving */
+  FileDescriptor index { CheckSystemCall( "open (" + path_.string() + ")",
+                                          open( path_.string().c_str(),
+                                                O_WRONLY | O_APPEND | O_CREAT,
+                                                0644 ) ) };
+  index.write( to_record( key, entry ) );
+
+  entries_[ key ] = move( entry );
+  log_records_++;
+}
+
+HashCache & HashCache::instance()
+{
+  static HashCache hash_cache { gg::paths::hash_index() };
+  return hash_cache;
+}
@@ -0,0 +1,79 @@
+/* -*-mode:c++; tab-width: 2; indent-tabs-mode: nil; c-basic-offset: 2 -*- */
+
+#ifndef HASH_CACHE_HH
+#define HASH_CACHE_HH
+
+#include <sys/types.h>
+#include <sys/stat.h>
+#include <string>
+#include <mutex>
+#include <unordered_map>
+
+#include "util/optional.hh"
+#include "util/path.hh"
+
+/* A single-file index of file hashes, shared with ggSDK (gg_hash_cache.py).
+   The index is an append-only log of lines of the form
+
+     <dev> <ino> <size> <mtime-ns> <ctime-ns> <hash>
+
+   where a later line overrides an earlier one for the same (dev, ino). An
+   entry is valid only while size, mtime and ctime all match. The log is read
+   once per process, and rewritten when most of its lines are dead. */
+class HashCache
+{
+private:
+  struct Key
+  {
+    dev_t dev { 0 };
+    ino_t ino { 0 };
+
+    bool operator==( const Key & other ) const
+    {
+      return dev == other.dev and ino == other.ino;
+    }
+  };
+
+  struct KeyHash
+  {
+    size_t operator()( const Key & key ) const
+    {
+      return std::hash<dev_t>()( key.dev ) * 31 + std::hash<ino_t>()( key.ino );
+    }
+  };
+
+  struct Entry
+  {
+    off_t size { 0 };
+    uint64_t mtime_ns { 0 };
+    uint64_t ctime_ns { 0 };
+    std::string hash {};
+  };
+
+  roost::path path_;
+  std::unordered_map<Key, Entry, KeyHash> entries_ {};
+  size_t log_records_ { 0 };
+  std::mutex mutex_ {};
+
+  void load();
+  void compact();
+
+  static std::string to_record( const Key & key, const Entry & entry );
+
+public:
+  /* compact the log when it has this many records and less than half of
+     them are live */
+  static constexpr size_t COMPACTION_THRESHOLD = 4096;
+
+  HashCache( const roost::path & path );
+
+  Optional<std::string> get( const struct stat & file_stat );
+  void put( const struct stat & file_stat, const std::string & hash );
+
+  size_t size() const { return entries_.size(); }
+
+  /* the index in the current gg directory */
+  static HashCache & instance();
+};
+
+#endif /* HASH_CACHE_HH */
@@ -7,6 +7,7 @@
 #include <iostream>
 #include <regex>
 
+#include "thunk/ggutils.hh"
 #include "util/path.hh"
 
 using namespace std;
@@ -56,6 +57,8 @@ void ThunkPlaceholder::write( const string & filename, const Type type ) const
   if ( type == Type::ShellScript ) {
     roost::chmod( filename, 0755 );
   }
+
+  gg::gc::record_placeholder( content_hash_, filename );
 }
 
 Optional<ThunkPlaceholder> ThunkPlaceholder::read( const string & filename )
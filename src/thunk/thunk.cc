@@ -247,6 +247,11 @@ string Thunk::execution_payload( const Thunk & thunk )
 }
 
 string Thunk::execution_payload( const vector<Thunk> & thunks )
+{
+  return protoutil::to_json( execution_message( thunks ) );
+}
+
+protobuf::ExecutionRequest Thunk::execution_message( const vector<Thunk> & thunks )
 {
   static const bool timelog = ( getenv( "GG_TIMELOG" ) != nullptr );
   protobuf::ExecutionRequest request;
@@ -257,7 +262,7 @@ string Thunk::execution_payload( const vector<Thunk> & thunks )
 
   request.set_storage_backend( gg::remote::storage_backend_uri() );
   request.set_timelog( timelog );
-  return protoutil::to_json( request );
+  return request;
 }
 
 protobuf::Thunk Thunk::to_protobuf() const
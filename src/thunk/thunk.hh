@@ -134,6 +134,7 @@ namespace gg {
       static std::string execution_payload( const Thunk & thunk );
       static std::string execution_payload( const std::vector<Thunk> & thunks );
       static gg::protobuf::RequestItem execution_request( const Thunk & thunk );
+      static gg::protobuf::ExecutionRequest execution_message( const std::vector<Thunk> & thunks );
 
       const Function & function() const { return function_; }
       const DataList & values() const { return values_; }
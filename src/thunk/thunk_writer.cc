@@ -28,6 +28,10 @@ string ThunkWriter::write( const Thunk & thunk, const roost::path & path )
     roost::atomic_create( serialized_thunk, target_path, true, 0400 );
   }
 
+  if ( path.empty() ) {
+    gc::record_access( { thunk_hash } );
+  }
+
   return thunk_hash;
 }
 
@@ -0,0 +1,184 @@
+/* -*-mode:c++; tab-width: 2; indent-tabs-mode: nil; c-basic-offset: 2 -*- */
+
+#include "compression.hh"
+
+#include <stdexcept>
+#include <algorithm>
+#include <memory>
+#include <zlib.h>
+
+#ifdef HAVE_ZSTD
+#include <zstd.h>
+#endif
+
+using namespace std;
+
+namespace {
+
+string deflate_compress( const string & input )
+{
+  uLongf output_size = compressBound( input.size() );
+  string output( output_size, '\0' );
+
+  if ( compress2( reinterpret_cast<Bytef *>( &output[ 0 ] ), &output_size,
+                  reinterpret_cast<const Bytef *>( input.data() ),
+                  input.size(), Z_DEFAULT_COMPRESSION ) != Z_OK ) {
+    throw runtime_error( "deflate: compression failed" );
+  }
+
+  output.resize( output_size );
+  return output;
+}
+
+string deflate_decompress( const string & input )
+{
+  z_stream stream {};
+
+  if ( inflateInit( &stream ) != Z_OK ) {
+    throw runtime_error( "deflate: inflateInit failed" );
+  }
+
+  stream.next_in = reinterpret_cast<Bytef *>( const_cast<char *>( input.data() ) );
+  stream.avail_in = input.size();
+
+  string output;
+  char buffer[ 64 * 1024 ];
+  int ret;
+
+  do {
+    stream.next_out = reinterpret_cast<Bytef *>( buffer );
+    stream.avail_out = sizeof( buffer );
+
+    ret = inflate( &stream, Z_NO_FLUSH );
+    if ( ret != Z_OK and ret != Z_STREAM_END ) {
+      inflateEnd( &stream );
+      throw runtime_error( "deflate: corrupt input" );
+    }
+
+    output.append( buffer, sizeof( buffer ) - stream.avail_out );
+  } while ( ret != Z_STREAM_END );
+
+  inflateEnd( &stream );
+  return output;
+}
+
+#ifdef HAVE_ZSTD
+string zstd_compress( const string & input )
+{
+  string output( ZSTD_compressBound( input.size() ), '\0' );
+  const size_t output_size = ZSTD_compress( &output[ 0 ], output.size(),
+                                            input.data(), input.size(), 3 );
+  if ( ZSTD_isError( output_size ) ) {
+    throw runtime_error( string( "zstd: " ) + ZSTD_getErrorName( output_size ) );
+  }
+
+  output.resize( output_size );
+  return output;
+}
+
+/* for frames that don't record their size, e.g. from a streaming
+   compressor */
+string zstd_decompress_stream( const string & input )
+{
+  unique_ptr<ZSTD_DCtx, size_t (*)( ZSTD_DCtx * )> context { ZSTD_createDCtx(),
+                                                             ZSTD_freeDCtx };
+  if ( not context ) {
+    throw runtime_error( "zstd: could not create a context" );
+  }
+
+  ZSTD_inBuffer in { input.data(), input.size(), 0 };
+
+  string output;
+  char buffer[ 64 * 1024 ];
+
+  while ( true ) {
+    ZSTD_outBuffer out { buffer, sizeof( buffer ), 0 };
+    const size_t ret = ZSTD_decompressStream( context.get(), &out, &in );
+
+    if ( ZSTD_isError( ret ) ) {
+      throw runtime_error( string( "zstd: " ) + ZSTD_getErrorName( ret ) );
+    }
+
+    output.append( buffer, out.pos );
+
+    if ( ret == 0 and in.pos == in.size ) {
+      /* the last frame is complete */
+      break;
+    }
+
+    if ( in.pos == in.size and out.pos < out.size ) {
+      throw runtime_error( "zstd: truncated input" );
+    }
+  }
+
+  return output;
+}
+
+string zstd_decompress( const string & input )
+{
+  const unsigned long long content_size =
+    ZSTD_getFrameContentSize( input.data(), input.size() );
+
+  if ( content_size == ZSTD_CONTENTSIZE_ERROR ) {
+    throw runtime_error( "zstd: corrupt input" );
+  }
+
+  if ( content_size == ZSTD_CONTENTSIZE_UNKNOWN ) {
+    return zstd_decompress_stream( input );
+  }
+
+  string output( content_size, '\0' );
+  const size_t output_size = ZSTD_decompress( &output[ 0 ], output.size(),
+                                              input.data(), input.size() );
+  if ( ZSTD_isError( output_size ) ) {
+    throw runtime_error( string( "zstd: " ) + ZSTD_getErrorName( output_size ) );
+  }
+
+  output.resize( output_size );
+  return output;
+}
+#endif
+
+}
+
+const vector<compression::Encoding> & compression::supported()
+{
+  static const vector<Encoding> encodings {
+#ifdef HAVE_ZSTD
+    Encoding::Zstd,
+#endif
+    Encoding::Deflate,
+  };
+
+  return encodings;
+}
+
+bool compression::is_supported( const Encoding encoding )
+{
+  return encoding == Encoding::Identity or
+         find( supported().begin(), supported().end(), encoding ) != supported().end();
+}
+
+string compression::compress( const string & input, const Encoding encoding )
+{
+  switch ( encoding ) {
+  case Encoding::Identity: return input;
+  case Encoding::Deflate: return deflate_compress( input );
+#ifdef HAVE_ZSTD
+  case Encoding::Zstd: return zstd_compress( input );
+#endif
+  default: throw runtime_error( "unsupported encoding" );
+  }
+}
+
+string compression::decompress( const string & input, const Encoding encoding )
+{
+  switch ( encoding ) {
+  case Encoding::Identity: return input;
+  case Encoding::Deflate: return deflate_decompress( input );
+#ifdef HAVE_ZSTD
+  case Encoding::Zstd: return zstd_decompress( input );
+#endif
+  default: throw runtime_error( "unsupported encoding" );
+  }
+}
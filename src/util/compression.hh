@@ -0,0 +1,30 @@
+/* -*-mode:c++; tab-width: 2; indent-tabs-mode: nil; c-basic-offset: 2 -*- */
+
+#ifndef COMPRESSION_HH
+#define COMPRESSION_HH
+
+#include <string>
+#include <vector>
+
+namespace compression
+{
+  /* same values as gg.protobuf.Encoding */
+  enum class Encoding
+  {
+    Identity = 0,
+    Deflate = 1,
+    Zstd = 2,
+  };
+
+  /* data smaller than this is not worth compressing */
+  constexpr size_t THRESHOLD = 1024;
+
+  /* the encodings this build can decode, best first */
+  const std::vector<Encoding> & supported();
+  bool is_supported( const Encoding encoding );
+
+  std::string compress( const std::string & input, const Encoding encoding );
+  std::string decompress( const std::string & input, const Encoding encoding );
+}
+
+#endif /* COMPRESSION_HH */
@@ -138,6 +138,11 @@ void FileDescriptor::block_for_exclusive_lock()
   CheckSystemCall( "flock", flock( fd_num(), LOCK_EX ) );
 }
 
+void FileDescriptor::block_for_shared_lock()
+{
+  CheckSystemCall( "flock", flock( fd_num(), LOCK_SH ) );
+}
+
 void FileDescriptor::set_blocking( const bool block )
 {
   int flags = CheckSystemCall( "fcntl F_GETFL", fcntl( fd_, F_GETFL ) );
@@ -56,6 +56,9 @@ public:
   /* block on an exclusive lock */
   void block_for_exclusive_lock();
 
+  /* block on a shared lock */
+  void block_for_shared_lock();
+
   /* set nonblocking/blocking behavior */
   void set_blocking( const bool block );
 
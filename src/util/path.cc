@@ -7,6 +7,9 @@
 #include <unistd.h>
 #include <fcntl.h>
 #include <dirent.h>
+#include <sys/ioctl.h>
+#include <sys/sendfile.h>
+#include <linux/fs.h>
 #include <libgen.h>
 #include <deque>
 #include <climits>
@@ -22,6 +25,10 @@
 #include "file_descriptor.hh"
 #include "temp_file.hh"
 
+#ifndef FICLONE
+#define FICLONE _IOW( 0x94, 9, int )
+#endif
+
 using namespace std;
 
 namespace roost {
@@ -227,6 +234,153 @@ namespace roost {
     atomic_create( contents, dst, true, set_mode ? target_mode : src_info.st_mode );
   }
 
+  IngestMethod ingest_method( const string & name )
+  {
+    if ( name == "link" ) { return IngestMethod::Link; }
+    if ( name == "reflink" ) { return IngestMethod::Reflink; }
+    if ( name == "copy_file_range" ) { return IngestMethod::CopyFileRange; }
+    if ( name == "sendfile" ) { return IngestMethod::SendFile; }
+    if ( name == "copy" ) { return IngestMethod::Copy; }
+
+    throw runtime_error( "unknown ingestion method: " + name );
+  }
+
+  string to_string( const IngestMethod method )
+  {
+    switch ( method ) {
+    case IngestMethod::Link: return "link";
+    case IngestMethod::Reflink: return "reflink";
+    case IngestMethod::CopyFileRange: return "copy_file_range";
+    case IngestMethod::SendFile: return "sendfile";
+    case IngestMethod::Copy: return "copy";
+    }
+
+    throw runtime_error( "invalid ingestion method" );
+  }
+
+  /* errors that mean "this method doesn't work here, try the next one" */
+  static bool ingest_unsupported( const int error )
+  {
+    switch ( error ) {
+    case EXDEV: case EPERM: case EMLINK: case EINVAL: case ENOSYS:
+    case EOPNOTSUPP: case ENOTTY: case EBADF: case ETXTBSY:
+      return true;
+
+    default:
+      return false;
+    }
+  }
+
+  /* returns false if the method is not supported for these files */
+  static bool ingest_contents( const IngestMethod method, FileDescriptor & src,
+                               FileDescriptor & dst, const off_t size )
+  {
+    CheckSystemCall( "lseek", lseek( src.fd_num(), 0, SEEK_SET ) );
+    off_t copied = 0;
+
+    switch ( method ) {
+    case IngestMethod::Reflink:
+      if ( ioctl( dst.fd_num(), FICLONE, src.fd_num() ) < 0 ) {
+        if ( ingest_unsupported( errno ) ) { return false; }
+        throw unix_error( "ioctl(FICLONE)" );
+      }
+      return true;
+
+    case IngestMethod::CopyFileRange:
+    case IngestMethod::SendFile:
+      while ( copied < size ) {
+        const ssize_t count = ( method == IngestMethod::CopyFileRange )
+          ? copy_file_range( src.fd_num(), nullptr, dst.fd_num(), nullptr,
+                             size - copied, 0 )
+          : sendfile( dst.fd_num(), src.fd_num(), nullptr, size - copied );
+
+        if ( count < 0 ) {
+          if ( copied == 0 and ingest_unsupported( errno ) ) { return false; }
+          throw unix_error( to_string( method ) );
+        }
+        else if ( count == 0 ) {
+          break;
+        }
+
+        copied += count;
+      }
+      return true;
+
+    case IngestMethod::Copy:
+      while ( not src.eof() ) {
+        const string chunk = src.read();
+        if ( not chunk.empty() ) { dst.write( chunk ); }
+      }
+      return true;
+
+    case IngestMethod::Link:
+      break;
+    }
+
+    throw runtime_error( "invalid ingestion method" );
+  }
+
+  IngestMethod ingest_file( const path & src, const path & dst,
+                            const IngestMethod first, const mode_t target_mode )
+  {
+    IngestMethod method = first;
+
+    if ( method == IngestMethod::Link ) {
+      if ( ::link( src.string().c_str(), dst.string().c_str() ) == 0 ) {
+        /* read-only guard: the blob must not change through src */
+        struct stat dst_info;
+        CheckSystemCall( "stat", stat( dst.string().c_str(), &dst_info ) );
+        chmod( dst, dst_info.st_mode & 07555 );
+        return method;
+      }
+      else if ( errno == EEXIST ) {
+        return method;
+      }
+      else if ( not ingest_unsupported( errno ) ) {
+        throw unix_error( "link" );
+      }
+
+      method = IngestMethod::Reflink;
+    }
+
+    FileDescriptor src_file { CheckSystemCall( "open (" + src.string() + ")",
+                              open( src.string().c_str(), O_RDONLY ) ) };
+    struct stat src_info;
+    CheckSystemCall( "fstat", fstat( src_file.fd_num(), &src_info ) );
+
+    if ( not S_ISREG( src_info.st_mode ) ) {
+      throw runtime_error( src.string() + " is not a regular file" );
+    }
+
+    while ( true ) {
+      string tmp_file_name;
+      bool done = false;
+
+      try {
+        UniqueFile tmp_file { dst.string() };
+        tmp_file_name = tmp_file.name();
+
+        done = ingest_contents( method, src_file, tmp_file.fd(), src_info.st_size );
+
+        if ( done ) {
+          CheckSystemCall( "fchmod", fchmod( tmp_file.fd().fd_num(), target_mode ) );
+        }
+      }
+      catch ( const exception & ) {
+        if ( not tmp_file_name.empty() ) { remove( tmp_file_name ); }
+        throw;
+      }
+
+      if ( done ) {
+        rename( tmp_file_name, dst.string() );
+        return method;
+      }
+
+      remove( tmp_file_name );
+      method = static_cast<IngestMethod>( static_cast<int>( method ) + 1 );
+    }
+  }
+
   path operator/( const path & prefix, const path & suffix )
   {
     if ( ( not prefix.string().empty() and prefix.string().back() == '/' ) or
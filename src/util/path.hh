@@ -72,6 +72,21 @@ namespace roost {
                          const bool set_mode = false, const mode_t target_mode = 0 );
   void atomic_create( const std::string & contents, const path & dst,
                       const bool set_mode = false, const mode_t target_mode = 0 );
+
+  /* ways of putting a copy of a file somewhere, cheapest first. Link
+     hardlinks the file and clears the write bits of the shared inode, which
+     changes the ctime of the source: callers that cached its hash by stat()
+     have to put it again. */
+  enum class IngestMethod { Link, Reflink, CopyFileRange, SendFile, Copy };
+
+  IngestMethod ingest_method( const std::string & name );
+  std::string to_string( const IngestMethod method );
+
+  /* creates dst with the contents of src, trying each method starting at
+     `first` and falling back to the next one when the filesystem or kernel
+     doesn't support it. returns the method that was used. */
+  IngestMethod ingest_file( const path & src, const path & dst,
+                            const IngestMethod first, const mode_t target_mode );
 }
 
 #endif /* PATH_HH */
@@ -29,3 +29,9 @@ string ProtobufDeserializer::read_string( const size_t size )
 
   return ret;
 }
+
+bool ProtobufDeserializer::read_varint32( uint32_t & value )
+{
+  google::protobuf::io::CodedInputStream coded_input { &raw_input_ };
+  return coded_input.ReadVarint32( &value );
+}
@@ -20,6 +20,7 @@ public:
   ProtobufDeserializer( const std::string & filename );
   ProtobufDeserializer( FileDescriptor && fd );
   std::string read_string( const size_t size );
+  bool read_varint32( uint32_t & value );
 
   template<class EntryProtobufType>
   bool read_protobuf( EntryProtobufType & protobuf );
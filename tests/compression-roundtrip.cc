@@ -0,0 +1,86 @@
+/* -*-mode:c++; tab-width: 2; indent-tabs-mode: nil; c-basic-offset: 2 -*- */
+
+#include <iostream>
+#include <string>
+#include <map>
+
+#include "util/compression.hh"
+#include "util/exception.hh"
+#include "util/path.hh"
+
+using namespace std;
+using namespace compression;
+
+/* gg.protobuf.Encoding names, as used by the handlers */
+const map<string, Encoding> encodings {
+  { "IDENTITY", Encoding::Identity },
+  { "DEFLATE", Encoding::Deflate },
+  { "ZSTD", Encoding::Zstd },
+};
+
+void usage( const char * argv0 )
+{
+  cerr << "Usage: " << argv0 << endl
+       << "       " << argv0 << " supported" << endl
+       << "       " << argv0 << " (compress|decompress) ENCODING INPUT OUTPUT" << endl;
+}
+
+int main( int argc, char * argv[] )
+{
+  try {
+    if ( argc <= 0 ) {
+      abort();
+    }
+
+    if ( argc == 1 ) {
+      /* compress and decompress some data with every supported encoding */
+      string data;
+      for ( size_t i = 0; i < 100000; i++ ) {
+        data += to_string( i * i % 9973 );
+      }
+
+      for ( const auto & encoding : encodings ) {
+        if ( not is_supported( encoding.second ) ) {
+          continue;
+        }
+
+        if ( decompress( compress( data, encoding.second ), encoding.second ) != data ) {
+          cerr << encoding.first << ": round trip failed" << endl;
+          return EXIT_FAILURE;
+        }
+      }
+
+      return EXIT_SUCCESS;
+    }
+
+    const string command { argv[ 1 ] };
+
+    if ( argc == 2 and command == "supported" ) {
+      for ( const auto & encoding : encodings ) {
+        if ( is_supported( encoding.second ) ) {
+          cout << encoding.first << endl;
+        }
+      }
+
+      return EXIT_SUCCESS;
+    }
+
+    if ( argc != 5 or ( command != "compress" and command != "decompress" ) ) {
+      usage( argv[ 0 ] );
+      return EXIT_FAILURE;
+    }
+
+    const Encoding encoding = encodings.at( argv[ 2 ] );
+    const string input = roost::read_file( argv[ 3 ] );
+
+    roost::atomic_create( command == "compress" ? compress( input, encoding )
+                                                : decompress( input, encoding ),
+                          argv[ 4 ] );
+  }
+  catch ( const exception & e ) {
+    print_exception( argv[ 0 ], e );
+    return EXIT_FAILURE;
+  }
+
+  return EXIT_SUCCESS;
+}
@@ -0,0 +1,99 @@
+/* -*-mode:c++; tab-width: 2; indent-tabs-mode: nil; c-basic-offset: 2 -*- */
+
+#include <iostream>
+#include <string>
+#include <sys/stat.h>
+
+#include "thunk/hash_cache.hh"
+#include "util/exception.hh"
+#include "util/temp_file.hh"
+
+using namespace std;
+
+void usage( const char * argv0 )
+{
+  cerr << "Usage: " << argv0 << " size INDEX" << endl
+       << "       " << argv0 << " get INDEX FILE" << endl
+       << "       " << argv0 << " put INDEX FILE HASH [COUNT]" << endl;
+}
+
+struct stat stat_file( const string & filename )
+{
+  struct stat file_stat;
+  CheckSystemCall( "stat (" + filename + ")",
+                   stat( filename.c_str(), &file_stat ) );
+  return file_stat;
+}
+
+int main( int argc, char * argv[] )
+{
+  try {
+    if ( argc <= 0 ) {
+      abort();
+    }
+
+    if ( argc == 1 ) {
+      /* an entry survives reloading the index, until its file changes */
+      TempFile index { "/tmp/gg-hash-index" };
+      TempFile file { "/tmp/gg-hash-index-file" };
+      const string hash { "V0123456789abcdefghijklmnopqrstuvwxyzABCDEFG00000000" };
+
+      HashCache { index.name() }.put( stat_file( file.name() ), hash );
+
+      if ( HashCache { index.name() }.get( stat_file( file.name() ) ).get_or( "" ) != hash ) {
+        cerr << "entry not found after reloading the index" << endl;
+        return EXIT_FAILURE;
+      }
+
+      file.write( "changed" );
+
+      if ( HashCache { index.name() }.get( stat_file( file.name() ) ).initialized() ) {
+        cerr << "entry found for a changed file" << endl;
+        return EXIT_FAILURE;
+      }
+
+      return EXIT_SUCCESS;
+    }
+
+    if ( argc < 3 ) {
+      usage( argv[ 0 ] );
+      return EXIT_FAILURE;
+    }
+
+    const string command { argv[ 1 ] };
+
+    /* loading the index compacts it if most of its records are dead */
+    HashCache hash_cache { argv[ 2 ] };
+
+    if ( command == "size" and argc == 3 ) {
+      cout << hash_cache.size() << endl;
+    }
+    else if ( command == "get" and argc == 4 ) {
+      const Optional<string> hash = hash_cache.get( stat_file( argv[ 3 ] ) );
+
+      if ( not hash.initialized() ) {
+        return EXIT_FAILURE;
+      }
+
+      cout << *hash << endl;
+    }
+    else if ( command == "put" and ( argc == 5 or argc == 6 ) ) {
+      const struct stat file_stat = stat_file( argv[ 3 ] );
+      const size_t count = ( argc == 6 ) ? stoul( argv[ 5 ] ) : 1;
+
+      for ( size_t i = 0; i < count; i++ ) {
+        hash_cache.put( file_stat, argv[ 4 ] );
+      }
+    }
+    else {
+      usage( argv[ 0 ] );
+      return EXIT_FAILURE;
+    }
+  }
+  catch ( const exception & e ) {
+    print_exception( argv[ 0 ], e );
+    return EXIT_FAILURE;
+  }
+
+  return EXIT_SUCCESS;
+}
@@ -0,0 +1,203 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import gg_force
+import gg_metrics
+from gg_sdk import GG, GGThunk
+
+"""
+asyncio front end for ggSDK:
+
+    async with AsyncGG() as gg:
+        for batch in batches:
+            await gg.submit(generate_batch(...))
+        print(await thunk.output())
+
+Every submit() generates its targets in an executor (the hashing itself
+runs in a process pool, see gg_hash) and then queues them to be forced
+with gg-force, as an asyncio subprocess, in the background. Batches that
+are already submitted therefore run while later ones are still being
+built.
+
+One gg-force runs at a time, so that all batches share the jobs budget
+and a batch that depends on an earlier one finds its thunks reduced;
+the batches submitted while it runs are merged into the next one.
+"""
+
+class AsyncGG(object):
+    """
+    engine, jobs and download are passed to gg-force as in GG.force();
+    any other keyword arguments go to GG()
+    """
+    def __init__(self, engine='local', jobs=None, download=True, **kwargs):
+        self.gg = GG(**kwargs)
+        self.engine = engine
+        self.jobs = jobs
+        self.download = download
+
+        # Thunk generation is parallel inside create_thunks; batches are
+        # generated one at a time, so that batches sharing thunks don't
+        # race on them
+        self.gen_executor = ThreadPoolExecutor(max_workers=1)
+
+        self.queued = []       # targets waiting for the next gg-force
+        self.forcing = []      # targets of the running gg-force
+        self.force_task = None
+        self.error = None      # first gg-force failure since the last wait()
+        self.out_index = 0
+        self.jobs_done = 0
+        self.targets_done = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            queued, self.queued = self.queued, []
+            for tgt in queued:
+                tgt.output_future.set_exception(asyncio.CancelledError())
+            if self.force_task is not None:
+                self.force_task.cancel()
+        try:
+            await self.wait()
+        except Exception:
+            # Don't hide the exception that ended the block
+            if exc_type is None:
+                raise
+        finally:
+            self.gen_executor.shutdown()
+
+    """
+    Generate thunks (a GGThunk or a list of them) and queue them to be
+    forced. Returns once they are serialized, with their target names;
+    await thunk.output() for their outputs.
+    """
+    async def submit(self, thunks):
+        single = isinstance(thunks, GGThunk)
+        targets = [thunks] if single else list(thunks)
+        if not targets:
+            return []
+
+        loop = asyncio.get_event_loop()
+
+        # Names are unique across the whole session
+        for tgt in targets:
+            if tgt.get_all_outname() == []:
+                tgt.add_outname('my_output_' + str(self.out_index) + '.out')
+                self.out_index += 1
+            tgt.output_future = loop.create_future()
+
+        names = await loop.run_in_executor(self.gen_executor,
+                                           self.gg.create_thunks, targets)
+
+        self.queued.extend(targets)
+        if self.force_task is None:
+            self.force_task = loop.create_task(self.__forcer())
+
+        return names[0] if single else names
+
+    """
+    Wait until every submitted thunk is forced. Raises the error of the
+    first gg-force that failed since the last wait(), e.g. because a
+    thunk failed to execute.
+    """
+    async def wait(self):
+        while self.force_task is not None:
+            await asyncio.gather(self.force_task, return_exceptions=True)
+
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    """
+    Number of jobs gg-force has finished and targets it has reduced
+    so far, over all submits, and targets being forced or waiting for
+    the next gg-force
+    """
+    def stats(self):
+        return {'jobs_done': self.jobs_done,
+                'targets_done': self.targets_done,
+                'forcing': len(self.forcing),
+                'queued': len(self.queued)}
+
+    async def __forcer(self):
+        try:
+            while self.queued:
+                self.forcing, self.queued = self.queued, []
+                await self.__force(self.forcing)
+        finally:
+            self.forcing = []
+            self.force_task = None
+
+    async def __force(self, targets):
+        by_hash = {}
+        for tgt in targets:
+            by_hash.setdefault(tgt.get_hash(), []).append(tgt)
+
+        try:
+            returncode = await self.__run_force(targets, by_hash)
+            error = RuntimeError('gg-force exited with code %d' % returncode)
+        except asyncio.CancelledError:
+            error = asyncio.CancelledError()
+        except Exception as exc:
+            error = exc
+
+        failed = [tgt for tgt in targets if not tgt.output_future.done()]
+        for tgt in failed:
+            tgt.output_future.set_exception(error)
+
+        if (failed and self.error is None and
+            not isinstance(error, asyncio.CancelledError)):
+            self.error = error
+
+    async def __run_force(self, targets, by_hash):
+        loop = asyncio.get_event_loop()
+
+        read_fd, write_fd = os.pipe()
+        cmd = self.gg.force_command(self.engine, self.jobs, self.download)
+        cmd += ['--progress-fd', str(write_fd)]
+        # Merged batches can share targets
+        cmd += list(dict.fromkeys(tgt.get_outname('') for tgt in targets))
+
+        gg_metrics.count('subprocesses')
+        try:
+            try:
+                proc = await asyncio.create_subprocess_exec(*cmd,
+                                                            pass_fds=(write_fd,))
+            finally:
+                os.close(write_fd)
+        except BaseException:
+            os.close(read_fd)
+            raise
+
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader),
+            os.fdopen(read_fd, 'rb', 0))
+
+        try:
+            async for line in reader:
+                event = gg_force.parse_progress(line.decode('ascii'))
+                if event is None:
+                    continue
+
+                if event[0] == 'job':
+                    self.jobs_done += 1
+                    continue
+
+                for tgt in by_hash.get(event[1], []):
+                    if tgt.output_future.done():
+                        continue
+                    self.targets_done += 1
+                    tgt.output_future.set_result(gg_force.ForceResult(
+                        tgt.get_outname(''), event[1], event[2],
+                        os.path.join('.gg/blobs', event[2])))
+        except asyncio.CancelledError:
+            proc.kill()
+            await proc.wait()
+            raise
+        finally:
+            transport.close()
+
+        return await proc.wait()
@@ -0,0 +1,73 @@
+import struct
+
+"""
+Minimal ELF header parser, used by ggSDK to tell statically linked
+executables apart from everything else without libmagic.
+"""
+
+ELF_MAGIC = b'\x7fELF'
+
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+
+ET_EXEC = 2
+ET_DYN = 3
+
+PT_DYNAMIC = 2
+PT_INTERP = 3
+
+# (e_phoff format, e_phoff offset, e_phentsize/e_phnum offset) per class
+HEADER_LAYOUT = {
+    ELFCLASS32: ('I', 0x1c, 0x2a),
+    ELFCLASS64: ('Q', 0x20, 0x36),
+}
+
+HEADER_SIZE = 0x40
+
+"""
+Returns None if the file is not an ELF object, 'other' for ELF objects
+that are not executables or shared objects, and otherwise 'static' or
+'dynamic'. Like file(1), an object is dynamically linked if it has a
+PT_INTERP or a PT_DYNAMIC program header.
+"""
+def linkage(filename):
+    with open(filename, 'rb') as fin:
+        header = fin.read(HEADER_SIZE)
+        if len(header) < 0x34 or header[:4] != ELF_MAGIC:
+            return None
+
+        elf_class = header[4]
+        elf_data = header[5]
+        if elf_class not in HEADER_LAYOUT or \
+           elf_data not in (ELFDATA2LSB, ELFDATA2MSB):
+            return None
+
+        endian = '<' if elf_data == ELFDATA2LSB else '>'
+
+        e_type, = struct.unpack_from(endian + 'H', header, 0x10)
+        if e_type != ET_EXEC and e_type != ET_DYN:
+            return 'other'
+
+        phoff_fmt, phoff_offset, phent_offset = HEADER_LAYOUT[elf_class]
+
+        if len(header) < phent_offset + 4:
+            return None
+
+        phoff, = struct.unpack_from(endian + phoff_fmt, header, phoff_offset)
+        phentsize, phnum = struct.unpack_from(endian + 'HH', header,
+                                              phent_offset)
+
+        if phnum == 0 or phentsize < 4:
+            return 'static'
+
+        fin.seek(phoff)
+        phdrs = fin.read(phentsize * phnum)
+
+    for i in range(len(phdrs) // phentsize):
+        p_type, = struct.unpack_from(endian + 'I', phdrs, i * phentsize)
+        if p_type == PT_INTERP or p_type == PT_DYNAMIC:
+            return 'dynamic'
+
+    return 'static'
@@ -0,0 +1,180 @@
+import os
+import sys
+import threading
+import collections
+import subprocess as sp
+from concurrent.futures import Future
+from timeit import default_timer as now
+
+import gg_metrics
+
+"""
+Runs gg-force for ggSDK and streams its progress back: gg-force writes a
+line to --progress-fd for every finished job and every reduced target
+(see src/frontend/gg-force.cc), and ForceRun turns those into
+per-target futures and status counters.
+"""
+
+ForceResult = collections.namedtuple('ForceResult',
+                                     ['target', 'thunk_hash', 'output_hash',
+                                      'path'])
+
+# Minimum interval between two status updates, in seconds
+STATUS_INTERVAL = 0.5
+
+# Number of recent job latencies the latency counters are computed over
+LATENCY_WINDOW = 1024
+
+"""
+Parse a line written by gg-force to --progress-fd: returns
+('job', thunk_hash, milliseconds), ('target', thunk_hash, output_hash),
+or None for lines it doesn't know
+"""
+def parse_progress(line):
+    fields = line.split()
+    if len(fields) != 3:
+        return None
+    if fields[0] == 'job':
+        return ('job', fields[1], int(fields[2]))
+    if fields[0] == 'target':
+        return ('target', fields[1], fields[2])
+    return None
+
+class ForceRun(object):
+    """
+    targets is a list of (name, thunk_hash) pairs. on_status, if given,
+    is called with stats() at most every STATUS_INTERVAL seconds and once
+    more when gg-force exits; with status=True the counters are also
+    printed to stderr.
+    """
+    def __init__(self, cmd, targets, blobs_dir='.gg/blobs', status=True,
+                 on_status=None, env=None):
+        self.targets = targets
+        self.blobs_dir = blobs_dir
+        self.status = status
+        self.on_status = on_status
+
+        self.futures = collections.OrderedDict()
+        self.by_hash = {}
+        for name, thunk_hash in targets:
+            self.futures[name] = Future()
+            self.by_hash.setdefault(thunk_hash, []).append(name)
+
+        self.lock = threading.Lock()
+        self.jobs_done = 0
+        self.targets_done = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.start = now()
+        self.end = None
+        self.last_status = 0
+        self.returncode = None
+
+        read_fd, write_fd = os.pipe()
+        try:
+            gg_metrics.count('subprocesses')
+            self.proc = sp.Popen(cmd + ['--progress-fd', str(write_fd)] +
+                                 [name for name, _ in targets],
+                                 pass_fds=(write_fd,), env=env)
+        finally:
+            os.close(write_fd)
+
+        self.reader = threading.Thread(target=self.__read_progress,
+                                       args=(read_fd,))
+        self.reader.daemon = True
+        self.reader.start()
+
+    """
+    Future for a target, resolving to a ForceResult
+    """
+    def future(self, target):
+        return self.futures[target]
+
+    """
+    Wait for gg-force to exit and return its exit code
+    """
+    def wait(self):
+        self.reader.join()
+        return self.returncode
+
+    """
+    Throughput and latency counters
+    """
+    def stats(self):
+        with self.lock:
+            elapsed = (self.end or now()) - self.start
+            latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            'jobs_done': self.jobs_done,
+            'targets_done': self.targets_done,
+            'targets_total': len(self.futures),
+            'elapsed': elapsed,
+            'jobs_per_second': self.jobs_done / elapsed if elapsed else 0,
+            'latency_ms_mean': sum(latencies) / len(latencies) if latencies else 0,
+            'latency_ms_p50': percentile(0.5),
+            'latency_ms_p99': percentile(0.99),
+            'latency_ms_max': latencies[-1] if latencies else 0,
+        }
+
+    def __report_status(self, force=False):
+        t = now()
+        if not force and t - self.last_status < STATUS_INTERVAL:
+            return
+        self.last_status = t
+
+        stats = self.stats()
+        if self.on_status is not None:
+            self.on_status(stats)
+        if self.status:
+            sys.stderr.write('\r[gg] done: %d/%d targets, %d jobs '
+                             '(%.1f jobs/s)  latency p50: %d ms p99: %d ms' %
+                             (stats['targets_done'], stats['targets_total'],
+                              stats['jobs_done'], stats['jobs_per_second'],
+                              stats['latency_ms_p50'], stats['latency_ms_p99']))
+            if force:
+                sys.stderr.write('\n')
+            sys.stderr.flush()
+
+    def __resolve(self, thunk_hash, output_hash):
+        for name in self.by_hash.get(thunk_hash, []):
+            future = self.futures[name]
+            if future.done():
+                continue
+            with self.lock:
+                self.targets_done += 1
+            future.set_result(ForceResult(name, thunk_hash, output_hash,
+                                          os.path.join(self.blobs_dir,
+                                                       output_hash)))
+
+    def __read_progress(self, read_fd):
+        with os.fdopen(read_fd, 'r') as fin:
+            for line in fin:
+                event = parse_progress(line)
+                if event is None:
+                    continue
+
+                if event[0] == 'job':
+                    with self.lock:
+                        self.jobs_done += 1
+                        self.latencies.append(event[2])
+                else:
+                    self.__resolve(event[1], event[2])
+
+                self.__report_status()
+
+        self.returncode = self.proc.wait()
+        with self.lock:
+            self.end = now()
+
+        for name, future in self.futures.items():
+            if not future.done():
+                future.set_exception(RuntimeError(
+                    'gg-force exited with code %d before reducing %s' %
+                    (self.returncode, name)))
+
+        self.__report_status(force=True)
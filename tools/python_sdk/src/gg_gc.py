@@ -0,0 +1,58 @@
+import os
+import time
+import fcntl
+
+"""
+Access journal for gg-gc (src/frontend/gg-gc.cc). gg-gc evicts the least
+recently used blobs, so the SDK records the blobs it reads and writes,
+and the placeholders it writes, as gg-execute and gg-collect do (see
+gg::gc in src/thunk/ggutils.hh). Each call appends all of its records
+in one O_APPEND write, under a shared lock on GC_LOCK that gg-gc takes
+exclusively while it runs:
+
+    A <time> <hash>          blob was read or written
+    P <hash> <path>          placeholder was written
+"""
+
+GC_DIR = '.gg/gc'
+GC_JOURNAL = os.path.join(GC_DIR, 'journal')
+GC_LOCK = os.path.join(GC_DIR, 'lock')
+
+"""
+Append records for the accessed blob hashes and the (thunk hash,
+path) pairs of written placeholders. Like the C++ side, this is
+best-effort: a lost record only makes a blob look older to gg-gc.
+"""
+def record(accessed=(), placeholders=(), journal=GC_JOURNAL, lock=GC_LOCK):
+    now = int(time.time())
+    records = ''.join('A %d %s\n' % (now, h) for h in accessed)
+    records += ''.join('P %s %s\n' % (h, os.path.abspath(path))
+                       for h, path in placeholders)
+    if not records:
+        return
+
+    try:
+        os.makedirs(os.path.dirname(journal), exist_ok=True)
+        lock_fd = os.open(lock, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_SH)
+            fd = os.open(journal, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                         0o644)
+            try:
+                os.write(fd, records.encode('utf-8'))
+            finally:
+                os.close(fd)
+        finally:
+            os.close(lock_fd)
+    except OSError:
+        pass
+
+"""
+Parse the summary line gg-gc prints (key=value pairs) into a dict
+"""
+def parse_summary(line):
+    summary = {}
+    for field in line.split():
+        key, _, value = field.partition('=')
+        summary[key] = int(value)
+    return summary
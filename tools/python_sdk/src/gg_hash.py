@@ -0,0 +1,104 @@
+import os
+import mmap
+import hashlib
+import base64
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import gg_metrics
+
+"""
+gghash computation for ggSDK. Produces the same hashes as gg::hash in
+src/thunk/ggutils.cc (and gg-hash): a type character, the base64url
+encoded sha256 of the contents with '-' replaced by '.', and the size
+as 8 hex digits.
+"""
+
+MAGIC_NUMBER = b'##GGTHUNK##'
+
+# Files larger than this are mapped instead of read
+MMAP_THRESHOLD = 1 << 20
+
+# Amount of a mapped file handed to sha256 at once
+MMAP_WINDOW = 8 << 20
+
+# Below this many files, a process pool costs more than it saves
+MIN_PARALLEL_FILES = 4
+
+"""
+Format a gghash from a sha256 object and the object size
+"""
+def _format(sha256, size, obj_type):
+    digest = base64.urlsafe_b64encode(sha256.digest())
+    digest = digest.decode('ascii').rstrip('=').replace('-', '.')
+    return '%s%s%08x' % (obj_type, digest, size)
+
+"""
+Object size encoded in a gghash, as gg::hash::size does
+"""
+def size(gghash):
+    return int(gghash[-8:], 16)
+
+"""
+gghash of an in-memory object
+"""
+def compute(data, obj_type='V'):
+    return _format(hashlib.sha256(data), len(data), obj_type)
+
+"""
+gghash of a file. If obj_type is None, the type is inferred from the
+thunk magic number, as gg::hash::file_force does.
+"""
+def file(filename, obj_type=None):
+    sha256 = hashlib.sha256()
+
+    with open(filename, 'rb') as fin:
+        size = os.fstat(fin.fileno()).st_size
+
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+                view = memoryview(mm)
+                try:
+                    head = bytes(view[:len(MAGIC_NUMBER)])
+                    for offset in range(0, size, MMAP_WINDOW):
+                        sha256.update(view[offset:offset + MMAP_WINDOW])
+                finally:
+                    view.release()
+        else:
+            data = fin.read()
+            head = data[:len(MAGIC_NUMBER)]
+            size = len(data)
+            sha256.update(data)
+
+    if obj_type is None:
+        obj_type = 'T' if head == MAGIC_NUMBER else 'V'
+
+    return _format(sha256, size, obj_type)
+
+"""
+Hash many files, spreading them over a pool of processes. Returns the
+hashes in the same order as filenames.
+"""
+def hash_files(filenames, jobs=None, obj_type=None):
+    filenames = list(filenames)
+    if jobs is None:
+        jobs = mp.cpu_count()
+    jobs = min(jobs, len(filenames))
+
+    if jobs <= 1 or len(filenames) < MIN_PARALLEL_FILES:
+        return [file(f, obj_type) for f in filenames]
+
+    # Big files first, so one large straggler doesn't end the batch
+    order = sorted(range(len(filenames)),
+                   key=lambda i: os.path.getsize(filenames[i]), reverse=True)
+
+    hashes = [None] * len(filenames)
+    gg_metrics.count('process_pools')
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(file, [filenames[i] for i in order],
+                               [obj_type] * len(order))
+        for i, h in zip(order, results):
+            hashes[i] = h
+
+    return hashes
@@ -0,0 +1,109 @@
+import os
+import threading
+
+import gg_thunk
+
+"""
+Single-file hash cache index, shared with the C++ tools (HashCache in
+src/thunk/hash_cache.cc). The index is an append-only log of lines
+
+    <dev> <ino> <size> <mtime-ns> <ctime-ns> <hash>
+
+where a later line overrides an earlier one for the same (dev, ino). An
+entry is valid only while size, mtime and ctime all match, to the
+nanosecond. The whole log is read once, so lookups only cost the stat()
+of the file being looked up.
+"""
+
+HASH_INDEX = '.gg/hash_index'
+
+# Compact the log when it has this many records and less than half of
+# them are live
+COMPACTION_THRESHOLD = 4096
+
+class HashCache(object):
+    def __init__(self, path=HASH_INDEX):
+        self.path = path
+        self.entries = {}
+        self.log_records = 0
+        self.lock = threading.Lock()
+
+        self.load()
+
+    """
+    Read the whole log into memory, compacting it if needed
+    """
+    def load(self):
+        self.entries = {}
+        self.log_records = 0
+
+        try:
+            with open(self.path, 'rb') as fin:
+                contents = fin.read()
+        except FileNotFoundError:
+            return
+
+        # The last line may be partial if a writer crashed; it is skipped
+        for line in contents.split(b'\n')[:-1]:
+            record = line.split()
+            if len(record) != 6:
+                continue
+            try:
+                key = (int(record[0]), int(record[1]))
+                entry = (int(record[2]), int(record[3]), int(record[4]),
+                         record[5].decode('ascii'))
+            except ValueError:
+                continue
+            self.entries[key] = entry
+            self.log_records += 1
+
+        if (self.log_records >= COMPACTION_THRESHOLD and
+            self.log_records > 2 * len(self.entries)):
+            self.compact()
+
+    """
+    Rewrite the log with only the live entries
+    """
+    def compact(self):
+        contents = ''.join(self.__record(k, v) for k, v in self.entries.items())
+        gg_thunk.atomic_create(contents.encode('ascii'), self.path, 0o644)
+        self.log_records = len(self.entries)
+
+    """
+    Cached hash for a file given its os.stat() result, or None
+    """
+    def get(self, info):
+        entry = self.entries.get((info.st_dev, info.st_ino))
+        if (entry is None or
+            entry[0] != info.st_size or
+            entry[1] != info.st_mtime_ns or
+            entry[2] != info.st_ctime_ns):
+            return None
+        return entry[3]
+
+    """
+    Record a file's hash. The record goes out in a single O_APPEND
+    write, so concurrent writers (gg tools or other SDK runs) don't
+    interleave.
+    """
+    def put(self, info, next_hash):
+        key = (info.st_dev, info.st_ino)
+        entry = (info.st_size, info.st_mtime_ns, info.st_ctime_ns, next_hash)
+        record = self.__record(key, entry).encode('ascii')
+
+        with self.lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                         0o644)
+            try:
+                os.write(fd, record)
+            finally:
+                os.close(fd)
+
+            self.entries[key] = entry
+            self.log_records += 1
+
+    def __record(self, key, entry):
+        return '%d %d %d %d %d %s\n' % (key + entry)
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,147 @@
+import os
+import stat
+import errno
+import fcntl
+import shutil
+import tempfile
+
+"""
+Blob ingestion for ggSDK: puts a copy of an input file into .gg/blobs
+while moving as few bytes as possible. Mirrors roost::ingest_file in
+src/util/path.cc, which gg-collect uses.
+
+Methods, in the order they are tried:
+  link             hardlink the file into blobs, then clear the write bits
+                   of the (now shared) inode so the blob can't be changed
+                   in place through the original path (both change the
+                   ctime of the source, so its hash cache entry has to be
+                   put again)
+  reflink          FICLONE: share extents on copy-on-write filesystems
+  copy_file_range  in-kernel copy
+  sendfile         in-kernel copy, for kernels without copy_file_range
+  copy             plain userspace copy
+
+An ingestion mode names the first method to try; each method falls back to
+the next one when the filesystem or kernel doesn't support it. The default,
+reflink, never touches the source file.
+"""
+
+METHODS = ['link', 'reflink', 'copy_file_range', 'sendfile', 'copy']
+DEFAULT_MODE = 'reflink'
+
+# Methods that copy the data, rather than share it with the source
+COPYING_METHODS = ['copy_file_range', 'sendfile', 'copy']
+
+# _IOW(0x94, 9, int) from linux/fs.h
+FICLONE = 0x40049409
+
+# errnos meaning "this method is not available here, try the next one"
+FALLBACK_ERRNOS = set([errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EINVAL,
+                       errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY,
+                       errno.EBADF, errno.ETXTBSY])
+
+class UnsupportedMethod(Exception):
+    pass
+
+def _check_fallback(exc):
+    if exc.errno in FALLBACK_ERRNOS:
+        raise UnsupportedMethod(str(exc))
+    raise exc
+
+def _link(src, dst):
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        return
+    except OSError as exc:
+        _check_fallback(exc)
+
+    mode = stat.S_IMODE(os.stat(dst).st_mode)
+    os.chmod(dst, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+def _reflink(src_fd, dst_fd, size):
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    except OSError as exc:
+        _check_fallback(exc)
+
+def _copy_file_range(src_fd, dst_fd, size):
+    if not hasattr(os, 'copy_file_range'):
+        raise UnsupportedMethod('os.copy_file_range not available')
+    copied = 0
+    while copied < size:
+        try:
+            n = os.copy_file_range(src_fd, dst_fd, size - copied)
+        except OSError as exc:
+            if copied:
+                raise
+            _check_fallback(exc)
+        if n == 0:
+            break
+        copied += n
+
+def _sendfile(src_fd, dst_fd, size):
+    copied = 0
+    while copied < size:
+        try:
+            n = os.sendfile(dst_fd, src_fd, copied, size - copied)
+        except OSError as exc:
+            if copied:
+                raise
+            _check_fallback(exc)
+        if n == 0:
+            break
+        copied += n
+
+def _copy(src_fd, dst_fd, size):
+    with os.fdopen(os.dup(src_fd), 'rb') as fin, \
+         os.fdopen(os.dup(dst_fd), 'wb') as fout:
+        shutil.copyfileobj(fin, fout)
+
+COPY_METHODS = {
+    'reflink': _reflink,
+    'copy_file_range': _copy_file_range,
+    'sendfile': _sendfile,
+    'copy': _copy,
+}
+
+"""
+Copy the contents of src into a new file at dst using one of the copying
+methods; the file appears at dst atomically.
+"""
+def _copy_with(method, src, dst):
+    dst_dir = os.path.dirname(dst) or '.'
+    with open(src, 'rb') as fin:
+        info = os.fstat(fin.fileno())
+        fd, tmp_name = tempfile.mkstemp(dir=dst_dir,
+                                        prefix=os.path.basename(dst) + '.')
+        try:
+            try:
+                COPY_METHODS[method](fin.fileno(), fd, info.st_size)
+                os.fchmod(fd, stat.S_IMODE(info.st_mode))
+            finally:
+                os.close(fd)
+            os.rename(tmp_name, dst)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+"""
+Put the contents of src at dst, starting with the method named by mode.
+Returns the method that was used.
+"""
+def ingest(src, dst, mode=DEFAULT_MODE):
+    if mode not in METHODS:
+        raise ValueError('unknown ingestion mode: %s' % mode)
+
+    for method in METHODS[METHODS.index(mode):]:
+        try:
+            if method == 'link':
+                _link(src, dst)
+            else:
+                _copy_with(method, src, dst)
+            return method
+        except UnsupportedMethod:
+            continue
+
+    raise RuntimeError('could not ingest %s' % src)
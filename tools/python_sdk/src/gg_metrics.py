@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import functools
+import threading
+import contextlib
+from timeit import default_timer as now
+
+"""
+Per-phase timers and counters for ggSDK.
+
+Off unless GG_SDK_METRICS is set (to anything but '' or '0') when the
+SDK is imported; when off, timed() leaves functions untouched and
+count() returns right away, so instrumented code pays close to nothing.
+
+    phases     add_infile, classify, file_hash, ingest, comb_infiles,
+               prepare_thunk, sched_run (serializing thunks),
+               sched_wait (workers waiting for ready thunks) and
+               create_thunks: number of calls and total seconds
+    counters   cache hits and misses, bytes ingested and copied,
+               subprocesses and process pools started, ...
+
+snapshot() returns them as a dict, to_json() and to_prometheus() as
+text. With GG_SDK_METRICS_OUT=<file>, every create_thunks call writes
+them to <file> when it returns (Prometheus text if it ends in .prom,
+JSON otherwise).
+
+profile(filename) captures a profile of the code it wraps, with cProfile
+or, if asked for and installed, pyinstrument; GG_SDK_PROFILE=<file> does
+that around every create_thunks call. Both profilers only see the thread
+they were started in, so while a profile is taken (see profiling()) the
+SDK does its work in the calling thread instead of spreading it across
+threads.
+"""
+
+METRICS_ENV = 'GG_SDK_METRICS'
+METRICS_OUT_ENV = 'GG_SDK_METRICS_OUT'
+PROFILE_ENV = 'GG_SDK_PROFILE'
+
+PROFILERS = ['cprofile', 'pyinstrument']
+
+ENABLED = os.environ.get(METRICS_ENV, '') not in ('', '0')
+
+lock = threading.Lock()
+phases = {}
+counters = {}
+
+# Number of profile() contexts currently open
+profiles = 0
+
+def add_phase(name, seconds):
+    with lock:
+        phase = phases.get(name)
+        if phase is None:
+            phase = phases[name] = [0, 0.0]
+        phase[0] += 1
+        phase[1] += seconds
+
+"""
+Add n to a counter
+"""
+def count(name, n=1):
+    if not ENABLED:
+        return
+    with lock:
+        counters[name] = counters.get(name, 0) + n
+
+class Timer(object):
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = now()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        add_phase(self.name, now() - self.start)
+
+@contextlib.contextmanager
+def _no_timer():
+    yield
+
+"""
+Context manager timing a block as phase name
+"""
+def timer(name):
+    if not ENABLED:
+        return _no_timer()
+    return Timer(name)
+
+"""
+Decorator timing every call of a function as phase name
+"""
+def timed(name):
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = now()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                add_phase(name, now() - start)
+        return wrapper
+    return decorator
+
+def snapshot():
+    with lock:
+        return {
+            'enabled': ENABLED,
+            'phases': {name: {'calls': p[0], 'seconds': p[1]}
+                       for name, p in phases.items()},
+            'counters': dict(counters),
+        }
+
+def reset():
+    with lock:
+        phases.clear()
+        counters.clear()
+
+def to_json():
+    return json.dumps(snapshot(), indent=2, sort_keys=True)
+
+"""
+Prometheus text exposition format
+"""
+def to_prometheus():
+    snap = snapshot()
+    lines = ['# TYPE gg_sdk_phase_calls_total counter']
+    for name, phase in sorted(snap['phases'].items()):
+        lines.append('gg_sdk_phase_calls_total{phase="%s"} %d' %
+                     (name, phase['calls']))
+    lines.append('# TYPE gg_sdk_phase_seconds_total counter')
+    for name, phase in sorted(snap['phases'].items()):
+        lines.append('gg_sdk_phase_seconds_total{phase="%s"} %f' %
+                     (name, phase['seconds']))
+    for name, value in sorted(snap['counters'].items()):
+        lines.append('# TYPE gg_sdk_%s_total counter' % name)
+        lines.append('gg_sdk_%s_total %d' % (name, value))
+    return '\n'.join(lines) + '\n'
+
+"""
+Write the metrics to filename, as Prometheus text for a .prom file and
+as JSON otherwise
+"""
+def write(filename):
+    contents = to_prometheus() if filename.endswith('.prom') else to_json()
+    with open(filename, 'w') as fout:
+        fout.write(contents)
+
+"""
+Write the metrics where GG_SDK_METRICS_OUT says, if it is set
+"""
+def write_out():
+    filename = os.environ.get(METRICS_OUT_ENV)
+    if ENABLED and filename:
+        write(filename)
+
+"""
+Whether a profile is being taken, in which case work must run in the
+calling thread to show up in it
+"""
+def profiling():
+    return profiles > 0
+
+@contextlib.contextmanager
+def _profiling():
+    global profiles
+    with lock:
+        profiles += 1
+    try:
+        yield
+    finally:
+        with lock:
+            profiles -= 1
+
+"""
+Profile the code run inside the context and save the result to
+filename: pstats data for cProfile (read it with python -m pstats), an
+HTML report for pyinstrument
+"""
+@contextlib.contextmanager
+def profile(filename, profiler='cprofile'):
+    if profiler not in PROFILERS:
+        raise ValueError('unknown profiler: %s' % profiler)
+
+    with _profiling():
+        with _profile(filename, profiler) as prof:
+            yield prof
+
+@contextlib.contextmanager
+def _profile(filename, profiler):
+    if profiler == 'pyinstrument':
+        try:
+            import pyinstrument
+        except ImportError:
+            print("pyinstrument is not installed: pip install pyinstrument")
+            sys.exit(1)
+
+        prof = pyinstrument.Profiler()
+        prof.start()
+        try:
+            yield prof
+        finally:
+            prof.stop()
+            with open(filename, 'w') as fout:
+                fout.write(prof.output_html())
+        return
+
+    import cProfile
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield prof
+    finally:
+        prof.disable()
+        prof.dump_stats(filename)
+
+"""
+Decorator for the SDK calls users make (create_thunks): times each
+call as phase name, profiles it to GG_SDK_PROFILE when that is set (a
+.html file gets a pyinstrument report) and then writes the metrics out
+(see write_out)
+"""
+def entry_point(name):
+    def decorator(fn):
+        fn = timed(name)(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            filename = os.environ.get(PROFILE_ENV)
+            try:
+                if not filename:
+                    return fn(*args, **kwargs)
+
+                profiler = ('pyinstrument' if filename.endswith('.html')
+                            else 'cprofile')
+                with profile(filename, profiler):
+                    return fn(*args, **kwargs)
+            finally:
+                write_out()
+        return wrapper
+    return decorator
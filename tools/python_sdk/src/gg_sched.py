@@ -0,0 +1,211 @@
+import threading
+import multiprocessing as mp
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import gg_metrics
+
+"""
+Ready-based work-stealing scheduler for ggSDK graph generation.
+
+Every node runs once all of its dependencies have run. Each worker has
+its own deque of ready nodes: it pops its own work from the back (so it
+keeps going depth-first into the parents it just unblocked) and, when
+it runs dry, steals from the front of another worker's deque. A graph
+that is wide in one place and deep in another therefore keeps every
+worker busy, no matter how the targets were ordered.
+
+Work is split in two:
+  prepare(node) -> (fn, args)   runs in a worker thread, may touch the
+                                graph; (None, result) if the result is
+                                already known
+  fn(*args)                     pure; runs in the worker thread, or in
+                                a process pool with executor='process'
+                                so that it is not held back by the GIL
+  finish(node, result)          runs in the worker thread
+
+With executor='process', a worker takes up to PROCESS_CHUNK ready nodes
+of its own at a time (ready nodes never depend on each other) and runs
+all of their fns in one round trip to the pool.
+
+With a single thread worker, or while a profile is taken (profilers only
+see the calling thread, see gg_metrics.profile), everything runs in the
+calling thread.
+"""
+
+EXECUTORS = ['thread', 'process']
+
+# Most nodes a worker sends to the process pool at once
+PROCESS_CHUNK = 64
+
+"""
+Results of a list of (fn, args) calls; what a process pool runs
+"""
+def run_calls(calls):
+    return [fn(*args) for fn, args in calls]
+
+class Scheduler(object):
+    def __init__(self, jobs=None, executor='thread'):
+        if executor not in EXECUTORS:
+            raise ValueError('unknown executor: %s' % executor)
+
+        if gg_metrics.profiling():
+            jobs, executor = 1, 'thread'
+
+        self.jobs = jobs if jobs else mp.cpu_count()
+        self.executor = executor
+
+        self.cond = threading.Condition()
+        self.queues = []
+        self.pending = array('l')
+        self.offsets = array('l')
+        self.parents = array('l')
+        self.remaining = 0
+        self.error = None
+        self.steals = 0
+        self.executed = []
+
+    """
+    Run every node in nodes. deps(node) lists the nodes a node waits for;
+    dependencies that are not in nodes are taken as already done.
+    Returns a dict of statistics.
+    """
+    def run(self, nodes, deps, prepare, finish):
+        nodes = list(nodes)
+        index = {id(n): i for i, n in enumerate(nodes)}
+
+        # Dependents of node i are parents[offsets[i]:offsets[i + 1]]
+        self.pending = array('l', [0]) * len(nodes)
+        self.offsets = array('l', [0]) * (len(nodes) + 1)
+        for i, node in enumerate(nodes):
+            for dep in deps(node):
+                j = index.get(id(dep))
+                if j is not None:
+                    self.pending[i] += 1
+                    self.offsets[j + 1] += 1
+
+        for i in range(len(nodes)):
+            self.offsets[i + 1] += self.offsets[i]
+
+        fill = array('l', self.offsets[:-1])
+        self.parents = array('l', [0]) * self.offsets[-1]
+        for i, node in enumerate(nodes):
+            for dep in deps(node):
+                j = index.get(id(dep))
+                if j is not None:
+                    self.parents[fill[j]] = i
+                    fill[j] += 1
+        del index, fill
+
+        self.queues = [deque() for _ in range(self.jobs)]
+        self.remaining = len(nodes)
+        self.error = None
+        self.steals = 0
+        self.executed = [0] * self.jobs
+
+        # Spread the initial frontier across the workers
+        ready = (i for i in range(len(nodes)) if self.pending[i] == 0)
+        for k, i in enumerate(ready):
+            self.queues[k % self.jobs].append(i)
+
+        pool = None
+        if self.executor == 'process' and nodes:
+            gg_metrics.count('process_pools')
+            pool = ProcessPoolExecutor(max_workers=self.jobs)
+
+        num_workers = min(self.jobs, max(len(nodes), 1))
+        try:
+            if num_workers == 1 and pool is None:
+                self.__worker(0, nodes, prepare, finish, None)
+            else:
+                workers = [threading.Thread(target=self.__worker,
+                                            args=(i, nodes, prepare, finish,
+                                                  pool))
+                           for i in range(num_workers)]
+                for w in workers:
+                    w.start()
+                for w in workers:
+                    w.join()
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        if self.error is not None:
+            raise self.error
+
+        return {'nodes': len(nodes), 'workers': num_workers,
+                'steals': self.steals, 'executed': self.executed}
+
+    """
+    Index of the next node for worker i: its own newest node, else the
+    oldest node of another worker. Called with cond held.
+    """
+    def __next(self, i):
+        if self.queues[i]:
+            return self.queues[i].pop()
+
+        for k in range(1, self.jobs):
+            victim = self.queues[(i + k) % self.jobs]
+            if victim:
+                self.steals += 1
+                return victim.popleft()
+
+        return None
+
+    def __worker(self, i, nodes, prepare, finish, pool):
+        while True:
+            with self.cond:
+                n = self.__next(i)
+                while n is None:
+                    if self.remaining == 0 or self.error is not None:
+                        return
+                    with gg_metrics.timer('sched_wait'):
+                        self.cond.wait()
+                    n = self.__next(i)
+
+                batch = [n]
+                if pool is not None:
+                    while len(batch) < PROCESS_CHUNK and self.queues[i]:
+                        batch.append(self.queues[i].pop())
+
+            try:
+                calls = [prepare(nodes[n]) for n in batch]
+
+                # (None, result) when the result is already known
+                pending = [call for call in calls if call[0] is not None]
+                done = iter(())
+                if pending:
+                    with gg_metrics.timer('sched_run'):
+                        if pool is not None:
+                            done = iter(pool.submit(run_calls,
+                                                    pending).result())
+                        else:
+                            done = iter(run_calls(pending))
+
+                for n, (fn, args) in zip(batch, calls):
+                    finish(nodes[n], args if fn is None else next(done))
+            except BaseException as exc:
+                with self.cond:
+                    if self.error is None:
+                        self.error = exc
+                    self.cond.notify_all()
+                return
+
+            with self.cond:
+                self.executed[i] += len(batch)
+                self.remaining -= len(batch)
+
+                unblocked = 0
+                for n in batch:
+                    for k in range(self.offsets[n], self.offsets[n + 1]):
+                        parent = self.parents[k]
+                        self.pending[parent] -= 1
+                        if self.pending[parent] == 0:
+                            self.queues[i].append(parent)
+                            unblocked += 1
+
+                if self.remaining == 0:
+                    self.cond.notify_all()
+                elif unblocked > 1:
+                    self.cond.notify(unblocked - 1)
@@ -6,32 +6,217 @@ import subprocess as sp
 import json
 import hashlib
 import base64
-import multiprocessing as mp # For getting number of cores
-import magic # pip install python_magic
-
-from threading import Thread
+import asyncio
+import itertools
+
+import gg_elf
+import gg_force
+import gg_gc
+import gg_hash
+import gg_ingest
+import gg_metrics
+import gg_sched
+import gg_thunk
+import gg_thunk_memo
+from gg_hash_cache import HashCache
+
+from threading import Lock
 from concurrent.futures import Future
 from timeit import default_timer as now
 
 """
-Function used in conjunction with threaded for returning values
+Node ids of GGThunks, and the locks that serialize their
+generation, shared by node id
+"""
+node_ids = itertools.count()
+gen_locks = [Lock() for _ in range(64)]
+
+"""
+Tuple form of a GGThunk sequence argument (a single item, a
+list or a tuple), with strings interned so that arguments
+repeated across thunks are stored once
+"""
+def freeze(seq):
+    if isinstance(seq, tuple):
+        return seq
+    if not isinstance(seq, list):
+        seq = [seq]
+    return tuple(sys.intern(item) if type(item) is str else item
+                 for item in seq)
+
+"""
+Contents of a file, as bytes
+"""
+def read_file(filename):
+    with open(filename, 'rb') as fin:
+        return fin.read()
+
+"""
+Number of targets generated at a time when create_thunks
+is given an iterable instead of a list
 """
-def call_with_future(fn, future, args, kwargs):
+STREAM_WINDOW = 1024
+
+"""
+Infile types by (st_dev, st_ino, st_mtime_ns), so that a file
+attached to many thunks is only classified once per session
+"""
+infile_types = {}
+infile_types_lock = Lock()
+
+"""
+Function to predict an infile's type: statically linked ELF
+executables are EXECUTABLEs, anything else that is not an ELF
+object is a regular FILE
+"""
+@gg_metrics.timed('classify')
+def classify_infile(filename):
     try:
-        result = fn(*args, **kwargs)
-        future.set_result(result)
-    except Exception as exc:
-        future.set_exception(exc)
+        info = os.stat(filename)
+    except OSError:
+        info = None
+
+    if info is None or not stat.S_ISREG(info.st_mode):
+        print(filename + " not found")
+        sys.exit(1)
+
+    key = (info.st_dev, info.st_ino, info.st_mtime_ns)
+    with infile_types_lock:
+        if_type = infile_types.get(key)
+
+    if if_type is not None:
+        gg_metrics.count('classify_cache_hits')
+    else:
+        gg_metrics.count('classify_cache_misses')
+        linkage = gg_elf.linkage(filename)
+        if linkage is None:
+            if_type = 'FILE'
+        elif linkage == 'static':
+            if_type = 'EXECUTABLE'
+        else:
+            print("Only statically linked binaries supported")
+            sys.exit(1)
+
+        with infile_types_lock:
+            infile_types[key] = if_type
+
+    return if_type
 
 """
-Function for multithreading thunk generation in force()
+Session-wide registry of file infiles. Resolves each distinct
+path to its hash, and makes sure the matching blob is in
+.gg/blobs, exactly once per session. It is owned by GG and
+shared by all the threads generating thunks; a thread that asks
+for a path another thread is resolving waits for that result.
 """
-def threaded(fn):
-    def wrapper(*args, **kwargs):
-        future = Future()
-        Thread(target=call_with_future, args=(fn, future, args, kwargs)).start()
-        return future
-    return wrapper
+class InfileRegistry(object):
+    def __init__(self, hash_cache, blobs_dir='.gg/blobs',
+                 ingest_mode=gg_ingest.DEFAULT_MODE):
+        self.hash_cache = hash_cache
+        self.blobs_dir = blobs_dir
+        self.ingest_mode = ingest_mode
+        self.entries = {}
+        self.ingest_methods = {}
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    """
+    Hash of filename, with its blob in blobs_dir
+    """
+    def resolve(self, filename):
+        key = os.path.normpath(filename)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            owner = False
+            if entry is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                entry = self.entries[key] = Future()
+                entry.set_running_or_notify_cancel()
+                owner = True
+
+        if not owner:
+            return entry.result()
+
+        try:
+            next_hash = self.__file_hash(filename)
+            blob_path = os.path.join(self.blobs_dir, next_hash)
+            if os.path.exists(blob_path):
+                method = 'existing'
+            else:
+                with gg_metrics.timer('ingest'):
+                    method = gg_ingest.ingest(filename, blob_path,
+                                              self.ingest_mode)
+                if method == 'link':
+                    # Linking and the chmod changed the file's ctime, so
+                    # the hash cache entry __file_hash put is stale
+                    self.hash_cache.put(os.stat(filename), next_hash)
+                size = gg_hash.size(next_hash)
+                gg_metrics.count('bytes_ingested', size)
+                if method in gg_ingest.COPYING_METHODS:
+                    gg_metrics.count('bytes_copied', size)
+            with self.lock:
+                self.ingest_methods[key] = method
+            entry.set_result(next_hash)
+        except Exception as exc:
+            entry.set_exception(exc)
+
+        return entry.result()
+
+    """
+    Hash every file in filenames that is not in the hash cache,
+    in one batch spread across jobs processes
+    """
+    def prefetch(self, filenames, jobs=None):
+        to_hash = {}
+        for filename in filenames:
+            if filename in to_hash:
+                continue
+            info = os.stat(filename)
+            if self.hash_cache.get(info) is None:
+                to_hash[filename] = info
+
+        names = list(to_hash)
+        hashes = gg_hash.hash_files(names, jobs)
+        for filename, next_hash in zip(names, hashes):
+            self.hash_cache.put(to_hash[filename], next_hash)
+
+    """
+    Counters for the registry, as a dict. 'ingested' counts how
+    the blobs got into blobs_dir (see gg_ingest); 'existing' means
+    the blob was already there.
+    """
+    def stats(self):
+        with self.lock:
+            ingested = {}
+            for method in self.ingest_methods.values():
+                ingested[method] = ingested.get(method, 0) + 1
+            return {'hits': self.hits, 'misses': self.misses,
+                    'files': len(self.entries), 'ingested': ingested}
+
+    """
+    Function to either look up hash from hash_cache, or
+    generate hash and make a hash_cache entry.
+    """
+    @gg_metrics.timed('file_hash')
+    def __file_hash(self, filename):
+        info = os.stat(filename)
+
+        cached_hash = self.hash_cache.get(info)
+        if cached_hash is not None:
+            gg_metrics.count('hash_cache_hits')
+            return cached_hash
+
+        gg_metrics.count('hash_cache_misses')
+
+        # File not in cache, compute hash and add to hash_cache
+        next_hash = gg_hash.file(filename)
+        self.hash_cache.put(info, next_hash)
+
+        return next_hash
 
 """
 GGThunk class. Each function is represented through this IR.
@@ -42,27 +227,36 @@ will see <out> as an infile). Thus, the user can tell GG not to do this,
 and instead pass the infiles in manually. May be a point of optimization.
 """
 class GGThunk(object):
+    # Thunks are small and numerous: no per-instance __dict__, and
+    # strings and sequences are stored as interned strings and tuples
+    __slots__ = ('node_id', 'exe', 'envars', 'args', 'outname', 'files',
+                 'file_types', 'deps', 'dep_outputs', 'thunk_hash', 'order',
+                 'output_future')
+
     def __init__(self, exe, envars=[], outname=[], exe_args=[],
                  args_infiles=True):
-        self.exe = exe
+        self.node_id = next(node_ids)
+        self.exe = sys.intern(exe)
         self.thunk_hash = ''
-        self.args = exe_args
-        self.envars = envars
         self.order = 0
-        self.outname = outname
-        self.file_infiles = {}
-        self.ggth_infiles = []
+        self.files = ()
+        self.file_types = ()
+        self.deps = ()
+        self.dep_outputs = None
+
+        # Set when the thunk is submitted to an AsyncGG
+        self.output_future = None
+
+        # Tuples, so that thunks never share (and mutate) the caller's
+        # lists or the default arguments. A tuple passed in is used as
+        # is: thunks built from one tuple of arguments share it.
+        self.envars = freeze(envars)
+        self.args = freeze(exe_args)
+        self.outname = freeze(outname)
 
         # Function is also an infile
         self.add_infile([exe])
 
-        if not isinstance(self.envars, list):
-            self.envars = [self.envars]
-        if not isinstance(self.args, list):
-            self.args = [self.args]
-        if not isinstance(self.outname, list):
-            self.outname = [self.outname]
-
         if args_infiles:
             for ea in self.args:
                 # Only add if a GGThunk or a string but not a flag
@@ -76,9 +270,13 @@ class GGThunk(object):
     Function to add an infile once the thunk is created
     """
     # if_type is optional: should be able to predict file type
+    @gg_metrics.timed('add_infile')
     def add_infile(self, all_inf, if_type='INVALID'):
         if not isinstance(all_inf, list):
             all_inf = [all_inf]
+
+        file_infiles = None
+        new_deps = []
         for new_inf in all_inf:
             new_inf_file_flag = False
             new_inf_tuple_flag = False
@@ -104,124 +302,233 @@ class GGThunk(object):
                     sys.exit(1)
             else:
                 if new_inf_file_flag:
-                    # Check if file exists before attempting to predict
-                    check_file = os.path.isfile(new_inf)
-                    if not check_file:
-                        print(new_inf + " not found")
-                        sys.exit(1)
-
-                    # If it is not an x86 ELF executable or a Python script,
-                    # predict it to be a regular FILE
-                    pred_type = magic.from_file(new_inf)
-                    if "ELF" in pred_type:
-                        if "statically linked" in pred_type:
-                            _if_type = 'EXECUTABLE'
-                        else:
-                            print("Only statically linked binaries supported")
-                            sys.exit(1)
-                    else:
-                        _if_type = 'FILE'
+                    _if_type = classify_infile(new_inf)
                 else:
                     _if_type = 'GGTHUNK'
 
             assert _if_type != 'INVALID'
 
             if new_inf_file_flag:
-                self.file_infiles[new_inf] = _if_type
+                if file_infiles is None:
+                    file_infiles = self.file_infiles
+                file_infiles[sys.intern(new_inf)] = _if_type
             elif new_inf_tuple_flag:
-                self.ggth_infiles.append(new_inf)
+                new_deps.append(new_inf)
             else:
-                self.ggth_infiles.append((new_inf, ''))
+                new_deps.append((new_inf, ''))
 
-    """
-    Function called by the GG class to generate and
-    serialize the thunk
-    """
-    def generate_thunk(self, outnum):
-        # Go through GGThunk infiles and recursively generate
-        for inf in self.ggth_infiles:
-            curr_thunk = inf[0]
-            curr_search = inf[1]
-            if curr_thunk.outname == []:
-                curr_thunk.add_outname('output_' + str(outnum))
-            curr_thunk.generate_thunk(outnum + 1)
-
-            # Accounts for user passing in GGThunk as exe_arg
-            if curr_thunk in self.args:
-                self.args[self.args.index(curr_thunk)] = curr_thunk.get_outname(curr_search)
-
-        self.__compute_order()
+        if file_infiles is not None:
+            self.files = tuple(file_infiles)
+            self.file_types = tuple(file_infiles.values())
 
-        # Special case if there are no ggth_infiles: the order
-        # is then 1
-        if not self.ggth_infiles:
-            self.order = 1
+        if new_deps:
+            self.ggth_infiles = self.ggth_infiles + new_deps
 
-        self.__create_ser_thunk(outnum == 0)
+    """
+    File infiles, as a {filename: type} dict
+    """
+    @property
+    def file_infiles(self):
+        return dict(zip(self.files, self.file_types))
 
-    """-------- Helper and accessor functions --------"""
+    """
+    GGThunk infiles, as a list of (GGThunk, outname) pairs, where
+    outname is '' for a GGThunk's only output
+    """
+    @property
+    def ggth_infiles(self):
+        if self.dep_outputs is None:
+            return [(dep, '') for dep in self.deps]
+        return list(zip(self.deps, self.dep_outputs))
+
+    @ggth_infiles.setter
+    def ggth_infiles(self, infiles):
+        self.deps = tuple(inf[0] for inf in infiles)
+        if any(inf[1] for inf in infiles):
+            self.dep_outputs = tuple(sys.intern(inf[1]) for inf in infiles)
+        else:
+            self.dep_outputs = None
 
     """
-    Serialize thunk by building the gg-create-thunk call
+    Lock serializing the generation of this thunk. Locks are
+    shared between thunks, by node id.
     """
-    def __create_ser_thunk(self, isPlaceholder):
-        all_infiles = self.__comb_infiles()
+    @property
+    def gen_lock(self):
+        return gen_locks[self.node_id % len(gen_locks)]
 
-        cmd = ['gg-create-thunk']
+    """
+    Thunks of the subgraph rooted at this thunk that still
+    need to be serialized, dependencies first. Unnamed
+    dependencies are named after the depth at which they
+    are first reached. Pass the same visited set to collect
+    the subgraphs of several targets without repeats.
+    """
+    def topological_order(self, depth=0, visited=None):
+        order = []
+        if visited is None:
+            visited = set()
+        stack = [(self, depth, False)]
+        while stack:
+            curr_thunk, curr_depth, expanded = stack.pop()
+            if expanded:
+                order.append(curr_thunk)
+                continue
+            if curr_thunk.node_id in visited or curr_thunk.thunk_hash != '':
+                continue
+            visited.add(curr_thunk.node_id)
+
+            stack.append((curr_thunk, curr_depth, True))
+            for dep in reversed(curr_thunk.deps):
+                with dep.gen_lock:
+                    if not dep.outname:
+                        dep.add_outname('output_' + str(curr_depth))
+                if dep.node_id not in visited:
+                    stack.append((dep, curr_depth + 1, False))
+
+        return order
 
-        # Add envars
-        for ev in self.envars:
-            cmd.extend(['-v', ev])
+    """
+    Once its dependencies are serialized, resolve this thunk's
+    infiles and compute its order. Returns the function and
+    arguments that serialize and write it (gg_thunk.create);
+    they are plain data, so any worker can run them.
+    """
+    @gg_metrics.timed('prepare_thunk')
+    def prepare_thunk(self, registry):
+        # The arguments are shared; substitutions go to a copy
+        args = list(self.args)
 
-        # Add outputs
-        for o in self.outname:
-            cmd.extend(['-o', o])
+        # Accounts for user passing in GGThunk as exe_arg
+        for curr_thunk, curr_search in self.ggth_infiles:
+            if curr_thunk in args:
+                args[args.index(curr_thunk)] = curr_thunk.get_outname(curr_search)
 
-        # Create placeholder if applicable
-        # XXX: support multiple placeholder generation
-        if isPlaceholder:
-            if len(self.outname) > 1:
-                print("gg currently only supports target thunks to have 1 outfile")
-                sys.exit(1)
+        self.__compute_order()
 
-            cmd.extend(['-C', './' + self.outname[0]])
+        all_infiles = self.__comb_infiles(registry, args)
 
-        # Add all Infiles
+        values = []
+        thunks = []
+        executables = []
         for inf in all_infiles:
             inf_type = inf[1]
             if inf_type == 'FILE' or inf_type == 'DUMMY_DIRECTORY':
-                cmd.extend(['-v', inf[0]])
+                values.append(inf[0])
             elif inf_type == 'EXECUTABLE':
-                cmd.extend(['-e', inf[0]])
+                executables.append(inf[0])
             elif inf_type == 'GGTHUNK':
-                cmd.extend(['-t', inf[0]])
-
-        # Append to avoid getopt from seeing anything past this as flags
-        cmd.append('--')
+                thunks.append(inf[0])
 
         # Get function hash and function args
-        func_hash = self.__file_hash(self.exe)
-        cmd.append(func_hash)
-        func_args = [self.exe] + self.args
-        cmd.extend(func_args)
+        func_hash = registry.resolve(self.exe)
+        func_args = [self.exe] + args
+
+        return gg_thunk.create, (func_hash, func_args, list(self.envars),
+                                 values, thunks, executables,
+                                 list(self.outname))
 
-        in_proc = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE)
-        out = in_proc.communicate()[1].strip().decode('utf-8')
+    """
+    Key of this thunk in the thunk memo (gg_thunk_memo), computed
+    from its inputs before they are resolved: its dependencies must
+    have their hashes, but no infile is resolved or hashed. Computes
+    the thunk's order, as prepare_thunk does. None if an infile
+    cannot be stat'ed.
+    """
+    @gg_metrics.timed('memo_key')
+    def memo_key(self):
+        self.__compute_order()
 
-        if 'gg-create-thunk' in out:
-            print("Error: " + out)
-            print("Tried to run: " + ' '.join(cmd))
+        files = []
+        for filename, if_type in zip(self.files, self.file_types):
+            try:
+                info = os.stat(filename)
+            except OSError:
+                return None
+            # ctime too, as in the hash index: a file rewritten in
+            # place with its size and mtime restored still changes it
+            files.append((filename, if_type, info.st_dev, info.st_ino,
+                          info.st_size, info.st_mtime_ns, info.st_ctime_ns))
+
+        args = tuple((arg.thunk_hash, arg.outname)
+                     if isinstance(arg, GGThunk) else arg
+                     for arg in self.args)
+        deps = tuple((dep.get_hash(), search)
+                     for dep, search in self.ggth_infiles)
+
+        return gg_thunk_memo.key((self.exe, args, self.envars, self.outname,
+                                  tuple(files), deps))
+
+    """
+    Record the hash of the serialized thunk
+    """
+    def set_hash(self, thunk_hash):
+        self.thunk_hash = thunk_hash
 
+    """
+    Drop the references to the rest of the graph once the
+    thunk is generated; its hash, order and outnames are all
+    that thunks depending on it still need
+    """
+    def release(self):
+        if self.thunk_hash == '':
+            print("Thunk for " + self.exe + " has not been generated")
             sys.exit(1)
 
-        self.thunk_hash = out
+        stack = [self]
+        while stack:
+            curr_thunk = stack.pop()
+            stack.extend(curr_thunk.deps)
+            curr_thunk.deps = ()
+            curr_thunk.dep_outputs = None
+            curr_thunk.files = ()
+            curr_thunk.file_types = ()
+
+    """-------- Helper and accessor functions --------"""
+
+    """
+    Write the placeholder for a target thunk
+    """
+    def write_placeholder(self):
+        # XXX: support multiple placeholder generation
+        if len(self.outname) > 1:
+            print("gg currently only supports target thunks to have 1 outfile")
+            sys.exit(1)
+
+        # Leave a placeholder from a previous run alone if it is current
+        filename = './' + self.outname[0]
+        try:
+            if gg_thunk.read_placeholder(filename) == self.thunk_hash:
+                return
+        except (FileNotFoundError, IsADirectoryError):
+            pass
+
+        gg_thunk.write_placeholder(filename, self.thunk_hash)
+
+    """
+    Output of a thunk submitted to an AsyncGG (gg_async): waits
+    for its reduction and returns the output hash, or the output
+    contents if contents is set
+    """
+    async def output(self, contents=False):
+        if self.output_future is None:
+            print("Thunk for " + self.exe + " has not been submitted")
+            sys.exit(1)
+
+        result = await self.output_future
+        if not contents:
+            return result.output_hash
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, read_file, result.path)
 
     """
     Thunk hash accessor
     """
     def get_hash(self):
         if self.thunk_hash == '':
-            self.thunk_hash = __file_hash(self.exe)
+            print("Thunk for %s has not been generated" % self.exe)
+            sys.exit(1)
 
         return self.thunk_hash
 
@@ -229,7 +536,7 @@ class GGThunk(object):
     Thunk outfile accessor for all names
     """
     def get_all_outname(self):
-        return self.outname
+        return list(self.outname)
 
     """
     Thunk outfile accessor by name
@@ -255,70 +562,24 @@ class GGThunk(object):
     Function to add to the Thunk's outfile name
     """
     def add_outname(self, new_name):
-        self.outname.append(new_name)
-
-    """
-    Function to either look up hash from hash_cache, or
-    generate hash and make a hash_cache entry.
-
-    NOTE: Python does not have a timespec struct, so the
-    comparisons are only done with seconds, not nanoseconds.
-    The nanoseconds entries are INCORRECT, but are implemented
-    to maintain valid file format. However, since ggSDK
-    generates its own thunks, this should not be a problem.
-    """
-    def __file_hash(self, filename):
-        f_fd = os.open(filename, os.O_RDONLY)
-        info = os.fstat(f_fd)
-        os.close(f_fd)
-
-        hash_name = "%d-%d-%s" % (info.st_dev, info.st_ino, filename)
-        hash_path = '.gg/hash_cache/' + hash_name
-
-        if os.path.exists(hash_path):
-            h_fd = open(hash_path, 'r')
-            h_readlines = h_fd.readlines()
-            while len(h_readlines) == 0:
-                h_readlines = h_fd.readlines()
-            h_file_cont = h_readlines[0].split()
-            h_fd.close()
-
-            if len(h_file_cont) != 6:
-                print("Bad cache entry:", hash_path)
-                sys.exit(1)
-
-            if (h_file_cont[0] == str(int(info.st_size)) and
-               h_file_cont[1] == str(int(info.st_mtime)) and
-               h_file_cont[3] == str(int(info.st_ctime))):
-                  return h_file_cont[5]
-
-        # File not in cache, compute hash and add to hash_cache
-        next_hash = self.__gen_hash_file(filename)
-        outstr = "%d %d %d %d %d %s" % (info.st_size, info.st_mtime, 100, info.st_ctime, 101, next_hash)
-        h_fd = open(hash_path, 'w')
-        h_fd.write(outstr)
-        h_fd.close()
-
-        return next_hash
+        self.outname = self.outname + (sys.intern(new_name),)
 
     """
     Function to merge infiles (since they can be a mix of
     external files and other GGThunks
     """
-    def __comb_infiles(self):
+    @gg_metrics.timed('comb_infiles')
+    def __comb_infiles(self, registry, args):
         # Combine all infiles
         all_infiles = []
-        for k, v in self.file_infiles.items():
-            next_hash = self.__file_hash(k)
-            if not os.path.exists('.gg/blobs/' + next_hash):
-                shutil.copy(k, '.gg/blobs/' + next_hash)
-            next_size = os.path.getsize('.gg/blobs/' + next_hash)
+        for k, v in zip(self.files, self.file_types):
+            next_hash = registry.resolve(k)
             next_tuple = (next_hash, v)
             all_infiles.append(next_tuple)
 
             # Also need to replace filename in args with hash
-            if k in self.args:
-                self.args[self.args.index(k)] = (
+            if k in args:
+                args[args.index(k)] = (
                         '@{GGHASH:' + next_hash + '}')
         for ig in self.ggth_infiles:
             curr_thunk = ig[0]
@@ -331,8 +592,8 @@ class GGThunk(object):
             all_infiles.append(next_tuple)
 
             # Also need to replace filename in args with hash
-            if curr_thunk.get_outname(curr_search) in self.args:
-                self.args[self.args.index(curr_thunk.get_outname(curr_search))] = (
+            if curr_thunk.get_outname(curr_search) in args:
+                args[args.index(curr_thunk.get_outname(curr_search))] = (
                         '@{GGHASH:' + hash_outname + '}')
 
         return all_infiles
@@ -341,9 +602,9 @@ class GGThunk(object):
     Function to compute Thunk's order
     """
     def __compute_order(self):
+        # With no ggth_infiles, the order is 1
         self.order = 0
-        for inf in self.ggth_infiles:
-            curr_thunk = inf[0]
+        for curr_thunk in self.deps:
             self.order = max(curr_thunk.get_order(), self.order)
         self.order += 1
 
@@ -356,21 +617,25 @@ class GGThunk(object):
         print("\tEXECUTABLE: x86 ELF binary")
         print("\tGGTHUNK: GGThunk object")
 
-    """
-    Generate hash from a file
-    """
-    def __gen_hash_file(self, h_file):
-        in_proc = sp.Popen(['gg-hash', h_file], stdout=sp.PIPE)
-        out = in_proc.communicate()[0].strip()
-
-        return out.decode('utf-8')
-
 """
 GG class. Interfaces with the GG platform, creates GGThunk placeholders,
 and creates graph.
 """
 class GG(object):
-    def __init__(self, cleanenv=True):
+    def __init__(self, cleanenv=True, hash_jobs=None,
+                 ingest=gg_ingest.DEFAULT_MODE, gen_jobs=None,
+                 gen_executor='thread', memo=True):
+        self.hash_jobs = hash_jobs
+        self.use_memo = memo
+        self.ingest_mode = ingest
+        self.gen_jobs = gen_jobs
+        self.gen_executor = gen_executor
+        self.gen_stats = None
+
+        # Thunks that are only in a graph manifest: hash -> (manifest,
+        # offset, length, hashes of the thunks it depends on)
+        self.manifest_thunks = {}
+
         if cleanenv:
             self.clean_env()
 
@@ -393,14 +658,21 @@ class GG(object):
     Initialize gg directories
     """
     def initialize(self):
-        # Make blobs and hash_cache directory as well
-        if not os.path.exists('.gg/hash_cache'):
-            os.makedirs('.gg/hash_cache')
-
+        # Make blobs directory as well
         if not os.path.exists('.gg/blobs'):
             os.makedirs('.gg/blobs')
             print("Initialized gg directory at: " + os.getcwd() + "/.gg")
 
+        # Load the whole hash cache index up front
+        self.hash_cache = HashCache()
+
+        # Registry of file infiles shared by all thunks of this session
+        self.registry = InfileRegistry(self.hash_cache,
+                                       ingest_mode=self.ingest_mode)
+
+        # Thunks produced by previous runs
+        self.memo = gg_thunk_memo.ThunkMemo() if self.use_memo else None
+
     """
     Infer build from make builds
     """
@@ -411,6 +683,7 @@ class GG(object):
                 make_cmd += '1'
             else:
                 make_cmd += str(np)
+        gg_metrics.count('subprocesses')
         in_proc = sp.Popen(['gg-infer', make_cmd], stdout=sp.PIPE)
         out = in_proc.communicate()[0]
         return out
@@ -420,112 +693,385 @@ class GG(object):
     """
     def infer_build_mgcc(self, gcc_cmd):
         cmd = ['model-gcc'] + gcc_cmd.split()
+        gg_metrics.count('subprocesses')
         in_proc = sp.Popen(cmd, stdout=sp.PIPE)
         out = in_proc.communicate()[0]
         return out
 
     """
-    Generate gg-force command
+    Generate gg-force command, without the targets. engine can
+    carry engine arguments (e.g. 'remote=<ip>:<port>'); jobs
+    goes first since it applies to the engines after it.
     """
-    def __get_force_comm(self, inputs, showstatus, env, genfunc, numjobs):
-        if env == 'lambda':
-            os.environ['GG_LAMBDA'] = '1'
-        elif env == 'remote':
-            os.environ['GG_REMOTE'] = '1'
+    def force_command(self, engine, jobs, download):
+        cmd = ['gg-force', '--no-status']
+        if not download:
+            cmd.append('--no-download')
+        if jobs is not None:
+            cmd.extend(['--jobs', str(jobs)])
+        cmd.append('--engine=' + engine)
+        return cmd
 
-        if genfunc:
-            os.environ['GG_GENERIC_FUNCTION'] = '1'
+    """
+    Function called by user to run gg-gc: evicts the least recently
+    used blobs not reachable from a pinned target or a live
+    placeholder until .gg takes at most max_bytes. pin and unpin
+    take GGThunks or placeholder filenames. A rescan looks for
+    placeholders in paths (by default, the directory that contains
+    .gg). Returns gg-gc's summary as a dict (blobs, bytes,
+    evicted_blobs, evicted_bytes, ...).
+    """
+    def gc(self, max_bytes=None, pin=[], unpin=[], rescan=False,
+           dry_run=False, paths=[]):
+        def target_name(tgt):
+            return tgt.get_hash() if isinstance(tgt, GGThunk) else tgt
+
+        cmd = ['gg-gc']
+        if max_bytes is not None:
+            cmd.append('--max-bytes=%d' % max_bytes)
+        for tgt in pin:
+            cmd.append('--pin=' + target_name(tgt))
+        for tgt in unpin:
+            cmd.append('--unpin=' + target_name(tgt))
+        if rescan:
+            cmd.append('--rescan')
+        if dry_run:
+            cmd.append('--dry-run')
+        cmd.extend(paths)
+
+        gg_metrics.count('subprocesses')
+        gc_proc = sp.run(cmd, stdout=sp.PIPE)
+        if gc_proc.returncode != 0:
+            print("gg-gc failed")
+            sys.exit(1)
 
-        nj_inp = ['--jobs', str(numjobs)]
+        # Memo entries whose thunks were evicted are of no use anymore
+        if self.memo is not None and not dry_run:
+            self.memo.compact()
 
-        cmd_start = ['gg-force']
-        if showstatus:
-            cmd_start.append('--status')
-        if env == 'lambda':
-            cmd_start.append('--engine=lambda')
-        elif env == 'remote':
-            cmd_start.append('--engine=remote')
-        elif env == 'local':
-            cmd_start.append('--engine=local')
-        elif env == 'meow':
-            cmd_start.append('--engine=meow')
+        return gg_gc.parse_summary(gc_proc.stdout.decode('ascii'))
 
+    """
+    Function called by user to force targets: launches
+    gg-force in the background and returns a gg_force.ForceRun.
+    targets are GGThunks that create_thunks has generated, or
+    placeholder filenames. Each target gets a future (run.futures
+    or run.future(target)) that resolves to a ForceResult as soon
+    as that target is reduced, while the rest of the graph is
+    still running. run.stats() returns throughput and latency
+    counters, which are also passed to on_status and, with
+    status=True, printed as they change.
+    """
+    def force(self, targets, engine='local', jobs=None, status=True,
+              on_status=None, download=True):
+        if not isinstance(targets, list):
+            targets = [targets]
 
-        cmd = cmd_start + nj_inp + inputs
-        return cmd
+        if not targets:
+            print("List of targets is empty!")
+            return
+
+        named_targets = []
+        for tgt in targets:
+            if isinstance(tgt, GGThunk):
+                named_targets.append((tgt.get_outname(''), tgt.get_hash()))
+            elif isinstance(tgt, str):
+                thunk_hash = gg_thunk.read_placeholder(tgt)
+                if thunk_hash is None:
+                    print("not a placeholder: " + tgt)
+                    sys.exit(1)
+                named_targets.append((tgt, thunk_hash))
+            else:
+                print("invalid target: must be a GGThunk object or a placeholder")
+                sys.exit(1)
+
+        cmd = self.force_command(engine, jobs, download)
+        return gg_force.ForceRun(cmd, named_targets, status=status,
+                                 on_status=on_status)
 
     """
-    Multi-threading function for creating placeholders in parallel
+    Hash all file infiles of the graph that are not in hash_cache
+    in one batch, spread across processes, so that thunk
+    generation only hits the cache
     """
-    @threaded
-    def __distr_thunk_gen(self, my_chunk):
-        for c in my_chunk:
-            c.generate_thunk(0)
+    def __prehash_infiles(self, inputs):
+        filenames = []
+        visited = set()
+        stack = list(inputs)
+        while stack:
+            curr_thunk = stack.pop()
+            if curr_thunk.node_id in visited:
+                continue
+            visited.add(curr_thunk.node_id)
 
-        all_out = []
-        for inf in my_chunk:
-            all_out.extend(inf.get_all_outname())
+            filenames.extend(curr_thunk.files)
+            stack.extend(curr_thunk.deps)
 
-        return all_out
+        self.registry.prefetch(filenames, self.hash_jobs)
+
+    """
+    Serialize the whole graph under inputs on the work-stealing
+    scheduler, writing a placeholder for every target as soon as
+    it is serialized. With a gg_thunk.GraphWriter, new thunks go
+    to the graph manifest instead of .gg/blobs, and targets to its
+    index instead of placeholders.
+    """
+    def __schedule_thunk_gen(self, inputs, graph=None):
+        visited = set()
+        nodes = []
+        for inp in inputs:
+            nodes.extend(inp.topological_order(0, visited))
+
+        targets = set(inp.node_id for inp in inputs)
+
+        # Thunks from an earlier manifest that the targets or the new
+        # thunks depend on go into this one, or into .gg/blobs
+        roots = [inp.thunk_hash for inp in inputs]
+        for curr_thunk in nodes:
+            roots.extend(dep.thunk_hash for dep in curr_thunk.deps)
+        self.__carry_manifest_thunks(roots, graph)
+
+        def deps(curr_thunk):
+            return curr_thunk.deps
+
+        memo_entries = {}
+
+        # Blobs read and written, and placeholders written, for gg-gc
+        accessed = set()
+        accessed_thunks = []
+        placeholders = []
+
+        def prepare(curr_thunk):
+            memo_key = None
+            if self.memo is not None:
+                memo_key = curr_thunk.memo_key()
+                entry = None if memo_key is None else self.memo.get(memo_key)
+                if entry is not None:
+                    gg_metrics.count('memo_hits')
+                    thunk_hash, infiles = entry
+                    accessed.update(infiles)
+                    return None, thunk_hash
+
+                gg_metrics.count('memo_misses')
+
+            fn, args = curr_thunk.prepare_thunk(self.registry)
+            # values and executables
+            infiles = ([gg_thunk.data_hash(v) for v in args[3]] +
+                       [gg_thunk.data_hash(e) for e in args[5]])
+            accessed.update(infiles)
+            if graph is not None:
+                fn = gg_thunk.encode
+
+            if memo_key is not None:
+                memo_entries[curr_thunk.node_id] = (memo_key, infiles)
+            return fn, args
+
+        def finish(curr_thunk, result):
+            memo_entry = memo_entries.pop(curr_thunk.node_id, None)
+            if isinstance(result, tuple):
+                # Not in .gg/blobs, so not memoized: gg-force reads it
+                # from the manifest
+                thunk_hash, body = result
+                graph.add(thunk_hash, body,
+                          tuple(dep.thunk_hash for dep in curr_thunk.deps))
+            else:
+                thunk_hash = result
+                accessed_thunks.append(thunk_hash)
+                if memo_entry is not None:
+                    memo_key, infiles = memo_entry
+                    self.memo.put(memo_key, thunk_hash, infiles)
+
+            curr_thunk.set_hash(thunk_hash)
+            if curr_thunk.node_id in targets:
+                write_target(curr_thunk)
+
+        def write_target(curr_thunk):
+            if graph is None:
+                curr_thunk.write_placeholder()
+                placeholders.append((curr_thunk.thunk_hash,
+                                     curr_thunk.get_outname('')))
+            else:
+                graph.add_target(curr_thunk.thunk_hash,
+                                 curr_thunk.get_outname(''))
+
+        sched = gg_sched.Scheduler(self.gen_jobs, self.gen_executor)
+        self.gen_stats = sched.run(nodes, deps, prepare, finish)
+
+        # Targets that were already serialized (e.g. as a dependency
+        # of an earlier call) still need their placeholder
+        generated = set(n.node_id for n in nodes)
+        for inp in inputs:
+            if inp.node_id not in generated:
+                write_target(inp)
+
+        if self.memo is not None:
+            self.memo.flush()
+
+        gg_gc.record(itertools.chain(accessed, accessed_thunks), placeholders)
+
+    """
+    Copy the thunks under roots (hashes) that are only in an earlier
+    graph manifest, dependencies first, into graph, or write them into
+    .gg/blobs if graph is None
+    """
+    def __carry_manifest_thunks(self, roots, graph):
+        order = []
+        seen = set()
+        stack = [(thunk_hash, False) for thunk_hash in roots]
+        while stack:
+            thunk_hash, expanded = stack.pop()
+            if expanded:
+                order.append(thunk_hash)
+                continue
+            if (thunk_hash in seen or thunk_hash not in self.manifest_thunks
+                or (graph is not None and thunk_hash in graph.entries)):
+                continue
+            seen.add(thunk_hash)
+            stack.append((thunk_hash, True))
+            stack.extend((dep, False)
+                         for dep in self.manifest_thunks[thunk_hash][3])
+
+        written = []
+        for thunk_hash in order:
+            manifest, offset, length, deps = self.manifest_thunks[thunk_hash]
+            body = gg_thunk.read_graph_thunk(manifest, thunk_hash, offset,
+                                             length)
+            if graph is not None:
+                graph.add(thunk_hash, body, deps)
+            else:
+                gg_thunk.write(gg_thunk.MAGIC_NUMBER + body)
+                del self.manifest_thunks[thunk_hash]
+                written.append(thunk_hash)
+
+        if written:
+            gg_gc.record(written, [])
 
     """
     Function called by user to create thunks.
     Function will first create placeholders if needed
     by first creating all thunks (i.e. generating graph).
-    This function will NOT execute the thunks
+    This function will NOT execute the thunks.
+
+    inputs is a list of targets or any other iterable (e.g. a
+    generator). Targets are generated window targets at a time:
+    each window is serialized, its placeholders written and its
+    target names passed to on_target and written to
+    targets_file (one per line) before the next one is pulled.
+    Iterables default to windows of STREAM_WINDOW targets, and
+    their targets let go of their dependencies once generated,
+    so memory use does not grow with the number of targets.
+
+    With manifest set, the graph is written to that file (see
+    gg_thunk.GraphWriter) rather than to a blob per thunk and a
+    placeholder per target; gg-force --graph=<manifest> forces
+    all of its targets.
+
+    Returns the list of target names for a list input, and the
+    number of targets otherwise.
     """
-    def create_thunks(self, inputs):
+    @gg_metrics.entry_point('create_thunks')
+    def create_thunks(self, inputs, window=None, on_target=None,
+                      targets_file=None, manifest=None):
         start = now()
         # Perform sanity checks
-        if not inputs:
+        if isinstance(inputs, (GGThunk, str)):
+            inputs = [inputs]
+
+        if isinstance(inputs, list):
+            if not inputs:
+                print("List of inputs is empty!")
+                return
+            stream = False
+            if window is None:
+                window = len(inputs)
+        else:
+            stream = True
+            if window is None:
+                window = STREAM_WINDOW
+
+        inputs = iter(inputs)
+        batch = list(itertools.islice(inputs, window))
+        if not batch:
             print("List of inputs is empty!")
             return
 
-        if not isinstance(inputs, list):
-            inputs = [inputs]
-
         # Check for valid inputs
         # If input type is GGThunk, the actual thunks need to be created
         # along with a placeholder per input
         cmd_inp = []
-        if isinstance(inputs[0], GGThunk):
-            # Set the input name before generating...needed to be
-            # consistent with placeholder
-            out_index = 0
-            for inp in inputs:
-                if inp.get_all_outname() == []:
-                    next_filename = 'my_output_' + str(out_index) + '.out'
-                    inp.add_outname(next_filename)
-                    out_index += 1
-
-            # Multithread thunk generation
-            all_threads = []
-            num_cores = mp.cpu_count()
-            if len(inputs) < num_cores:
-                for inp in inputs:
-                    all_threads.append(self.__distr_thunk_gen([inp]))
-            else:
-                batch_size = int(len(inputs) / num_cores)
-                for i in range(num_cores):
-                    if i < num_cores-1:
-                        all_threads.append(self.__distr_thunk_gen(inputs[i*batch_size:i*batch_size+batch_size]))
-                    else:
-                        all_threads.append(self.__distr_thunk_gen(inputs[i*batch_size:]))
-
-            for at in all_threads:
-                cmd_inp.extend(at.result())
-
-            if len(cmd_inp) != len(inputs):
-                print("Error: cmd_inp != inputs")
-                sys.exit(1)
-        elif isinstance(inputs[0], str):
-            print("Nothing to generate...")
-            cmd_inp = inputs
-        else:
-            print("invalid input: must be a GGThunk object")
-            sys.exit(1)
+        num_targets = 0
+        out_index = 0
+        fout = open(targets_file, 'w') if targets_file else None
+        graph = gg_thunk.GraphWriter(manifest) if manifest else None
+        try:
+            while batch:
+                if all(isinstance(inp, GGThunk) for inp in batch):
+                    # Set the input name before generating...needed to be
+                    # consistent with placeholder
+                    for inp in batch:
+                        if inp.get_all_outname() == []:
+                            next_filename = 'my_output_' + str(out_index) + '.out'
+                            inp.add_outname(next_filename)
+                            out_index += 1
+
+                    self.__prehash_infiles(batch)
+
+                    self.__schedule_thunk_gen(batch, graph)
+
+                    batch_out = []
+                    for inp in batch:
+                        batch_out.extend(inp.get_all_outname())
+
+                    if len(batch_out) != len(batch):
+                        print("Error: cmd_inp != inputs")
+                        sys.exit(1)
+
+                    if stream:
+                        for inp in batch:
+                            inp.release()
+                elif all(isinstance(inp, str) for inp in batch):
+                    print("Nothing to generate...")
+                    batch_out = batch
+                else:
+                    print("invalid input: must be a GGThunk object")
+                    sys.exit(1)
+
+                for name in batch_out:
+                    if on_target is not None:
+                        on_target(name)
+                    if fout is not None:
+                        fout.write(name + '\n')
+
+                num_targets += len(batch_out)
+                if not stream:
+                    cmd_inp.extend(batch_out)
+
+                batch = list(itertools.islice(inputs, window))
+
+            if graph is not None:
+                # The thunks of the manifest that this one replaces
+                manifest = os.path.abspath(manifest)
+                self.__carry_manifest_thunks(
+                    [thunk_hash for thunk_hash, entry
+                     in self.manifest_thunks.items()
+                     if entry[0] == manifest], graph)
+
+                graph.close()
+                for thunk_hash, entry in graph.entries.items():
+                    self.manifest_thunks[thunk_hash] = (manifest,) + entry
+                graph = None
+        finally:
+            if fout is not None:
+                fout.close()
+            if graph is not None:
+                graph.abort()
 
         end = now()
         delta = end - start
         print("Time to generate thunks: %.3f seconds" % delta)
-        return cmd_inp
+        if self.memo is not None and self.memo.hits:
+            memo_stats = self.memo.stats()
+            print("Reused %d of %d thunks from previous runs" %
+                  (memo_stats['reused'],
+                   memo_stats['reused'] + memo_stats['serialized']))
+        return num_targets if stream else cmd_inp
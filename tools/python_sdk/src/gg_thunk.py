@@ -0,0 +1,274 @@
+import os
+import re
+import tempfile
+import threading
+
+import gg_hash
+from gg_hash import MAGIC_NUMBER
+
+"""
+Native thunk writer for ggSDK. Mirrors gg::thunk::ThunkWriter and
+ThunkPlaceholder (src/thunk/thunk_writer.cc, src/thunk/placeholder.cc) so
+that the SDK does not have to fork gg-create-thunk for every thunk.
+
+The gg.protobuf.Thunk message (src/protobufs/thunk.proto) is encoded by
+hand, following the field order and default-skipping rules of the C++
+protobuf serializer, so the output is byte-identical to gg-create-thunk.
+"""
+
+GRAPH_MAGIC = b'##GGGRAPH##'
+
+SHEBANG_DIRECTIVE = '#!/usr/bin/env gg-force-and-run'
+LIBRARY_DIRECTIVE = 'OUTPUT_FORMAT("elf64-x86-64")/*'
+
+LINKER_SCRIPT_EXTENSIONS = ('so', 'a', 'o', 's', 'S', 'sho')
+SO_PATTERN = re.compile(r'.+\.so[\.\d+]+')
+
+# Protobuf wire types
+WIRE_VARINT = 0
+WIRE_LENGTH_DELIMITED = 2
+
+"""
+Encode an unsigned integer as a protobuf varint
+"""
+def _varint(value):
+    out = bytearray()
+    while True:
+        to_write = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(to_write | 0x80)
+        else:
+            out.append(to_write)
+            return bytes(out)
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+def _length_delimited(field, data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return _key(field, WIRE_LENGTH_DELIMITED) + _varint(len(data)) + data
+
+"""
+Thunk::DataItem to string, as in data_to_string() in src/thunk/thunk.cc
+"""
+def data_to_string(item):
+    if isinstance(item, tuple):
+        if item[1]:
+            return item[0] + '=' + item[1]
+        return item[0]
+    return item
+
+"""
+Hash of a data item (a (hash, filename) tuple or a 'hash=filename'
+string)
+"""
+def data_hash(item):
+    return item[0] if isinstance(item, tuple) else item.split('=', 1)[0]
+
+"""
+Serialize a gg.protobuf.Function message
+"""
+def encode_function(func_hash, args, envars):
+    out = b''
+    if func_hash:
+        out += _length_delimited(1, func_hash)
+    for arg in args:
+        out += _length_delimited(2, arg)
+    for envar in envars:
+        out += _length_delimited(3, envar)
+    return out
+
+"""
+Serialize a gg.protobuf.Thunk message. values, thunks and executables are
+lists of 'hash', 'hash=name' or (hash, name) items; like the
+std::multimap used by gg::thunk::Thunk, they are ordered by hash with
+insertion order kept among equal hashes.
+"""
+def encode_thunk(func_hash, args, envars, values, thunks, executables,
+                 outputs, timeout=0):
+    out = _length_delimited(1, encode_function(func_hash, args, envars))
+
+    for field, items in ((2, values), (3, thunks), (4, executables)):
+        for item in sorted(items, key=data_hash):
+            out += _length_delimited(field, data_to_string(item))
+
+    for output in outputs:
+        out += _length_delimited(5, output)
+
+    if timeout:
+        out += _key(6, WIRE_VARINT) + _varint(timeout)
+
+    return out
+
+"""
+Serialized thunk, as stored in .gg/blobs
+"""
+def serialize(*args, **kwargs):
+    return MAGIC_NUMBER + encode_thunk(*args, **kwargs)
+
+"""
+Create dst atomically through a temporary file in the same directory,
+like roost::atomic_create
+"""
+def atomic_create(contents, dst, mode=None):
+    dst_dir = os.path.dirname(dst) or '.'
+    fd, tmp_name = tempfile.mkstemp(dir=dst_dir,
+                                    prefix=os.path.basename(dst) + '.')
+    try:
+        if contents:
+            os.write(fd, contents)
+        if mode is not None:
+            os.fchmod(fd, mode)
+    finally:
+        os.close(fd)
+
+    os.rename(tmp_name, dst)
+
+"""
+Write a serialized thunk into blobs_dir and return its hash
+"""
+def write(serialized, blobs_dir='.gg/blobs'):
+    thunk_hash = gg_hash.compute(serialized, 'T')
+    blob_path = os.path.join(blobs_dir, thunk_hash)
+
+    if not os.path.exists(blob_path):
+        atomic_create(serialized, blob_path, 0o400)
+
+    return thunk_hash
+
+"""
+Serialize a thunk (see encode_thunk), write it into blobs_dir and
+return its hash. Only takes plain data, so it can run in a worker
+process.
+"""
+def create(func_hash, args, envars, values, thunks, executables, outputs,
+           blobs_dir='.gg/blobs'):
+    return write(serialize(func_hash, args, envars, values, thunks,
+                           executables, outputs), blobs_dir)
+
+"""
+Serialize a thunk without writing it: returns its hash and its
+gg.protobuf.Thunk message, for a GraphWriter
+"""
+def encode(func_hash, args, envars, values, thunks, executables, outputs):
+    body = encode_thunk(func_hash, args, envars, values, thunks, executables,
+                        outputs)
+    return gg_hash.compute(MAGIC_NUMBER + body, 'T'), body
+
+"""
+Serialize a gg.protobuf.GraphIndex message from (hash, name) pairs
+"""
+def encode_graph_index(targets):
+    out = b''
+    for thunk_hash, name in targets:
+        out += _length_delimited(1, _length_delimited(1, thunk_hash) +
+                                    _length_delimited(2, name))
+    return out
+
+class GraphWriter(object):
+    """
+    Writes a whole graph into one file that gg-force --graph reads in a
+    single pass, instead of a blob per thunk and a placeholder per
+    target (see src/thunk/graph_manifest.hh):
+
+        GRAPH_MAGIC
+        varint length, Thunk message     (one per thunk, dependencies first)
+        ...
+        varint 0
+        varint length, GraphIndex message
+
+    The file only appears under its name once close() is called.
+    entries maps the hash of every thunk in it to (offset, length,
+    hashes of the thunks it depends on), so that later graphs can copy
+    it (see read_graph_thunk).
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.targets = []
+        self.thunks = 0
+        self.entries = {}
+        self.lock = threading.Lock()
+
+        fd, self.tmp_name = tempfile.mkstemp(
+            dir=os.path.dirname(filename) or '.',
+            prefix=os.path.basename(filename) + '.')
+        self.fout = os.fdopen(fd, 'wb')
+        self.fout.write(GRAPH_MAGIC)
+
+    """
+    Append a thunk message; the thunks it depends on (deps, their
+    hashes) must already be in
+    """
+    def add(self, thunk_hash, body, deps=()):
+        record = _varint(len(body)) + body
+        with self.lock:
+            offset = self.fout.tell() + len(record) - len(body)
+            self.fout.write(record)
+            self.thunks += 1
+            self.entries[thunk_hash] = (offset, len(body), deps)
+
+    def add_target(self, thunk_hash, name):
+        with self.lock:
+            self.targets.append((thunk_hash, name))
+
+    def close(self):
+        index = encode_graph_index(self.targets)
+        self.fout.write(_varint(0) + _varint(len(index)) + index)
+        self.fout.close()
+        os.rename(self.tmp_name, self.filename)
+
+    def abort(self):
+        self.fout.close()
+        os.unlink(self.tmp_name)
+
+"""
+Thunk message of thunk_hash at offset in a graph manifest
+"""
+def read_graph_thunk(filename, thunk_hash, offset, length):
+    with open(filename, 'rb') as fin:
+        fin.seek(offset)
+        body = fin.read(length)
+
+    if gg_hash.compute(MAGIC_NUMBER + body, 'T') != thunk_hash:
+        raise RuntimeError('%s no longer has thunk %s' % (filename, thunk_hash))
+
+    return body
+
+"""
+Placeholder type is guessed from the filename extension, as in
+ThunkPlaceholder::write()
+"""
+def is_linker_script(filename):
+    extension = filename[filename.rfind('.') + 1:]
+    return (extension in LINKER_SCRIPT_EXTENSIONS or
+            SO_PATTERN.fullmatch(filename) is not None)
+
+"""
+Write a placeholder for thunk_hash at filename
+"""
+def write_placeholder(filename, thunk_hash):
+    if is_linker_script(filename):
+        contents = '%s\n%s\n*/' % (LIBRARY_DIRECTIVE, thunk_hash)
+        atomic_create(contents.encode('utf-8'), filename)
+    else:
+        contents = '%s\n%s\n' % (SHEBANG_DIRECTIVE, thunk_hash)
+        atomic_create(contents.encode('utf-8'), filename)
+        os.chmod(filename, 0o755)
+
+"""
+Hash in the placeholder at filename, or None if it is not a placeholder,
+as in ThunkPlaceholder::read()
+"""
+def read_placeholder(filename):
+    with open(filename, 'rb') as fin:
+        contents = fin.read(4096)
+
+    for directive in (SHEBANG_DIRECTIVE, LIBRARY_DIRECTIVE):
+        directive = directive.encode('utf-8')
+        if contents.startswith(directive):
+            fields = contents[len(directive):].split()
+            return fields[0].decode('ascii') if fields else None
+
+    return None
@@ -0,0 +1,165 @@
+import os
+import hashlib
+import itertools
+import threading
+
+import gg_thunk
+
+"""
+Persistent thunk memo for ggSDK. Maps a key computed from a thunk's
+inputs before they are resolved (function and infile paths with their
+(st_dev, st_ino, st_size, st_mtime_ns, st_ctime_ns), hashes of the
+thunks it depends on, args, envars and outputs; see GGThunk.memo_key)
+to the hash of the thunk that was produced for them and the hashes of
+its file infiles.
+A re-run of an SDK script then reuses unchanged thunks without
+resolving their infiles, hashing or serializing anything.
+
+Like the hash index (gg_hash_cache), a key relies on the stat tuple
+of a file changing with its contents; ctime changes on every write,
+even if the mtime is set back afterwards. An entry is only used while its
+thunk and infile blobs are still in the blobs directory. The memo is
+an append-only log of lines
+
+    <key> <thunk-hash> [<infile-hash>...]
+
+read in full at startup; new entries are appended in one write by
+flush().
+"""
+
+THUNK_MEMO = '.gg/thunk_memo'
+
+# Bump when the key computation changes
+KEY_VERSION = b'3'
+
+# Compact the log at load time when it has at least this many records
+COMPACTION_THRESHOLD = 4096
+
+"""
+Memo key for the tuple of a thunk's unresolved inputs
+"""
+def key(inputs):
+    return hashlib.sha256(KEY_VERSION + b'\0' +
+                          repr(inputs).encode('utf-8')).hexdigest()
+
+class ThunkMemo(object):
+    def __init__(self, path=THUNK_MEMO, blobs_dir='.gg/blobs'):
+        self.path = path
+        self.blobs_dir = blobs_dir
+        self.entries = {}
+        self.log_records = 0
+        self.pending = []
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.load()
+
+    """
+    Read the whole log into memory, compacting it if needed
+    """
+    def load(self):
+        self.entries = {}
+        self.log_records = 0
+
+        try:
+            with open(self.path, 'rb') as fin:
+                contents = fin.read()
+        except FileNotFoundError:
+            return
+
+        # The last line may be partial if a writer crashed; it is skipped
+        for line in contents.split(b'\n')[:-1]:
+            record = line.decode('ascii').split()
+            if len(record) < 2:
+                continue
+            self.entries[record[0]] = (record[1], tuple(record[2:]))
+            self.log_records += 1
+
+        if self.log_records >= COMPACTION_THRESHOLD:
+            self.compact()
+
+    """
+    Drop the entries whose blobs are no longer in blobs_dir, and
+    rewrite the log with only the live entries if anything changed
+    """
+    def compact(self):
+        self.flush()
+
+        self.entries = {k: v for k, v in self.entries.items()
+                        if self.__live(v)}
+        if self.log_records == len(self.entries):
+            return
+
+        contents = ''.join(self.__record(k, v)
+                           for k, v in self.entries.items())
+        gg_thunk.atomic_create(contents.encode('ascii'), self.path, 0o644)
+        self.log_records = len(self.entries)
+
+    """
+    (thunk hash, infile hashes) memoized for a key, or None if there
+    is none or its blobs are gone. Counts hits and misses.
+    """
+    def get(self, memo_key):
+        entry = self.entries.get(memo_key)
+        if entry is not None and not self.__live(entry):
+            entry = None
+
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return entry
+
+    """
+    Record the thunk hash and the infile hashes produced for a key.
+    The record is written by the next flush().
+    """
+    def put(self, memo_key, thunk_hash, infiles=()):
+        entry = (thunk_hash, tuple(infiles))
+
+        with self.lock:
+            if self.entries.get(memo_key) == entry:
+                return
+
+            self.entries[memo_key] = entry
+            self.pending.append(self.__record(memo_key, entry))
+
+    """
+    Append the records of the entries put since the last flush, in a
+    single O_APPEND write
+    """
+    def flush(self):
+        with self.lock:
+            records, self.pending = self.pending, []
+            if not records:
+                return
+
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                         0o644)
+            try:
+                os.write(fd, ''.join(records).encode('ascii'))
+            finally:
+                os.close(fd)
+
+            self.log_records += len(records)
+
+    def __live(self, entry):
+        thunk_hash, infiles = entry
+        return all(os.path.exists(os.path.join(self.blobs_dir, h))
+                   for h in itertools.chain((thunk_hash,), infiles))
+
+    def __record(self, memo_key, entry):
+        return ' '.join((memo_key, entry[0]) + entry[1]) + '\n'
+
+    """
+    How many lookups were reused from previous runs
+    """
+    def stats(self):
+        return {'reused': self.hits, 'serialized': self.misses,
+                'entries': len(self.entries)}
+
+    def __len__(self):
+        return len(self.entries)
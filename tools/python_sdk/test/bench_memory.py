@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src'))
+
+from gg_sdk import GG, GGThunk
+
+"""
+Memory benchmark for the GGThunk representation: builds a graph of
+--nodes thunks shaped like the excamera pipeline (chains of encoder
+thunks sharing a long list of identical flags, each with a few
+per-thunk arguments and a dependency on the previous thunk of its
+chain) and reports the bytes allocated per thunk. Needs a statically
+linked test_program (see run_test.sh).
+"""
+
+test_prog_bin = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                             'test_program'))
+
+# ~25 flags repeated on every thunk, like VPXENC in the excamera example.
+# The command line is formatted and split per thunk, as the examples do.
+FLAGS = ' '.join([
+    '--ivf', '--codec=vp8', '--good', '--cpu-used=0', '--end-usage=cq',
+    '--min-q=0', '--max-q=63', '--cq-level=10', '--buf-initial-sz=10000',
+    '--buf-optimal-sz=20000', '--buf-sz=40000', '--undershoot-pct=100',
+    '--passes=2', '--auto-alt-ref=1', '--threads=1', '--token-parts=0',
+    '--tune=ssim', '--target-bitrate=4294967295', '--kf-max-dist=999999',
+    '--lag-in-frames=25', '--noise-sensitivity=0', '--sharpness=0',
+    '--static-thresh=0', '--arnr-maxframes=0', '--arnr-strength=3'])
+CMD = FLAGS + ' --output={num:08d}.ivf --input={num:08d}.y4m'
+
+def build_graph(nodes, chain_length):
+    targets = []
+    prev = None
+    for i in range(nodes):
+        if i % chain_length == 0:
+            prev = None
+        args = CMD.format(num=i).split()
+        if prev is not None:
+            args.append(prev)
+        thunk = GGThunk(exe='test_program', outname='%08d.ivf' % i,
+                        exe_args=args, args_infiles=False)
+        if prev is not None:
+            thunk.add_infile(prev)
+        prev = thunk
+        if i % chain_length == chain_length - 1:
+            targets.append(thunk)
+    return targets
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, default=1000000)
+    parser.add_argument('--chain-length', type=int, default=10)
+    args = parser.parse_args()
+
+    if not os.path.exists(test_prog_bin):
+        print("test_program not found: g++ -static test_program.cc -o test_program")
+        sys.exit(1)
+
+    workdir = tempfile.mkdtemp(prefix='gg-bench-')
+    os.symlink(test_prog_bin, os.path.join(workdir, 'test_program'))
+    os.chdir(workdir)
+
+    try:
+        GG()
+
+        tracemalloc.start()
+        base, _ = tracemalloc.get_traced_memory()
+        targets = build_graph(args.nodes, args.chain_length)
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print('thunks: %d  targets: %d' % (args.nodes, len(targets)))
+        print('bytes per thunk: %.1f' % ((used - base) / args.nodes))
+        print('total: %.1f MiB' % ((used - base) / (1 << 20)))
+    finally:
+        os.chdir('/')
+        shutil.rmtree(workdir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import multiprocessing as mp
+from timeit import default_timer as now
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src'))
+
+from gg_sdk import GG, GGThunk
+import gg_sched
+
+"""
+Scaling benchmark for thunk generation: times create_thunks on a wide
+graph (independent thunks) and on a deep one (layers of thunks, each
+depending on two thunks of the layer below) with 1, 2, 4, ... workers.
+Needs a statically linked test_program (see run_test.sh).
+"""
+
+test_prog_bin = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                             'test_program'))
+
+def wide_graph(width):
+    return [GGThunk(exe='test_program', exe_args=['--n=%d' % i])
+            for i in range(width)]
+
+def deep_graph(width, depth):
+    layer = [GGThunk(exe='test_program', exe_args=['--n=%d' % i])
+             for i in range(width)]
+    for d in range(depth):
+        layer = [GGThunk(exe='test_program',
+                         exe_args=[layer[i], layer[(i + 1) % width],
+                                   '--d=%d' % d])
+                 for i in range(width)]
+    return layer
+
+def job_counts(max_jobs):
+    jobs = 1
+    while jobs < max_jobs:
+        yield jobs
+        jobs *= 2
+    yield max_jobs
+
+def run(make_graph, jobs, executor):
+    gg = GG(cleanenv=False, gen_jobs=jobs, gen_executor=executor)
+    targets = make_graph()
+    start = now()
+    gg.create_thunks(targets)
+    elapsed = now() - start
+
+    # Start the next run from an empty blobs directory
+    shutil.rmtree('.gg')
+    for t in targets:
+        for outname in t.get_all_outname():
+            os.remove(outname)
+    return elapsed, gg.gen_stats
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--width', type=int, default=20000)
+    parser.add_argument('--deep-width', type=int, default=64)
+    parser.add_argument('--depth', type=int, default=300)
+    parser.add_argument('--max-jobs', type=int, default=mp.cpu_count())
+    parser.add_argument('--executor', choices=gg_sched.EXECUTORS,
+                        action='append')
+    args = parser.parse_args()
+
+    if not os.path.exists(test_prog_bin):
+        print("test_program not found: g++ -static test_program.cc -o test_program")
+        sys.exit(1)
+
+    graphs = [
+        ('wide', lambda: wide_graph(args.width)),
+        ('deep', lambda: deep_graph(args.deep_width, args.depth)),
+    ]
+
+    workdir = tempfile.mkdtemp(prefix='gg-bench-')
+    os.symlink(test_prog_bin, os.path.join(workdir, 'test_program'))
+    os.chdir(workdir)
+
+    print('%-6s %-8s %5s %10s %8s %8s' %
+          ('graph', 'executor', 'jobs', 'seconds', 'speedup', 'steals'))
+    try:
+        for executor in args.executor or gg_sched.EXECUTORS:
+            for name, make_graph in graphs:
+                base = None
+                for jobs in job_counts(args.max_jobs):
+                    elapsed, stats = run(make_graph, jobs, executor)
+                    if base is None:
+                        base = elapsed
+                    print('%-6s %-8s %5d %10.3f %8.2f %8d' %
+                          (name, executor, jobs, elapsed, base / elapsed,
+                           stats['steals']))
+    finally:
+        os.chdir('/')
+        shutil.rmtree(workdir)
+
+if __name__ == '__main__':
+    main()
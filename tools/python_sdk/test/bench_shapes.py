@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import platform
+from timeit import default_timer as now
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src'))
+
+from gg_sdk import GG, GGThunk
+
+"""
+Benchmark suite for thunk generation on the graph shapes we run in
+production:
+
+  fanout     independent thunks reading one shared file (test_gg_gen)
+  chain      chains of thunks, each reading the one before it
+             (excamera passing the encoder state along a batch)
+  diamond    diamonds stacked on top of each other: every level splits
+             into two thunks that are joined again
+  mapreduce  map thunks reading a shared file and reduce thunks each
+             reading --fan-in of them (viddec)
+
+Each (shape, size) runs in its own forked process and working directory,
+and records the wall time of create_thunks, the time to build the graph,
+the number of subprocesses started, the read and write syscalls made
+by it and its children (syscr and syscw from /proc/<pid>/io), the files
+created and the peak RSS. Results are written as JSON lines; with --baseline, a previous
+results file, the runs that got slower or bigger by more than
+--tolerance are listed and the exit code is 1.
+
+Needs a statically linked test_program (see run_test.sh).
+"""
+
+test_prog_bin = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                             'test_program'))
+
+SHAPES = ['fanout', 'chain', 'diamond', 'mapreduce']
+SIZES = [1000, 10000, 100000, 1000000]
+
+# Metrics compared against the baseline, where more is worse
+COMPARED = ['seconds', 'subprocesses', 'rw_syscalls', 'files', 'peak_rss_kb']
+
+INPUT_FILE = 'input.txt'
+
+# Audit events for every way the SDK can start a process
+SPAWN_EVENTS = ('subprocess.Popen', 'os.posix_spawn', 'os.spawn', 'os.fork',
+                'os.forkpty', 'os.system')
+
+def thunk(args, infiles=()):
+    t = GGThunk(exe='test_program', exe_args=args, args_infiles=False)
+    for inf in infiles:
+        t.add_infile(inf)
+    return t
+
+def fanout_graph(size, opts):
+    return [thunk([INPUT_FILE, '--n=%d' % i], [INPUT_FILE])
+            for i in range(size)]
+
+def chain_graph(size, opts):
+    targets = []
+    prev = None
+    for i in range(size):
+        if i % opts.chain_length == 0:
+            prev = thunk([INPUT_FILE, '--n=%d' % i], [INPUT_FILE])
+        else:
+            prev = thunk([prev, '--n=%d' % i], [prev])
+        if i % opts.chain_length == opts.chain_length - 1 or i == size - 1:
+            targets.append(prev)
+    return targets
+
+def diamond_graph(size, opts):
+    top = thunk([INPUT_FILE, '--n=0'], [INPUT_FILE])
+    for i in range(1, size - 2, 3):
+        left = thunk([top, '--left=%d' % i], [top])
+        right = thunk([top, '--right=%d' % i], [top])
+        top = thunk([left, right, '--join=%d' % i], [left, right])
+    return [top]
+
+def mapreduce_graph(size, opts):
+    reducers = max(1, size // (opts.fan_in + 1))
+    maps = [thunk([INPUT_FILE, '--map=%d' % i], [INPUT_FILE])
+            for i in range(size - reducers)]
+    return [thunk(maps[i:i + opts.fan_in] + ['--reduce=%d' % i],
+                  maps[i:i + opts.fan_in])
+            for i in range(0, len(maps), opts.fan_in)]
+
+GRAPHS = {
+    'fanout': fanout_graph,
+    'chain': chain_graph,
+    'diamond': diamond_graph,
+    'mapreduce': mapreduce_graph,
+}
+
+def count_files(path):
+    return sum(len(files) for _, _, files in os.walk(path))
+
+def read_proc_io(pid='self'):
+    io = {}
+    with open('/proc/%s/io' % pid) as fin:
+        for line in fin:
+            key, value = line.split(':')
+            io[key] = int(value)
+    return io
+
+"""
+Read and write syscalls of a process and of its children that are
+still running (e.g. a process pool); the kernel adds the counts of the
+children it has waited for to its own
+"""
+def count_rw_syscalls(pid='self'):
+    try:
+        io = read_proc_io(pid)
+        total = io['syscr'] + io['syscw']
+        for task in os.listdir('/proc/%s/task' % pid):
+            with open('/proc/%s/task/%s/children' % (pid, task)) as fin:
+                for child in fin.read().split():
+                    total += count_rw_syscalls(child)
+    except (FileNotFoundError, ProcessLookupError):
+        return 0   # exited meanwhile
+    return total
+
+"""
+Body of the benchmark process: generate one graph in the current
+directory and return its metrics
+"""
+def measure(shape, size, opts):
+    spawned = [0]
+
+    def audit(event, args):
+        if event in SPAWN_EVENTS:
+            spawned[0] += 1
+
+    sys.addaudithook(audit)
+
+    with open(INPUT_FILE, 'w') as fout:
+        fout.write('benchmark input\n')
+
+    files_before = count_files('.')
+    rw_syscalls_before = count_rw_syscalls()
+    spawned_before = spawned[0]
+
+    start = now()
+    gg = GG(gen_jobs=opts.jobs, gen_executor=opts.executor, memo=opts.memo)
+    targets = GRAPHS[shape](size, opts)
+    build = now() - start
+
+    start = now()
+    gg.create_thunks(targets)
+    elapsed = now() - start
+
+    rw_syscalls = count_rw_syscalls() - rw_syscalls_before
+
+    return {
+        'shape': shape,
+        'size': size,
+        'targets': len(targets),
+        'seconds': elapsed,
+        'build_seconds': build,
+        'subprocesses': spawned[0] - spawned_before,
+        'rw_syscalls': rw_syscalls,
+        'files': count_files('.') - files_before,
+    }
+
+"""
+Run measure() in a forked process inside a fresh working directory,
+so that every run starts from the same state and gets its own peak
+RSS
+"""
+def run(shape, size, opts):
+    workdir = tempfile.mkdtemp(prefix='gg-bench-')
+    os.symlink(test_prog_bin, os.path.join(workdir, 'test_program'))
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            os.close(read_fd)
+            os.chdir(workdir)
+            # Keep the SDK's progress prints out of the results
+            sys.stdout = sys.stderr
+            result = measure(shape, size, opts)
+            with os.fdopen(write_fd, 'w') as fout:
+                json.dump(result, fout)
+            status = 0
+        finally:
+            os._exit(status)
+
+    os.close(write_fd)
+    try:
+        with os.fdopen(read_fd) as fin:
+            contents = fin.read()
+        _, status, rusage = os.wait4(pid, 0)
+    finally:
+        shutil.rmtree(workdir)
+
+    if status != 0 or not contents:
+        print('%s/%d failed' % (shape, size), file=sys.stderr)
+        sys.exit(1)
+
+    result = json.loads(contents)
+    result['peak_rss_kb'] = rusage.ru_maxrss
+    return result
+
+def load_results(filename):
+    results = {}
+    with open(filename) as fin:
+        for line in fin:
+            if line.strip():
+                result = json.loads(line)
+                results[(result['shape'], result['size'])] = result
+    return results
+
+"""
+Metrics of results that are more than tolerance above the baseline
+"""
+def regressions(results, baseline, tolerance):
+    found = []
+    for result in results:
+        base = baseline.get((result['shape'], result['size']))
+        if base is None:
+            continue
+        for metric in COMPARED:
+            if metric in base and result[metric] > base[metric] * (1 + tolerance):
+                found.append((result['shape'], result['size'], metric,
+                              base[metric], result[metric]))
+    return found
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shape', choices=SHAPES, action='append')
+    parser.add_argument('--size', type=int, action='append')
+    parser.add_argument('--chain-length', type=int, default=1000)
+    parser.add_argument('--fan-in', type=int, default=16)
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--executor', default='thread')
+    parser.add_argument('--no-memo', dest='memo', action='store_false')
+    parser.add_argument('--output', help='JSON lines file for the results '
+                                         '(default: stdout)')
+    parser.add_argument('--baseline', help='results of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    opts = parser.parse_args()
+
+    if not os.path.exists(test_prog_bin):
+        print("test_program not found: g++ -static test_program.cc -o test_program")
+        sys.exit(1)
+
+    fout = open(opts.output, 'w') if opts.output else sys.stdout
+    results = []
+    try:
+        for shape in opts.shape or SHAPES:
+            for size in opts.size or SIZES:
+                result = run(shape, size, opts)
+                result['python'] = platform.python_version()
+                results.append(result)
+                fout.write(json.dumps(result, sort_keys=True) + '\n')
+                fout.flush()
+                print('%-9s %8d %9.3f s %6d subprocs %9d r/w syscalls %8d files '
+                      '%8d KiB' % (shape, size, result['seconds'],
+                                   result['subprocesses'], result['rw_syscalls'],
+                                   result['files'], result['peak_rss_kb']),
+                      file=sys.stderr)
+    finally:
+        if fout is not sys.stdout:
+            fout.close()
+
+    if opts.baseline:
+        found = regressions(results, load_results(opts.baseline),
+                            opts.tolerance)
+        for shape, size, metric, before, after in found:
+            print('regression: %s/%d %s %s -> %s' %
+                  (shape, size, metric, before, after), file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 #!/bin/bash -ex
 
-# Copy gg_sdk.py into test directory
-cp ../src/gg_sdk.py .
+# Copy the SDK modules into test directory
+cp ../src/*.py .
 
 # Check that test_program.cc exists
 if [ ! -f test_program.cc ]; then
@@ -32,6 +32,15 @@ rm -rf .gg *.out
 # Call test_gg_gen.py
 ./test_gg_gen.py
 
+# Check that the thunk memo never reuses a thunk whose infile changed
+python3 test_thunk_memo.py
+
+# Force a small graph and a failing thunk through AsyncGG
+python3 test_gg_async.py
+
+# Build a graph manifest on top of another one and force it
+python3 test_graph_manifest.py
+
 # Call gg to force all thunks
 gg-force *.out
 
@@ -73,6 +82,6 @@ echo ${num_failed}" tests failed"
 echo "==="
 
 # Clean up environment for next run
-rm -rf .gg *.out gg_pb2.py* gg_sdk.py* test_program
+rm -rf .gg *.out gg_*.py* test_program
 
 exit ${num_failed}
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""
+Checks AsyncGG (gg_async) with gg-force: a graph submitted in two
+batches, the second depending on the first, is forced end to end, and a
+thunk that fails to execute raises through its output and through
+await gg.wait().
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+
+from gg_async import AsyncGG
+from gg_sdk import GGThunk
+
+test_prog_bin = os.path.abspath('test_program')
+
+def read_thunk(infile, word):
+    thunk = GGThunk(exe=test_prog_bin, outname='test_%d.out' % word,
+                    exe_args=[infile if isinstance(infile, str)
+                              else infile.get_outname(''), str(word)],
+                    args_infiles=False)
+    thunk.add_infile(infile)
+    return thunk
+
+async def force_graph(check):
+    async with AsyncGG() as gg:
+        first = read_thunk('input.txt', 1)
+        second = read_thunk(first, 3)
+
+        check("target names", ['test_1.out'], await gg.submit([first]))
+        check("target name", 'test_3.out', await gg.submit(second))
+        await gg.wait()
+
+        check("first output", b'Thunk 1 read: beta\n',
+              await first.output(contents=True))
+        check("dependent output", b'Thunk 3 read: beta\n',
+              await second.output(contents=True))
+        check("targets done", 2, gg.stats()['targets_done'])
+
+async def force_failing(check):
+    async with AsyncGG() as gg:
+        # test_program fails without its two arguments
+        failing = GGThunk(exe=test_prog_bin, outname='failing.out',
+                          exe_args=['input.txt'], args_infiles=False)
+        failing.add_infile('input.txt')
+        await gg.submit(failing)
+
+        try:
+            await gg.wait()
+            check("wait() raises", True, False)
+        except RuntimeError:
+            pass
+
+        try:
+            await failing.output()
+            check("output() raises", True, False)
+        except RuntimeError:
+            pass
+
+        # the error is raised once
+        await gg.wait()
+
+    try:
+        async with AsyncGG() as gg:
+            failing = GGThunk(exe=test_prog_bin, outname='failing_2.out',
+                              exe_args=['input.txt'], args_infiles=False)
+            failing.add_infile('input.txt')
+            await gg.submit(failing)
+        check("leaving the block raises", True, False)
+    except RuntimeError:
+        check("output of the failed target", True,
+              isinstance(failing.output_future.exception(), RuntimeError))
+
+def main():
+    num_failed = 0
+
+    def check(what, expected, actual):
+        nonlocal num_failed
+        if expected != actual:
+            num_failed += 1
+            print("TEST FAILED: %s (expected %r, got %r)" %
+                  (what, expected, actual))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.environ['GG_DIR'] = os.path.join(workdir, '.gg')
+        with open('input.txt', 'w') as fout:
+            fout.write('alpha beta gamma delta\n')
+
+        asyncio.run(force_graph(check))
+        asyncio.run(force_failing(check))
+
+    print("%d failed checks" % num_failed)
+    return num_failed
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+"""
+Checks what gg-gc (src/frontend/gg-gc.cc) evicts: the least recently used
+blobs first, never one reachable from a pin or from a placeholder, and the
+reductions that point to evicted blobs go with them. Also checks that
+gg-gc waits for the tools that hold the shared lock on .gg/gc/lock, and
+folds in the records that the SDK (gg_gc.py) appends to the journal.
+"""
+
+import os
+import sys
+import time
+import fcntl
+import tempfile
+import subprocess as sp
+
+import gg_gc
+import gg_hash
+import gg_thunk
+
+def gg_gc_run(*args):
+    proc = sp.run(['gg-gc'] + list(args), stdout=sp.PIPE)
+    if proc.returncode != 0:
+        return None
+    return gg_gc.parse_summary(proc.stdout.decode('ascii'))
+
+def write_blob(data, mtime):
+    blob = gg_hash.compute(data, 'V')
+    path = os.path.join('.gg', 'blobs', blob)
+    with open(path, 'wb') as fout:
+        fout.write(data)
+    os.utime(path, (mtime, mtime))
+    return blob
+
+def write_thunk(exe, values, mtime):
+    thunk = gg_thunk.write(gg_thunk.serialize(exe, [exe], [], values, [],
+                                              [exe], ['out']))
+    os.utime(os.path.join('.gg', 'blobs', thunk), (mtime, mtime))
+    return thunk
+
+def write_reduction(thunk, output):
+    gg_thunk.atomic_create(output.encode('ascii'),
+                           os.path.join('.gg', 'reductions', thunk))
+
+def blobs():
+    return set(os.listdir(os.path.join('.gg', 'blobs')))
+
+def main():
+    num_failed = 0
+
+    def check(what, expected, actual):
+        nonlocal num_failed
+        if expected != actual:
+            num_failed += 1
+            print("TEST FAILED: %s (expected %r, got %r)" %
+                  (what, expected, actual))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.environ['GG_DIR'] = os.path.join(workdir, '.gg')
+        for dirname in ('blobs', 'reductions'):
+            os.makedirs(os.path.join('.gg', dirname))
+
+        # reachable from the placeholder: the thunk, its infiles and
+        # what it reduced to
+        exe = write_blob(b'#!/bin/false\n', 100)
+        infile = write_blob(b'infile of the thunk\n', 100)
+        thunk = write_thunk(exe, [infile], 100)
+        reduced = write_blob(b'output of the thunk\n', 100)
+        write_reduction(thunk, reduced)
+        write_reduction(thunk + '#out', reduced)
+        gg_thunk.write_placeholder('out', thunk)
+
+        # reachable from a pin
+        pinned_infile = write_blob(b'infile of the pinned thunk\n', 100)
+        pinned = write_thunk(exe, [pinned_infile], 100)
+
+        # unreachable, oldest first
+        old = write_blob(b'o' * 1000, 200)
+        middle = write_blob(b'm' * 1000, 300)
+        new = write_blob(b'n' * 1000, 400)
+
+        # a reduction that points to a blob that will be evicted
+        dropped = gg_hash.compute(b'dropped', 'T')
+        write_reduction(dropped, old)
+
+        kept = {exe, infile, thunk, reduced, pinned_infile, pinned}
+        kept_bytes = sum(gg_hash.size(blob) for blob in kept)
+
+        summary = gg_gc_run('--pin=%s' % pinned)
+        check("first run scans the placeholder", 1,
+              summary and summary['placeholders'])
+        check("reachable blobs", len(kept), summary and summary['reachable'])
+        check("nothing evicted without --max-bytes", 0,
+              summary and summary['evicted_blobs'])
+
+        summary = gg_gc_run('--max-bytes=%d' % (kept_bytes + 2000),
+                            '--dry-run')
+        check("dry run evicts nothing", kept | {old, middle, new}, blobs())
+        check("dry run reports the least recently used blob", 1000,
+              summary and summary['evicted_bytes'])
+
+        summary = gg_gc_run('--max-bytes=%d' % (kept_bytes + 2000))
+        check("evicts the least recently used blob", kept | {middle, new},
+              blobs())
+        check("bytes after eviction", kept_bytes + 2000,
+              summary and summary['bytes'])
+        check("drops reductions to evicted blobs", False,
+              os.path.exists(os.path.join('.gg', 'reductions', dropped)))
+        check("keeps reductions to reachable blobs", True,
+              os.path.exists(os.path.join('.gg', 'reductions', thunk + '#out')))
+
+        # an access in the journal makes middle the most recently used
+        gg_gc.record([middle])
+        gg_gc_run('--max-bytes=%d' % (kept_bytes + 1000))
+        check("journaled access moves a blob back", kept | {middle}, blobs())
+
+        # without the placeholder and the pin, only the limit is left
+        os.remove('out')
+        gg_gc_run('--unpin=%s' % pinned, '--max-bytes=0')
+        check("evicts unpinned and unreferenced blobs", set(), blobs())
+
+        # gg-gc waits for the tools that hold the lock
+        lock_fd = os.open(os.path.join('.gg', 'gc', 'lock'), os.O_RDWR)
+        fcntl.flock(lock_fd, fcntl.LOCK_SH)
+        proc = sp.Popen(['gg-gc'], stdout=sp.DEVNULL)
+        time.sleep(0.5)
+        check("waits for the shared lock", None, proc.poll())
+        os.close(lock_fd)
+        check("runs once the lock is released", 0, proc.wait())
+
+    print("%d failed checks" % num_failed)
+    return num_failed
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""
+Checks graph manifests (create_thunks(manifest=...)) across two stages of
+a script: the second stage's graph depends on a thunk that is only in the
+first stage's manifest, so that thunk has to be copied into the second
+manifest, which gg-force --graph then forces on its own.
+"""
+
+import os
+import sys
+import tempfile
+import subprocess as sp
+
+import gg_hash
+import gg_thunk
+from gg_sdk import GG, GGThunk
+
+test_prog_bin = os.path.abspath('test_program')
+
+def read_varint(data, pos):
+    value, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+"""
+Hashes of the thunks in a graph manifest, in the order they were written
+"""
+def manifest_thunks(filename):
+    with open(filename, 'rb') as fin:
+        data = fin.read()
+
+    if not data.startswith(gg_thunk.GRAPH_MAGIC):
+        return None
+
+    pos = len(gg_thunk.GRAPH_MAGIC)
+    hashes = []
+    while True:
+        length, pos = read_varint(data, pos)
+        if length == 0:
+            return hashes
+        body = data[pos:pos + length]
+        hashes.append(gg_hash.compute(gg_thunk.MAGIC_NUMBER + body, 'T'))
+        pos += length
+
+def read_thunk(infile, word):
+    thunk = GGThunk(exe=test_prog_bin, outname='test_%d.out' % word,
+                    exe_args=[infile if isinstance(infile, str)
+                              else infile.get_outname(''), str(word)],
+                    args_infiles=False)
+    thunk.add_infile(infile)
+    return thunk
+
+def main():
+    num_failed = 0
+
+    def check(what, expected, actual):
+        nonlocal num_failed
+        if expected != actual:
+            num_failed += 1
+            print("TEST FAILED: %s (expected %r, got %r)" %
+                  (what, expected, actual))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.environ['GG_DIR'] = os.path.join(workdir, '.gg')
+        with open('input.txt', 'w') as fout:
+            fout.write('alpha beta gamma delta\n')
+
+        gg = GG(memo=False)
+
+        # first stage
+        first = read_thunk('input.txt', 1)
+        gg.create_thunks([first], manifest='first.graph')
+        check("first manifest", [first.thunk_hash],
+              manifest_thunks('first.graph'))
+        check("first stage thunk only in the manifest", False,
+              os.path.exists(os.path.join('.gg', 'blobs', first.thunk_hash)))
+
+        # second stage, on top of the first one's output
+        second = read_thunk(first, 3)
+        gg.create_thunks([second], manifest='second.graph')
+        check("second manifest has the first manifest's thunks first",
+              [first.thunk_hash, second.thunk_hash],
+              manifest_thunks('second.graph'))
+
+        os.remove('first.graph')
+        returncode = sp.call(['gg-force', '--no-status', '--engine=local',
+                              '--graph=second.graph'])
+        check("gg-force --graph", 0, returncode)
+
+        if returncode == 0:
+            with open('test_3.out', 'rb') as fin:
+                check("output of the second stage", b'Thunk 3 read: beta\n',
+                      fin.read())
+
+    print("%d failed checks" % num_failed)
+    return num_failed
+
+if __name__ == '__main__':
+    sys.exit(main())
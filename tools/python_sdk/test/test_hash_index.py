@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""
+Checks that the hash index written by ggSDK (gg_hash_cache.py) is read
+by the C++ tools (hash-cache-tool, over HashCache) and the other way
+around, and that each side can read a log that the other compacted.
+"""
+
+import os
+import sys
+import subprocess as sp
+
+import gg_hash
+from gg_hash_cache import HashCache, COMPACTION_THRESHOLD
+
+INDEX = 'hash_index'
+
+def cpp(*args):
+    proc = sp.run(['hash-cache-tool'] + list(args), stdout=sp.PIPE)
+    if proc.returncode != 0:
+        return None
+    return proc.stdout.decode('ascii').strip()
+
+def write_file(filename, data):
+    with open(filename, 'wb') as fout:
+        fout.write(data)
+    return gg_hash.compute(data, 'V')
+
+def count_lines(filename):
+    with open(filename, 'rb') as fin:
+        return fin.read().count(b'\n')
+
+def main():
+    num_failed = 0
+
+    def check(what, expected, actual):
+        nonlocal num_failed
+        if expected != actual:
+            num_failed += 1
+            print("TEST FAILED: %s (expected %r, got %r)" %
+                  (what, expected, actual))
+
+    if os.path.exists(INDEX):
+        os.remove(INDEX)
+
+    hashes = [write_file('file%d' % i, b'contents of file %d\n' % i)
+              for i in range(3)]
+
+    # SDK -> C++
+    HashCache(INDEX).put(os.stat('file0'), hashes[0])
+    check("C++ reads an SDK entry", hashes[0], cpp('get', INDEX, 'file0'))
+
+    # C++ -> SDK
+    cpp('put', INDEX, 'file1', hashes[1])
+    index = HashCache(INDEX)
+    check("SDK reads a C++ entry", hashes[1], index.get(os.stat('file1')))
+    check("SDK reads its own entry", hashes[0], index.get(os.stat('file0')))
+
+    # A changed file is not looked up by either side
+    hashes[0] = write_file('file0', b'new contents of file 0\n')
+    check("C++ skips a changed file", None, cpp('get', INDEX, 'file0'))
+    check("SDK skips a changed file", None,
+          HashCache(INDEX).get(os.stat('file0')))
+
+    # The SDK fills the log with dead records; C++ compacts it
+    index = HashCache(INDEX)
+    for _ in range(COMPACTION_THRESHOLD):
+        index.put(os.stat('file2'), hashes[2])
+    live = cpp('size', INDEX)
+    check("C++ compacts the log", live, str(count_lines(INDEX)))
+    check("SDK reads a log compacted by C++", hashes[2],
+          HashCache(INDEX).get(os.stat('file2')))
+    check("SDK keeps the entries C++ compacted", hashes[1],
+          HashCache(INDEX).get(os.stat('file1')))
+
+    # C++ fills the log with dead records; the SDK compacts it
+    cpp('put', INDEX, 'file0', hashes[0], str(COMPACTION_THRESHOLD))
+    index = HashCache(INDEX)
+    check("SDK compacts the log", len(index), count_lines(INDEX))
+    check("C++ reads a log compacted by the SDK", hashes[0],
+          cpp('get', INDEX, 'file0'))
+    check("C++ keeps the entries the SDK compacted", hashes[1],
+          cpp('get', INDEX, 'file1'))
+
+    print("%d failed checks" % num_failed)
+    return num_failed
+
+if __name__ == '__main__':
+    sys.exit(main())
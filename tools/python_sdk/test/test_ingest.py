@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""
+Forces each ingestion method (gg_ingest.METHODS) in the SDK's infile
+registry and in gg-collect, and checks the contents of the blob, the
+method that was reported, and that the hash cache entry of the source
+still matches it afterwards (link changes the ctime of the source). A
+link across filesystems (to /dev/shm, if it is one) has to fall back to
+a copying method.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess as sp
+
+import gg_hash
+import gg_ingest
+from gg_sdk import InfileRegistry
+from gg_hash_cache import HashCache
+
+# Filesystem other than the working directory's, for EXDEV
+OTHER_FS = '/dev/shm'
+
+"""
+Methods that may be used when ingesting with mode: link has to work in
+the same directory and the copying methods always do, but reflink only
+works on copy-on-write filesystems
+"""
+def expected_methods(mode):
+    if mode == 'reflink':
+        return gg_ingest.METHODS[1:]
+    return [mode]
+
+def write_file(filename, data):
+    with open(filename, 'wb') as fout:
+        fout.write(data)
+
+def read_file(filename):
+    with open(filename, 'rb') as fin:
+        return fin.read()
+
+def sdk_ingest(filename, mode):
+    hash_cache = HashCache()
+    registry = InfileRegistry(hash_cache, ingest_mode=mode)
+    blob = registry.resolve(filename)
+    methods = list(registry.stats()['ingested'])
+    return (blob, methods[0] if methods else None,
+            HashCache().get(os.stat(filename)))
+
+def collect_ingest(filename, mode):
+    proc = sp.run(['gg-collect', '--ingest', mode, '--report', filename],
+                  stdout=sp.PIPE, stderr=sp.PIPE)
+    if proc.returncode != 0:
+        return None, None, None
+    blob = proc.stdout.decode('ascii').strip()
+    method = proc.stderr.decode('ascii').split()[0]
+    cached = sp.run(['hash-cache-tool', 'get', os.path.join('.gg', 'hash_index'),
+                     filename], stdout=sp.PIPE).stdout.decode('ascii').strip()
+    return blob, method, cached or None
+
+def main():
+    num_failed = 0
+
+    def check(what, expected, actual):
+        nonlocal num_failed
+        if expected != actual:
+            num_failed += 1
+            print("TEST FAILED: %s (expected %r, got %r)" %
+                  (what, expected, actual))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.environ['GG_DIR'] = os.path.join(workdir, '.gg')
+        os.makedirs(os.path.join('.gg', 'blobs'))
+
+        other_fs = None
+        if (os.path.isdir(OTHER_FS) and
+            os.stat(OTHER_FS).st_dev != os.stat(workdir).st_dev):
+            other_fs = tempfile.mkdtemp(dir=OTHER_FS)
+
+        try:
+            for tool, ingest in (('sdk', sdk_ingest),
+                                 ('gg-collect', collect_ingest)):
+                cases = [(mode, '.', expected_methods(mode))
+                         for mode in gg_ingest.METHODS]
+                if other_fs:
+                    cases.append(('link', other_fs,
+                                  gg_ingest.COPYING_METHODS))
+
+                for mode, dirname, expected in cases:
+                    what = '%s, %s in %s' % (tool, mode, dirname)
+                    data = ('%s\n' % what).encode('utf-8') * 100
+                    filename = os.path.join(dirname, '%s-%s.in' % (tool, mode))
+                    write_file(filename, data)
+
+                    blob, method, cached = ingest(filename, mode)
+                    check("%s: hash" % what, gg_hash.compute(data), blob)
+                    check("%s: reported method" % what, True,
+                          method in expected)
+                    check("%s: blob contents" % what, data,
+                          blob and read_file(os.path.join('.gg', 'blobs', blob)))
+                    check("%s: hash cache entry" % what, blob, cached)
+        finally:
+            if other_fs:
+                shutil.rmtree(other_fs)
+
+    print("%d failed checks" % num_failed)
+    return num_failed
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+Checks that the thunk memo (gg_thunk_memo) reuses a thunk whose inputs
+are unchanged, and never reuses one whose infile was rewritten in place
+with its size and modification time restored.
+"""
+
+import os
+import sys
+import tempfile
+
+import gg_thunk
+from gg_sdk import GG, GGThunk
+
+test_prog_bin = os.path.abspath('test_program')
+
+def generate():
+    gg = GG()
+    thunk = GGThunk(exe=test_prog_bin, outname='memo.out',
+                    exe_args=['input.txt', '0'], args_infiles=False)
+    thunk.add_infile('input.txt')
+    gg.create_thunks([thunk])
+    return gg.memo.stats(), gg_thunk.read_placeholder('memo.out')
+
+def main():
+    num_failed = 0
+
+    def check(what, expected, actual):
+        nonlocal num_failed
+        if expected != actual:
+            num_failed += 1
+            print("TEST FAILED: %s (expected %r, got %r)" %
+                  (what, expected, actual))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        with open('input.txt', 'wb') as fout:
+            fout.write(b'first line of the input\n')
+
+        stats, first_hash = generate()
+        check("first run serializes the thunk", 1, stats['serialized'])
+
+        stats, thunk_hash = generate()
+        check("unchanged inputs reuse the thunk", 1, stats['reused'])
+        check("reused thunk", first_hash, thunk_hash)
+
+        # Same size and mtime, different contents
+        info = os.stat('input.txt')
+        with open('input.txt', 'r+b') as fout:
+            fout.write(b'F')
+        os.utime('input.txt', ns=(info.st_atime_ns, info.st_mtime_ns))
+
+        stats, thunk_hash = generate()
+        check("rewritten infile is not reused", 0, stats['reused'])
+        check("rewritten infile gives a new thunk", True,
+              thunk_hash != first_hash)
+
+    print("%d failed checks" % num_failed)
+    return num_failed
+
+if __name__ == '__main__':
+    sys.exit(main())
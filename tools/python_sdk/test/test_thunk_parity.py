@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Checks that gg_thunk (the SDK's native thunk writer) produces thunks and
+placeholders that are byte-identical to the ones made by gg-create-thunk.
+"""
+
+import os
+import sys
+import stat
+import tempfile
+import subprocess as sp
+
+import gg_thunk
+
+V1 = 'VHlDg3sw3lVwG0a4FrWamHCGB6ynMdwa5V0Y0GPlJ.Kg00000015'
+V2 = 'V0N0_cJvwm6jVszWMRg8fH2_oiAjNKLbMOd7mMo8bKbc00001000'
+V3 = 'V7WkTlO1WwBjsRQ6IgvwDGUPWZDl3xnr3M2HeMikiL.o0000ffff'
+T1 = 'TWiI8h3oKXqVmjZHYAE5ZKp0gZqkO4.TgTXjgnUMNV3I0000008f'
+T2 = 'T.ACnJOj8CQVpTD6kDqXXT0mLnwnjdJGvXbA_bzHlJ2w000000d3'
+E1 = 'VwMJ9iz0RYyh_VQIEmcJ7L6qB0Ni0t3dNgq.VxdqKjQ800a1b2c3'
+
+CASES = [
+    # (function hash, args, envars, values, thunks, executables,
+    #  outputs, timeout, placeholder)
+    (E1, ['prog'], [], [], [], [E1], ['out'], 0, 'out'),
+    (E1, ['prog', '@{GGHASH:%s}' % V1, '-o', 'out.o'], ['A=1', 'B='],
+     [V2, V1, V3], [], [E1], ['out.o'], 0, 'out.o'),
+    (E1, ['prog', '', 'x' * 300, 'été'], ['PATH=/bin'],
+     [V1 + '=a.txt', V1 + '=b.txt', V2], [T2, T1 + '#tag'], [E1, V3],
+     ['o1', 'o2', 'o3'], 0, None),
+    (E1, ['prog'], [], [V1], [T1], [E1], ['libfoo.so.1.2'], 2000,
+     'libfoo.so.1.2'),
+]
+
+def create_thunk_cmd(case, placeholder_dir):
+    func_hash, args, envars, values, thunks, executables, outputs, \
+        timeout, placeholder = case
+
+    cmd = ['gg-create-thunk']
+    for ev in envars:
+        cmd.extend(['-E', ev])
+    for v in values:
+        cmd.extend(['-v', v])
+    for t in thunks:
+        cmd.extend(['-t', t])
+    for e in executables:
+        cmd.extend(['-e', e])
+    for o in outputs:
+        cmd.extend(['-o', o])
+    if placeholder:
+        cmd.extend(['-C', os.path.join(placeholder_dir, placeholder)])
+    if timeout:
+        cmd.extend(['-T', str(timeout)])
+    cmd.append('--')
+    cmd.append(func_hash)
+    cmd.extend(args)
+    return cmd
+
+def read_file(path):
+    with open(path, 'rb') as fin:
+        return fin.read()
+
+def main():
+    num_failed = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, case in enumerate(CASES):
+            func_hash, args, envars, values, thunks, executables, outputs, \
+                timeout, placeholder = case
+
+            ref_dir = os.path.join(tmp, 'ref%d' % i)
+            sdk_dir = os.path.join(tmp, 'sdk%d' % i)
+            for d in (ref_dir, sdk_dir):
+                os.makedirs(os.path.join(d, '.gg', 'blobs'))
+
+            env = dict(os.environ, GG_DIR=os.path.join(ref_dir, '.gg'))
+            proc = sp.run(create_thunk_cmd(case, ref_dir), env=env,
+                          stdout=sp.PIPE, stderr=sp.PIPE, check=True)
+            ref_hash = proc.stderr.decode('utf-8').strip()
+
+            serialized = gg_thunk.serialize(func_hash, args, envars, values,
+                                            thunks, executables, outputs,
+                                            timeout)
+            sdk_hash = gg_thunk.write(serialized,
+                                      os.path.join(sdk_dir, '.gg', 'blobs'))
+
+            if placeholder:
+                gg_thunk.write_placeholder(os.path.join(sdk_dir, placeholder),
+                                           sdk_hash)
+
+            checks = [('hash', ref_hash, sdk_hash)]
+
+            ref_blob = os.path.join(ref_dir, '.gg', 'blobs', ref_hash)
+            sdk_blob = os.path.join(sdk_dir, '.gg', 'blobs', sdk_hash)
+            if os.path.exists(sdk_blob):
+                checks.append(('blob', read_file(ref_blob), read_file(sdk_blob)))
+                checks.append(('blob mode',
+                               stat.S_IMODE(os.stat(ref_blob).st_mode),
+                               stat.S_IMODE(os.stat(sdk_blob).st_mode)))
+
+            if placeholder:
+                ref_ph = os.path.join(ref_dir, placeholder)
+                sdk_ph = os.path.join(sdk_dir, placeholder)
+                checks.append(('placeholder', read_file(ref_ph),
+                               read_file(sdk_ph)))
+                checks.append(('placeholder mode',
+                               stat.S_IMODE(os.stat(ref_ph).st_mode),
+                               stat.S_IMODE(os.stat(sdk_ph).st_mode)))
+
+            for what, expected, actual in checks:
+                if expected != actual:
+                    num_failed += 1
+                    print("TEST FAILED: case %d: %s differs" % (i, what))
+                    print("Expected: %r" % (expected,))
+                    print("Read: %r" % (actual,))
+
+    print("%d cases, %d failed checks" % (len(CASES), num_failed))
+    return num_failed
+
+if __name__ == '__main__':
+    sys.exit(main())